@@ -0,0 +1,80 @@
+"""
+Выгрузка миллиона операций: время и пиковая память сверх загруженной таблицы для xlsx, CSV и Parquet
+в сравнении с DataFrame.to_excel (openpyxl) на выборке, пересчитанной на полный объём.
+
+Запуск: python -m benchmarks.bench_export --rows 1000000 --baseline-rows 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import write_operations
+from src.operations_store import BASE_DIR, load_typed_operations
+
+EXPORT = (
+    "import json, time\n"
+    "from src.operations_store import load_typed_operations\n"
+    "def status(key):\n"
+    "    return int(next(l for l in open('/proc/self/status') if l.startswith(key)).split()[1])\n"
+    "df = load_typed_operations({source!r})\n"
+    "rss = status('VmRSS')\n"
+    "# Сброс пика RSS (VmHWM): в замер попадает только выгрузка\n"
+    "open('/proc/self/clear_refs', 'w').write('5')\n"
+    "started = time.perf_counter()\n"
+    "{code}\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({{'seconds': elapsed, 'extra_kib': max(status('VmHWM') - rss, 0)}}))\n"
+)
+CASES = {
+    "xlsx": "from src.export import export_frame\nexport_frame(df, {target!r})",
+    "csv": "from src.export import export_frame\nexport_frame(df, {target!r})",
+    "parquet": "from src.export import export_frame\nexport_frame(df, {target!r})",
+    "to_excel": (
+        "from src.dtypes import to_display\n"
+        "to_display(df.iloc[:{baseline}]).to_excel({target!r}, index=False)"
+    ),
+}
+
+
+def run_case(source: str, code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", EXPORT.format(source=source, code=code)],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if output.returncode != 0:
+        return {"error": output.stderr.strip().splitlines()[-1]}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=20_000, help="строк для to_excel (он медленный)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = write_operations(os.path.join(tmp_dir, "operations.csv"), args.rows, args.seed)
+        # Колоночный кэш строится один раз: замеры не включают разбор CSV
+        load_typed_operations(source)
+        print(f"{'формат':10} {'строк':>10} {'секунд':>9} {'с/млн':>8} {'МиБ сверх':>10} {'файл, МиБ':>10}")
+        for name, code in CASES.items():
+            rows = min(args.baseline_rows, args.rows) if name == "to_excel" else args.rows
+            target = os.path.join(tmp_dir, f"export_{name}.{'xlsx' if name == 'to_excel' else name}")
+            result = run_case(source, code.format(target=target, baseline=rows))
+            if "error" in result:
+                print(f"{name:10} {rows:>10} пропущен: {result['error']}")
+                continue
+            size = os.path.getsize(target) / 2**20
+            per_million = result["seconds"] * 1_000_000 / rows
+            print(
+                f"{name:10} {rows:>10} {result['seconds']:>9.2f} {per_million:>8.1f} "
+                f"{result['extra_kib'] / 1024:>10.1f} {size:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
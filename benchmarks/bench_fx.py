@@ -0,0 +1,109 @@
+"""
+Пересчёт сумм в базовую валюту по истории курсов: поиск курса для каждой строки (bisect по истории валюты)
+против одного векторного as-of соединения (searchsorted по ключам «валюта, день»), а также
+повторное обращение к материализованному столбцу и главная страница с пересчитанными суммами.
+
+Запуск: python -m benchmarks.bench_fx --rows 100000 1000000
+"""
+import argparse
+import bisect
+import os
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from benchmarks.synthetic import CURRENCIES, write_operations
+from src import fx_rates, operations_store
+from src.dtypes import kopecks
+from src.fx_rates import RateStore, base_amounts, with_base_amounts
+from src.operations_store import load_typed_operations
+from src.schema import AMOUNT, OPERATION_DATE, PAYMENT_CURRENCY
+from src.views import process_operations_data
+
+
+def _best(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def history_store(path: str, seed: int) -> RateStore:
+    """Дневная история курсов 2017–2021 (единиц валюты за 1 USD) — случайное блуждание."""
+    rng = np.random.default_rng(seed)
+    days = np.arange(np.datetime64("2017-01-01"), np.datetime64("2022-01-01"))
+    start = {"USD": 1.0, "RUB": 60.0, "EUR": 0.9, "TRY": 3.5, "CNY": 6.8}
+    rows = []
+    for currency in CURRENCIES:
+        walk = np.ones(len(days)) if currency == "USD" else np.exp(np.cumsum(rng.normal(0, 0.005, len(days))))
+        rows += [(str(day), currency, float(start[currency] * value)) for day, value in zip(days, walk)]
+    store = RateStore(path)
+    store.add_many(rows)
+    return store
+
+
+def naive_base_amounts(df, store: RateStore, base: str = "RUB") -> np.ndarray:
+    """Курс каждой строки — отдельным поиском по истории её валюты."""
+    history = store.history()
+    series = {}
+    for i, currency in enumerate(history.currencies):
+        mask = history.keys >> 32 == i
+        series[currency] = ((history.keys[mask] & 0xFFFFFFFF).tolist(), history.rates[mask].tolist())
+    days = (df[OPERATION_DATE].to_numpy().astype("datetime64[D]").view(np.int64) + (1 << 31)).tolist()
+    amounts = kopecks(df[AMOUNT]).tolist()
+
+    def rate(currency: str, day: int) -> float:
+        keys, rates = series[currency]
+        return rates[max(bisect.bisect_right(keys, day) - 1, 0)]
+
+    result = []
+    for amount, currency, day in zip(amounts, df[PAYMENT_CURRENCY].astype(object).tolist(), days):
+        if currency == base or currency not in series:
+            result.append(amount)
+        else:
+            result.append(round(amount * rate(base, day) / rate(currency, day)))
+    return np.array(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'строк':>9} {'по строкам, с':>14} {'as-of, с':>9} {'ускорение':>10} {'столбец, мс':>12} "
+          f"{'главная холодн., с':>19} {'главная, мс':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = history_store(os.path.join(tmp_dir, "rates.sqlite"), args.seed)
+        fx_rates.set_store(store)
+        for rows in args.rows:
+            source = write_operations(os.path.join(tmp_dir, f"operations_{rows}.csv"), rows, args.seed)
+            df = load_typed_operations(source)
+            naive = naive_base_amounts(df, store)
+            fast = base_amounts(df, "RUB", store)
+            assert np.allclose(np.nan_to_num(naive), np.nan_to_num(fast), rtol=0, atol=1)
+
+            naive_time = _best(lambda: naive_base_amounts(df, store), 1)
+            fast_time = _best(lambda: base_amounts(df, "RUB", store), args.repeat)
+            with_base_amounts(df)
+            column_time = _best(lambda: with_base_amounts(df), args.repeat)
+
+            # Главная: первый вызов в процессе строит столбец и агрегаты (или читает их с диска), дальше — из памяти
+            operations_store.clear_memory_cache()
+            cold_time = _best(lambda: process_operations_data(source, "2021-12-01", "2021-12-31"), 1)
+            warm_time = _best(lambda: process_operations_data(source, "2021-12-01", "2021-12-31"), args.repeat)
+            print(
+                f"{rows:>9} {naive_time:>14.3f} {fast_time:>9.4f} {naive_time / fast_time:>9.0f}x "
+                f"{column_time * 1000:>12.3f} {cold_time:>19.3f} {warm_time * 1000:>12.2f}"
+            )
+            operations_store.clear_memory_cache()
+        fx_rates.set_store(None)
+
+
+if __name__ == "__main__":
+    main()
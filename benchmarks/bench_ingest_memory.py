@@ -0,0 +1,65 @@
+"""
+Пиковая память (RSS) потоковой агрегации в сравнении с полной загрузкой через pd.read_excel.
+В RSS входят интерпретатор и импортированные pandas/numpy (около 80 МиБ); сверх них поток держит
+одну порцию строк в пределах бюджета. У xlsx к этому добавляется служебная память openpyxl, растущая
+с числом строк листа (около 80 байт на строку), поэтому для сравнения та же выгрузка читается и из CSV.
+
+Запуск: python -m benchmarks.bench_ingest_memory --sizes 10000 50000 100000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import write_operations
+from src.operations_store import BASE_DIR
+
+STREAMING = (
+    "from src.ingest import aggregate_operations\n"
+    "aggregate_operations({path!r}, memory_budget={budget})\n"
+)
+FULL_LOAD = (
+    "import pandas as pd\n"
+    "df = pd.read_excel({path!r})\n"
+    "df.groupby('Номер карты')['Сумма операции с округлением'].sum()\n"
+)
+# Пик RSS самого дочернего процесса: ru_maxrss в Linux наследует пик родителя до exec,
+# а родитель держит сгенерированную выгрузку — замер рос бы вместе с ней
+MEASURE = (
+    "with open('/proc/self/status') as f:\n"
+    "    print(next(line.split()[1] for line in f if line.startswith('VmHWM:')))\n"
+)
+
+
+def peak_rss_kib(code: str) -> int:
+    output = subprocess.run(
+        [sys.executable, "-c", code + MEASURE], cwd=BASE_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return int(output.split()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 100_000])
+    parser.add_argument("--budget", type=int, default=16 * 1024 * 1024, help="бюджет памяти в байтах")
+    args = parser.parse_args()
+
+    print(f"{'строк':>10} {'файл, МиБ':>10} {'поток, МиБ':>11} {'поток CSV, МиБ':>15} {'read_excel, МиБ':>16}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.sizes:
+            path = os.path.join(tmp_dir, f"operations_{rows}.xlsx")
+            csv_path = os.path.join(tmp_dir, f"operations_{rows}.csv")
+            write_operations(path, rows)
+            write_operations(csv_path, rows)
+            streaming = peak_rss_kib(STREAMING.format(path=path, budget=args.budget))
+            streaming_csv = peak_rss_kib(STREAMING.format(path=csv_path, budget=args.budget))
+            full = peak_rss_kib(FULL_LOAD.format(path=path))
+            size = os.path.getsize(path) / 2**20
+            print(
+                f"{rows:>10} {size:>10.1f} {streaming / 1024:>11.1f} {streaming_csv / 1024:>15.1f} {full / 1024:>16.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Память, занимаемая таблицей операций: исходные типы (строки, float64) против канонической схемы
+(datetime64, копейки в Int64, категории). Считается memory_usage(deep=True) на миллион операций.
+
+Запуск: python -m benchmarks.bench_memory --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import write_operations
+from src.dtypes import apply_schema
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Исходная таблица читается так же, как её читал бы pd.read_excel: строки и float64
+        path = write_operations(os.path.join(tmp_dir, "operations.csv"), args.rows, args.seed)
+        raw = pd.read_csv(path)
+
+    started = time.perf_counter()
+    typed = apply_schema(raw)
+    elapsed = time.perf_counter() - started
+
+    raw_usage = raw.memory_usage(deep=True, index=False)
+    typed_usage = typed.memory_usage(deep=True, index=False)
+    per_million = 1_000_000 / args.rows / 2**20
+    print(f"{'столбец':32} {'исходный':>18} {'схема':>18} {'МиБ/млн':>14}")
+    for name in raw.columns:
+        print(
+            f"{name:32} {str(raw[name].dtype):>10} {raw_usage[name] * per_million:7.1f} "
+            f"{str(typed[name].dtype):>10} {typed_usage[name] * per_million:7.1f}"
+        )
+    total_raw, total_typed = raw_usage.sum() * per_million, typed_usage.sum() * per_million
+    print(f"Итого на миллион операций: {total_raw:.1f} МиБ -> {total_typed:.1f} МиБ "
+          f"({total_raw / total_typed:.1f}x), приведение к схеме: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Время кодирования ответа со всей таблицей операций: json.dumps(to_dict(), indent=2)
+против общего слоя src.responses (компактный и отладочный режимы, NDJSON).
+
+Запуск: python -m benchmarks.bench_responses --repeat 20 --scale 10
+"""
+import argparse
+import io
+import json
+import time
+
+import pandas as pd
+
+from src.operations_store import OPERATIONS_PATH, load_typed_operations
+from src.responses import dumps, write_ndjson
+
+
+def best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--scale", type=int, default=1, help="во сколько раз размножить data/operations.xlsx")
+    args = parser.parse_args()
+
+    df = pd.concat([load_typed_operations(OPERATIONS_PATH)] * args.scale, ignore_index=True)
+    cases = {
+        "json.dumps(to_dict, indent=2)": lambda: json.dumps(
+            {"data": df.to_dict(orient="records")}, ensure_ascii=False, indent=2, default=str
+        ),
+        "responses.dumps": lambda: dumps({"data": df}),
+        "responses.dumps(pretty=True)": lambda: dumps({"data": df}, pretty=True),
+        "responses.write_ndjson": lambda: write_ndjson(io.BytesIO(), df),
+    }
+    print(f"Строк: {len(df)}")
+    for name, func in cases.items():
+        print(f"{name:32} {best_time(func, args.repeat) * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
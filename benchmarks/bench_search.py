@@ -0,0 +1,88 @@
+"""
+Структурированный поиск с проталкиванием условий (индекс дат, коды категорий, полнотекстовый индекс)
+против полного просмотра: текстовый поиск по всем строкам и отбор записей JSON на Python.
+
+Запуск: python -m benchmarks.bench_search --rows 100000 1000000
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Callable, List
+
+from benchmarks.synthetic import generate_operations
+from src.date_index import date_index
+from src.dtypes import apply_schema, to_display
+from src.query import Condition, parse_query, query_positions
+from src.search_index import search_index
+
+QUERIES = [
+    "category:Супермаркеты amount>5000 date:2021-03..2021-05 card:*7197",
+    "date:2021-12 магнит",
+    "category:Фастфуд,Кафе amount<300",
+    "card:*4556 описание:перевод",
+]
+
+
+def _record_matches(record: dict, condition: Condition) -> bool:
+    """Проверка одной записи ответа — так пришлось бы фильтровать результат простого поиска."""
+    value = record[{"category": "Категория", "card": "Номер карты", "amount": "Сумма операции с округлением",
+                    "date": "Дата операции", "описание": "Описание"}[condition.field]]
+    if value is None or value != value:
+        return False
+    if condition.field == "date":
+        day = datetime.strptime(value, "%d.%m.%Y %H:%M:%S")
+        lo, _, hi = condition.value.partition("..")
+        key = day.strftime("%Y-%m")
+        return lo <= key <= (hi or lo)
+    if condition.field == "amount":
+        limit = float(condition.value)
+        return value > limit if condition.op == ">" else value < limit
+    if condition.field == "card":
+        return value.endswith(condition.value.lstrip("*"))
+    if condition.field == "описание":
+        return condition.value in value.lower()
+    return value.lower() in condition.value.lower().split(",")
+
+
+def full_scan(df, query: str) -> List[int]:
+    parsed = parse_query(query)
+    positions = search_index(df).search(parsed.text)
+    records = to_display(df.take(positions)).to_dict("records")
+    return [
+        int(row) for row, record in zip(positions, records)
+        if all(_record_matches(record, condition) for condition in parsed.conditions)
+    ]
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'строк':>10} {'найдено':>8} {'условия, мс':>12} {'просмотр, мс':>13}  запрос")
+    for rows in args.rows:
+        df = apply_schema(generate_operations(rows, args.seed))
+        # Индексы строятся один раз на таблицу и в замер не входят
+        date_index(df)
+        search_index(df)
+        for query in QUERIES:
+            found = query_positions(df, query)
+            assert found.tolist() == full_scan(df, query), query
+            pushdown = best_of(lambda: query_positions(df, query), args.repeat)
+            scan = best_of(lambda: full_scan(df, query), 1)
+            print(f"{rows:>10} {len(found):>8} {pushdown * 1000:>12.1f} {scan * 1000:>13.1f}  {query}")
+
+
+if __name__ == "__main__":
+    main()
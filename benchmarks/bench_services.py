@@ -0,0 +1,114 @@
+"""
+Сервисы поиска телефонов и переводов физлицам: построчный apply с регулярным выражением
+против векторной проверки словаря уникальных описаний с раскладкой по кодам категорий.
+Отдельно — повторный вызов на той же версии данных (результат из кэша).
+Инвесткопилка и категории кэшбэка: цикл «месяц × лимит» с отбором строк на каждой итерации
+против одной матрицы сценариев и bincount по ячейкам «месяц × категория».
+
+Запуск: python -m benchmarks.bench_services --rows 100000 1000000
+"""
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_operations
+from src.dtypes import apply_schema
+from src.schema import AMOUNT, CATEGORY, DESCRIPTION, OPERATION_AMOUNT, OPERATION_DATE, STATUS
+from src.services import (PERSON_PATTERN, PHONE_PATTERN, TRANSFERS_CATEGORY, cashback_by_category,
+                          investment_savings, person_transfer_positions, phone_positions)
+
+MONTHS = [f"2021-{month:02d}" for month in range(1, 13)]
+LIMITS = [10, 50, 100, 500, 1000]
+
+
+def _best(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def naive_phones(df: pd.DataFrame) -> np.ndarray:
+    # Строки, а не категории: apply у категориального столбца сам проходит только по словарю
+    mask = df[DESCRIPTION].astype(object).apply(lambda text: bool(PHONE_PATTERN.search(str(text))))
+    return np.flatnonzero(mask.to_numpy(dtype=bool))
+
+
+def naive_transfers(df: pd.DataFrame) -> np.ndarray:
+    mask = df.apply(
+        lambda row: row[CATEGORY] == TRANSFERS_CATEGORY and bool(PERSON_PATTERN.search(str(row[DESCRIPTION]))), axis=1
+    )
+    return np.flatnonzero(mask.to_numpy(dtype=bool))
+
+
+def _expenses(df: pd.DataFrame) -> pd.DataFrame:
+    # Ключ месяца и отбор трат — один раз; в цикле остаётся просмотр таблицы на каждый сценарий
+    expenses = df[(df[OPERATION_AMOUNT] < 0).fillna(False) & (df[STATUS] == "OK") & df[AMOUNT].notna()]
+    return expenses.assign(month=expenses[OPERATION_DATE].dt.strftime("%Y-%m"))
+
+
+def naive_savings(df: pd.DataFrame) -> list:
+    expenses = _expenses(df)
+    results = []
+    for month in MONTHS:
+        for limit in LIMITS:
+            amounts = expenses.loc[expenses["month"] == month, AMOUNT].astype(float) / 100
+            saved = amounts.apply(lambda amount: np.ceil(round(amount / limit, 9)) * limit - amount).sum()
+            results.append({"month": month, "limit": limit, "savings": round(saved, 2)})
+    return results
+
+
+def naive_cashback(df: pd.DataFrame) -> dict:
+    expenses = _expenses(df)
+    return {
+        month: (expenses[expenses["month"] == month].groupby(CATEGORY, observed=True)[AMOUNT].sum() / 100).to_dict()
+        for month in MONTHS
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"сценариев копилки: {len(MONTHS)} месяцев × {len(LIMITS)} лимитов")
+    print(f"{'строк':>9} {'сервис':10} {'apply, с':>9} {'вектор, с':>10} {'кэш, мс':>8} {'ускорение':>10}")
+    for rows in args.rows:
+        df = apply_schema(generate_operations(rows, args.seed))
+        for name, naive, fast in [
+            ("телефоны", naive_phones, phone_positions),
+            ("переводы", naive_transfers, person_transfer_positions),
+        ]:
+            expected = naive(df)
+            assert fast(df.copy()).tolist() == expected.tolist()
+            # Новый объект таблицы на каждый замер — как новая версия данных, без кэша
+            naive_time = _best(lambda: naive(df), 1 if name == "переводы" else args.repeat)
+            fast_time = _best(lambda: fast(df.copy(deep=False)), args.repeat)
+            fast(df)
+            cached_time = _best(lambda: fast(df), args.repeat)
+            print(
+                f"{rows:>9} {name:10} {naive_time:>9.3f} {fast_time:>10.4f} "
+                f"{cached_time * 1000:>8.3f} {naive_time / fast_time:>9.0f}x"
+            )
+
+        expected = naive_savings(df)
+        fast = investment_savings(df, MONTHS, LIMITS)
+        assert all(abs(a["savings"] - b["savings"]) < 0.01 for a, b in zip(expected, fast))
+        naive_time = _best(lambda: naive_savings(df), 1)
+        fast_time = _best(lambda: investment_savings(df, MONTHS, LIMITS), args.repeat)
+        print(f"{rows:>9} {'копилка':10} {naive_time:>9.3f} {fast_time:>10.4f} {'—':>8} {naive_time / fast_time:>9.0f}x")
+
+        naive_time = _best(lambda: naive_cashback(df), 1)
+        fast_time = _best(lambda: cashback_by_category(df, MONTHS), args.repeat)
+        print(f"{rows:>9} {'кэшбэк':10} {naive_time:>9.3f} {fast_time:>10.4f} {'—':>8} {naive_time / fast_time:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Масштабирование по процессам: N рабочих процессов выполняют одну смесь запросов (поиск, отчёт по дням недели,
+данные главной) над общими данными из разделяемой памяти (shared) и над собственными копиями (private,
+обычная загрузка из колоночного кэша с индексами). Для каждого N — запросов в секунду суммарно,
+время подготовки процесса и суммарная пропорциональная память процессов (PSS, общие страницы
+делятся между процессами поровну).
+
+Запуск: python -m benchmarks.bench_shared --rows 1000000 --workers 1 2 4 8 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import List
+
+from benchmarks.bench_search import QUERIES
+from benchmarks.synthetic import write_operations
+from src.operations_store import load_typed_operations
+from src.shared_dataset import publish
+
+
+def _pss_kib() -> int:
+    with open("/proc/self/smaps_rollup") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+
+
+def _worker(mode: str, source: str, directory: str, seconds: float, barrier, results) -> None:
+    from src.aggregates import CARD_COLUMNS, daily_aggregates
+    from src.date_index import date_index
+    from src.fx_rates import with_base_amounts
+    from src.reports import get_expenses_by_day_of_week
+    from src.search_index import search_index
+    from src.services import simple_search
+    from src.shared_dataset import attach
+    from src.views import process_operations_data
+
+    started = time.perf_counter()
+    if mode == "shared":
+        attach(directory)
+    else:
+        df = load_typed_operations(source)
+        date_index(df)
+        search_index(df)
+        daily_aggregates(with_base_amounts(df), *CARD_COLUMNS)
+    setup = time.perf_counter() - started
+
+    requests = [lambda q=query: simple_search(q, source, limit=20) for query in QUERIES] + [
+        lambda: get_expenses_by_day_of_week.__wrapped__(source, "2021-03-01"),
+        lambda: process_operations_data(source, "2021-05-01", "2021-05-31"),
+    ]
+    barrier.wait()
+    done, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        requests[done % len(requests)]()
+        done += 1
+    results.put((done, setup, _pss_kib()))
+
+
+def run(mode: str, workers: int, source: str, directory: str, seconds: float) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(mode, source, directory, seconds, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    rows: List[tuple] = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "rps": sum(row[0] for row in rows) / seconds,
+        "setup": max(row[1] for row in rows),
+        "pss_mib": sum(row[2] for row in rows) / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"ядер: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = write_operations(os.path.join(tmp_dir, "operations.csv"), args.rows, args.seed)
+        # Колоночный кэш и производные структуры на диске готовы до замеров обоих режимов
+        load_typed_operations(source)
+        with publish(source) as shared:
+            print(f"выложено: {shared.nbytes / 2**20:.0f} МиБ")
+            print(f"{'режим':8} {'процессов':>9} {'запр/с':>9} {'ускорение':>10} {'подготовка, с':>14} {'PSS, МиБ':>9}")
+            for mode in ("shared", "private"):
+                base = None
+                for workers in args.workers:
+                    result = run(mode, workers, source, shared.directory, args.seconds)
+                    base = base or result["rps"]
+                    print(
+                        f"{mode:8} {workers:>9} {result['rps']:>9.1f} {result['rps'] / base:>10.2f} "
+                        f"{result['setup']:>14.2f} {result['pss_mib']:>9.0f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
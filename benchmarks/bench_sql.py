@@ -0,0 +1,93 @@
+"""
+Бэкенд SQLite против pandas на одних и тех же запросах: структурированный поиск, отбор месяца,
+отчёт по дням недели и суммы по картам. Отдельно — холодный старт процесса (первый ответ поиска
+с загрузкой данных) и время однократного импорта.
+
+Запуск: python -m benchmarks.bench_sql --rows 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_search import QUERIES, best_of
+from benchmarks.synthetic import write_operations
+from src import sql_store
+from src.aggregates import daily_aggregates
+from src.date_index import date_index
+from src.operations_store import BASE_DIR, load_typed_operations
+from src.query import query_positions
+from src.report_engine import spending_report
+from src.schema import AMOUNT, CARD_NUMBER, CASHBACK
+from src.search_index import search_index
+
+COLD_START = (
+    "import json, os, time\n"
+    "os.environ['OPERATIONS_BACKEND'] = {backend!r}\n"
+    "started = time.perf_counter()\n"
+    "from src.services import simple_search\n"
+    "simple_search({query!r}, {source!r}, limit=100)\n"
+    "print(json.dumps(time.perf_counter() - started))\n"
+)
+
+
+def cold_start(source: str, backend: str, query: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START.format(backend=backend, query=query, source=source)],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = write_operations(os.path.join(tmp_dir, "operations.csv"), args.rows, args.seed)
+        df = load_typed_operations(source)
+        started = time.perf_counter()
+        store = sql_store.open_store(source)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(sql_store.database_path(source)) / 2**20
+        print(f"импорт {args.rows} строк: {elapsed:.1f} с, база {size:.0f} МиБ")
+        # Индексы pandas строятся один раз на таблицу и в замер не входят
+        date_index(df)
+        search_index(df)
+        aggregates = daily_aggregates(df, AMOUNT, CASHBACK, CARD_NUMBER)
+
+        cases = [(query, lambda q=query: query_positions(df, q), lambda q=query: store.query_positions(q))
+                 for query in QUERIES]
+        cases += [
+            ("месяц 2021-05", lambda: date_index(df).positions("2021-05-01", "2021-05-31"),
+             lambda: store.date_positions("2021-05-01", "2021-05-31")),
+            ("отчёт day_of_week × hour", lambda: spending_report(df, "2021-01-01", "2021-12-31", ["day_of_week", "hour"]),
+             lambda: store.spending_report("2021-01-01", "2021-12-31", ["day_of_week", "hour"])),
+            ("карты за месяц", lambda: aggregates.window("2021-05-01", "2021-05-31"),
+             lambda: store.card_window("2021-05-01", "2021-05-31")),
+        ]
+        print(f"{'pandas, мс':>11} {'sqlite, мс':>11}  запрос")
+        for name, pandas_case, sql_case in cases:
+            expected, found = pandas_case(), sql_case()
+            if isinstance(expected, np.ndarray):
+                assert np.array_equal(expected, found), name
+            pandas_time = best_of(pandas_case, args.repeat)
+            sql_time = best_of(sql_case, args.repeat)
+            print(f"{pandas_time * 1000:>11.1f} {sql_time * 1000:>11.1f}  {name}")
+
+        query = QUERIES[0]
+        print("холодный старт (первый ответ поиска в новом процессе):")
+        for backend in ("pandas", "sqlite"):
+            print(f"  {backend:7} {cold_start(source, backend, query):.2f} с")
+
+
+if __name__ == "__main__":
+    main()
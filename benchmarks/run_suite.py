@@ -0,0 +1,178 @@
+"""
+Набор бенчмарков на синтетических выгрузках: холодная и тёплая загрузка, фильтрация по дате,
+поиск, отчёт по дням недели, обработка операций и главная страница.
+Результаты пишутся в JSON и сравниваются с результатами другого коммита.
+
+Запуск:
+    python -m benchmarks.run_suite --sizes 10000 100000 --format xlsx
+    python -m benchmarks.run_suite --sizes 1000000 10000000 --format csv --repeat 3
+    python -m benchmarks.run_suite --compare benchmarks/results/<прошлый>.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from unittest.mock import patch
+
+from benchmarks.synthetic import XLSX_MAX_ROWS, write_operations
+from src import main as main_module
+from src import operations_store
+from src.operations_store import BASE_DIR, cache_dir_for, clear_memory_cache, load_typed_operations
+from src.reports import get_expenses_by_day_of_week
+from src.services import simple_search
+from src.utils import filtered_operations
+from src.views import process_operations_data
+
+DATA_DIR = os.path.join(BASE_DIR, "benchmarks", ".data")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+# Холодная загрузка разбирает файл целиком, поэтому повторяется меньше раз
+COLD_REPEAT = 1
+# Замедление, начиная с которого сравнение считает случай регрессией
+REGRESSION_RATIO = 1.2
+
+# Конец синтетического периода: окна отчётов берутся у его края
+HOME_DATETIME = "2021-12-31 12:00:00"
+REPORT_START = "2021-10-01"
+MONTH_START, MONTH_END = "2021-12-01", "2021-12-31"
+
+
+def dataset_path(rows: int, file_format: str, seed: int) -> str:
+    """Синтетическая выгрузка нужного размера; генерируется один раз и переиспользуется."""
+    if file_format == "xlsx" and rows > XLSX_MAX_ROWS:
+        file_format = "csv"
+    path = os.path.join(DATA_DIR, f"operations_{rows}_{seed}.{file_format}")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Генерация {path}...", flush=True)
+        write_operations(path + ".tmp" + os.path.splitext(path)[1], rows, seed)
+        os.replace(path + ".tmp" + os.path.splitext(path)[1], path)
+    return path
+
+
+def cold_load(path: str) -> None:
+    clear_memory_cache()
+    shutil.rmtree(cache_dir_for(path), ignore_errors=True)
+    load_typed_operations(path)
+
+
+def warm_load(path: str) -> None:
+    clear_memory_cache()
+    load_typed_operations(path)
+
+
+def cases(path: str) -> Dict[str, Callable[[], object]]:
+    return {
+        "cold_load": lambda: cold_load(path),
+        "warm_load": lambda: warm_load(path),
+        "filtered_operations": lambda: filtered_operations(HOME_DATETIME),
+        "simple_search": lambda: simple_search("магнит", path),
+        "expenses_by_day_of_week": lambda: get_expenses_by_day_of_week.__wrapped__(path, REPORT_START),
+        "process_operations_data": lambda: process_operations_data(path, MONTH_START, MONTH_END),
+        "home_page": lambda: main_module.home_page_function(HOME_DATETIME),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Первый запуск (с построением индексов) отдельно от повторных."""
+    timings = []
+    for _ in range(repeat + 1):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    rest = timings[1:] or timings
+    return {"first": timings[0], "best": min(rest), "mean": statistics.mean(rest)}
+
+
+def run(sizes: List[int], file_format: str, repeat: int, seed: int, only: Optional[List[str]]) -> List[dict]:
+    results = []
+    for rows in sizes:
+        path = dataset_path(rows, file_format, seed)
+        # Главная страница и фильтрация читают файл по умолчанию, внешние API не опрашиваются
+        with patch.object(operations_store, "OPERATIONS_PATH", path), patch.object(
+            main_module, "currency_rates", return_value=([], [])
+        ):
+            clear_memory_cache()
+            load_typed_operations(path)
+            for name, func in cases(path).items():
+                if only and name not in only:
+                    continue
+                timing = measure(func, min(repeat, COLD_REPEAT) if name == "cold_load" else repeat)
+                results.append({"case": name, "rows": rows, "format": os.path.splitext(path)[1][1:], **timing})
+                print(f"{name:26} {rows:>10} {timing['first'] * 1000:10.1f} {timing['best'] * 1000:10.1f} мс")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: List[dict], baseline_path: str) -> List[str]:
+    """Сравнивает лучшее время каждого случая с базовым прогоном; возвращает регрессии."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["rows"], r["format"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nСравнение с {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["case"], result["rows"], result["format"]))
+        if old is None:
+            continue
+        ratio = result["best"] / old["best"] if old["best"] else float("inf")
+        mark = " РЕГРЕССИЯ" if ratio > REGRESSION_RATIO else ""
+        print(f"{result['case']:26} {result['rows']:>10} {ratio:6.2f}x{mark}")
+        if mark:
+            regressions.append(f"{result['case']}@{result['rows']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--cases", nargs="+", help="запустить только перечисленные случаи")
+    parser.add_argument("--output", help="файл результатов (по умолчанию benchmarks/results/<дата>-<коммит>.json)")
+    parser.add_argument("--compare", help="результаты прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    print(f"{'случай':26} {'строк':>10} {'первый':>10} {'лучший':>10}")
+    results = run(args.sizes, args.format, args.repeat, args.seed, args.cases)
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "results": results,
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    print(f"Результаты сохранены: {output}")
+
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Генератор синтетических выгрузок операций с той же схемой, что и data/operations.xlsx.
+Результат полностью определяется seed и числом строк.
+
+Запуск: python -m benchmarks.synthetic operations_1m.csv --rows 1000000 --seed 42
+"""
+import argparse
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from src.schema import (AMOUNT, BONUSES, CARD_NUMBER, CASHBACK, CATEGORY,
+                        DESCRIPTION, INVESTMENT_ROUNDING, MCC,
+                        OPERATION_AMOUNT, OPERATION_CURRENCY, OPERATION_DATE,
+                        PAYMENT_AMOUNT, PAYMENT_CURRENCY, PAYMENT_DATE, STATUS)
+
+COLUMNS = [
+    OPERATION_DATE,
+    PAYMENT_DATE,
+    CARD_NUMBER,
+    STATUS,
+    OPERATION_AMOUNT,
+    OPERATION_CURRENCY,
+    PAYMENT_AMOUNT,
+    PAYMENT_CURRENCY,
+    CASHBACK,
+    CATEGORY,
+    MCC,
+    DESCRIPTION,
+    BONUSES,
+    INVESTMENT_ROUNDING,
+    AMOUNT,
+]
+
+# Категория: (доля операций, MCC, медианная сумма, доля поступлений, описания)
+CATEGORIES = {
+    "Супермаркеты": (0.34, 5411, 113, 0.0, ["Колхоз", "Магнит", "SPAR", "Дикси", "Перекрёсток", "Пятёрочка"]),
+    "Фастфуд": (0.19, 5814, 110, 0.0, ["McDonald's", "Rumyanyj Khleb", "Бургер Кинг", "Kofe s sobojj"]),
+    "Транспорт": (0.06, 4131, 187, 0.0, ["Яндекс Такси", "Метро Санкт-Петербург", "Стрелка", "Московский транспорт"]),
+    "Переводы": (0.05, 6012, 7800, 0.35, ["Перевод на карту", "Иван С.", "Сергей З.", "Анна П.", "Ольга К."]),
+    "Ж/д билеты": (0.04, 4112, 300, 0.05, ["РЖД", "Аэроэкспресс", "Московский метрополитен"]),
+    "Различные товары": (0.03, 5399, 143, 0.0, ["Улыбка радуги", "Ozon.ru", "WILDBERRIES"]),
+    "Связь": (0.03, 7379, 250, 0.0, ["МТС", "Билайн", "МТС Mobile +7 921 111-22-33", "Я МТС +7 981 333-44-55"]),
+    "Пополнения": (0.03, 6012, 7000, 1.0, ["Перевод с карты", "Внесение наличных через банкомат Тинькофф"]),
+    "Аптеки": (0.02, 5912, 356, 0.0, ["Apteka 7", "Аптека Вита"]),
+    "Каршеринг": (0.02, 7512, 54, 0.0, ["Ситидрайв"]),
+    "Рестораны": (0.02, 5812, 150, 0.0, ['OOO "Nord-S"', "Kebab 24 Mm"]),
+    "Бонусы": (0.015, None, 390, 1.0, ["Вознаграждение за операции покупок", "Проценты на остаток"]),
+    "Наличные": (0.015, 6011, 3500, 0.0, ["Снятие в банкомате Сбербанк", "Снятие в банкомате Тинькофф"]),
+    "Дом и ремонт": (0.015, 5200, 320, 0.0, ["Строитель", "МаксидоМ", "Леруа Мерлен"]),
+    "Услуги банка": (0.015, None, 59, 0.0, ["Плата за оповещения об операциях", "Комиссия за операцию"]),
+    "Топливо": (0.01, 5541, 149, 0.0, ["Circle K", "ЛУКОЙЛ", "Газпромнефть"]),
+    "Одежда и обувь": (0.01, 5651, 525, 0.0, ["Detki", "WILDBERRIES"]),
+    "ЖКХ": (0.01, None, 2274, 0.0, ["ЖКУ Дом", "ЖКУ Квартира", "Электричество"]),
+    "Другое": (0.01, 5817, 1769, 0.08, ["Google Play", "App Store"]),
+}
+CARDS = ["*7197", "*4556", None, "*5091", "*5441", "*1112"]
+CARD_WEIGHTS = [0.72, 0.17, 0.097, 0.008, 0.003, 0.002]
+CURRENCIES = ["RUB", "TRY", "EUR", "CNY", "USD"]
+CURRENCY_WEIGHTS = [0.98, 0.011, 0.0045, 0.0027, 0.0018]
+# Примерные курсы к рублю: сумма операции в валюте получается из рублёвой суммы
+RUB_RATES = {"RUB": 1.0, "TRY": 8.5, "EUR": 88.0, "CNY": 11.5, "USD": 75.0}
+# Доля операций в валюте, оплаченных с валютного счёта в той же валюте, а не в рублях
+FOREIGN_PAYMENT_SHARE = 0.2
+
+DEFAULT_START = "2018-01-01"
+DEFAULT_END = "2021-12-31 23:59:59"
+CHUNK_ROWS = 500_000
+# Ограничение листа Excel без строки заголовка
+XLSX_MAX_ROWS = 1_048_575
+
+
+def _format_dates(seconds: np.ndarray, with_time: bool) -> np.ndarray:
+    """Даты в формате выгрузки (ДД.ММ.ГГГГ[ ЧЧ:ММ:СС]) перестановкой символов ISO-строк."""
+    iso = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s").astype("<U19")
+    chars = iso.view(np.uint32).reshape(len(iso), 19)
+    # 'YYYY-MM-DDTHH:MM:SS' -> 'DD.MM.YYYY HH:MM:SS'
+    order = [8, 9, 4, 5, 6, 4, 0, 1, 2, 3] + ([10, 11, 12, 13, 14, 15, 16, 17, 18] if with_time else [])
+    result = chars[:, order].copy()
+    result[:, [2, 5]] = ord(".")
+    if with_time:
+        result[:, 10] = ord(" ")
+    return result.view(f"<U{len(order)}").ravel()
+
+
+def generate_chunks(
+    rows: int, seed: int = 42, start: str = DEFAULT_START, end: str = DEFAULT_END, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Порции синтетических операций, как в выгрузке банка — от новых к старым.
+    Каждая порция покрывает свой отрезок периода и получает собственный поток случайных чисел.
+    """
+    names = list(CATEGORIES)
+    weights = np.array([CATEGORIES[name][0] for name in names])
+    weights /= weights.sum()
+    start_s = pd.Timestamp(start).value // 10**9
+    span = pd.Timestamp(end).value // 10**9 - start_s
+
+    n_chunks = max(1, -(-rows // chunk_rows))
+    streams = np.random.SeedSequence(seed).spawn(n_chunks)
+    for i, stream in enumerate(streams):
+        rng = np.random.default_rng(stream)
+        n = min(chunk_rows, rows - i * chunk_rows)
+        # Порции идут от конца периода к началу
+        lo = start_s + span * (rows - i * chunk_rows - n) // max(rows, 1)
+        hi = start_s + span * (rows - i * chunk_rows) // max(rows, 1)
+        seconds = np.sort(rng.integers(lo, max(hi, lo + 1), n))[::-1]
+        payment = seconds // 86400 * 86400 + rng.integers(0, 3, n) * 86400
+
+        category_codes = rng.choice(len(names), n, p=weights)
+        categories = np.array(names, dtype=object)[category_codes]
+        mcc = np.array([np.nan if CATEGORIES[name][1] is None else CATEGORIES[name][1] for name in names])
+        medians = np.array([CATEGORIES[name][2] for name in names], dtype=float)
+        incoming = np.array([CATEGORIES[name][3] for name in names])
+        descriptions = np.empty(n, dtype=object)
+        for code, name in enumerate(names):
+            mask = category_codes == code
+            options = np.array(CATEGORIES[name][4], dtype=object)
+            descriptions[mask] = options[rng.integers(0, len(options), int(mask.sum()))]
+
+        amounts = np.round(medians[category_codes] * rng.lognormal(0.0, 0.9, n) + 0.01, 2)
+        signs = np.where(rng.random(n) < incoming[category_codes], 1.0, -1.0)
+        cashback = np.where(rng.random(n) < 0.05, np.round(amounts * 0.01, 2), np.nan)
+        rounding = np.where(rng.random(n) < 0.1, np.ceil(amounts / 50) * 50 - amounts, 0).round(0).astype(np.int64)
+        cards = rng.choice(np.array(CARDS, dtype=object), n, p=CARD_WEIGHTS)
+        statuses = np.where(rng.random(n) < 0.994, "OK", "FAILED")
+
+        # Операция в валюте списывается в рублях по курсу (как в выгрузке банка), реже — с валютного счёта
+        currency_codes = rng.choice(len(CURRENCIES), n, p=CURRENCY_WEIGHTS)
+        currencies = np.array(CURRENCIES, dtype=object)[currency_codes]
+        rub_rates = np.array([RUB_RATES[currency] for currency in CURRENCIES])[currency_codes]
+        operation_amounts = np.where(currency_codes > 0, np.maximum(np.round(amounts / rub_rates, 2), 0.01), amounts)
+        in_currency = (currency_codes > 0) & (rng.random(n) < FOREIGN_PAYMENT_SHARE)
+        payment_amounts = np.where(in_currency, operation_amounts, amounts)
+
+        yield pd.DataFrame(
+            {
+                OPERATION_DATE: _format_dates(seconds, with_time=True),
+                PAYMENT_DATE: _format_dates(payment, with_time=False),
+                CARD_NUMBER: cards,
+                STATUS: statuses,
+                OPERATION_AMOUNT: signs * operation_amounts,
+                OPERATION_CURRENCY: currencies,
+                PAYMENT_AMOUNT: signs * payment_amounts,
+                PAYMENT_CURRENCY: np.where(in_currency, currencies, "RUB"),
+                CASHBACK: cashback,
+                CATEGORY: categories,
+                MCC: mcc[category_codes],
+                DESCRIPTION: descriptions,
+                BONUSES: (amounts // 100).astype(np.int64),
+                INVESTMENT_ROUNDING: rounding,
+                AMOUNT: payment_amounts,
+            },
+            columns=COLUMNS,
+        )
+
+
+def generate_operations(rows: int, seed: int = 42, **kwargs) -> pd.DataFrame:
+    """Синтетическая выгрузка целиком в памяти."""
+    return pd.concat(list(generate_chunks(rows, seed, **kwargs)), ignore_index=True)
+
+
+def write_operations(path: str, rows: int, seed: int = 42, **kwargs) -> str:
+    """
+    Записывает синтетическую выгрузку в xlsx (построчно, без построения листа в памяти)
+    или CSV — по расширению файла. Для xlsx число строк ограничено размером листа Excel.
+    """
+    if os.path.splitext(path)[1].lower() == ".csv":
+        for i, chunk in enumerate(generate_chunks(rows, seed, **kwargs)):
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        return path
+
+    if rows > XLSX_MAX_ROWS:
+        raise ValueError(f"В лист Excel помещается не более {XLSX_MAX_ROWS} строк, используйте CSV")
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for chunk in generate_chunks(rows, seed, **kwargs):
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="файл выгрузки (.xlsx или .csv)")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    write_operations(args.path, args.rows, args.seed)
+    print(f"Записано {args.rows} строк в {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import DateLike, date_index
+from src.dtypes import kopecks
+from src.operations_store import derived_path, frame_memo, save_atomically
+from src.schema import BASE_AMOUNT, CARD_NUMBER, CASHBACK, OPERATION_DATE
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 5
+AGGREGATES_FILE = "daily_aggregates_{}.npz"
+AGGREGATES_PREFIX = "daily_aggregates_"
+# Столбцы агрегатов главной страницы: суммы в базовой валюте, кешбэк, номер карты
+CARD_COLUMNS = (BASE_AMOUNT, CASHBACK, CARD_NUMBER)
+
+
+class DailyAggregates:
+    """
+    Материализованные дневные агрегаты: суммы и кешбэк по картам за каждый день
+    и номера строк с наибольшими суммами (топ-K) за каждый день.
+    Любое окно в днях собирается из частичных сумм своих дней, без просмотра строк.
+    """
+
+    def __init__(
+        self,
+        days: np.ndarray,
+        cards: np.ndarray,
+        amounts: np.ndarray,
+        cashback: np.ndarray,
+        counts: np.ndarray,
+        top_rows: np.ndarray,
+        top_amounts: np.ndarray,
+        columns: Tuple[str, str, str] = ("", "", ""),
+        rows: int = -1,
+    ):
+        self.days = days  # datetime64[D], по возрастанию
+        self.cards = cards  # номера карт, столбцы матриц
+        self.amounts = amounts  # [день, карта], копейки
+        self.cashback = cashback  # [день, карта], копейки
+        self.counts = counts  # [день, карта]
+        self.top_rows = top_rows  # [день, K], -1 — пусто
+        self.top_amounts = top_amounts  # [день, K], копейки
+        self.columns = columns  # столбцы суммы, кешбэка и номера карты
+        self.rows = rows  # число строк таблицы, по которым построены агрегаты (-1 — неизвестно)
+
+    @classmethod
+    def build(
+        cls, df: pd.DataFrame, amount_column: str, cashback_column: str, card_column: str, first_row: int = 0
+    ) -> "DailyAggregates":
+        dates = date_index(df, OPERATION_DATE).dates
+        valid = ~np.isnat(dates)
+        days, day_codes = np.unique(dates[valid].astype("datetime64[D]"), return_inverse=True)
+        rows = np.flatnonzero(valid)
+
+        card_codes, cards = pd.factorize(df[card_column].to_numpy()[valid])
+        # Суммы считаются в копейках: целые значения складываются без накопления ошибки
+        amounts = kopecks(df[amount_column])[valid]
+        cashback = kopecks(df[cashback_column])[valid]
+
+        # Частичные суммы по (день, карта); пропуски в суммах считаются нулём, как в groupby().sum()
+        n_days, n_cards = len(days), len(cards)
+        with_card = card_codes >= 0
+        cells = day_codes[with_card] * n_cards + card_codes[with_card]
+        size = n_days * n_cards
+
+        def cube(weights: Optional[np.ndarray]) -> np.ndarray:
+            if weights is not None:
+                weights = np.nan_to_num(weights[with_card])
+            return np.bincount(cells, weights=weights, minlength=size).reshape(n_days, n_cards)
+
+        # Топ-K строк каждого дня: сортировка по дню, сумме (по убыванию) и номеру строки
+        has_amount = ~np.isnan(amounts)
+        order = np.lexsort((rows[has_amount], -amounts[has_amount], day_codes[has_amount]))
+        top_days = day_codes[has_amount][order]
+        group_start = np.searchsorted(top_days, np.arange(n_days))
+        rank = np.arange(len(top_days)) - group_start[top_days]
+        keep = rank < TOP_K
+        top_rows = np.full((n_days, TOP_K), -1, dtype=np.int64)
+        top_amounts = np.full((n_days, TOP_K), np.nan)
+        top_rows[top_days[keep], rank[keep]] = rows[has_amount][order][keep] + first_row
+        top_amounts[top_days[keep], rank[keep]] = amounts[has_amount][order][keep]
+
+        return cls(
+            days,
+            np.asarray(cards, dtype=object),
+            cube(amounts),
+            cube(cashback),
+            cube(None).astype(np.int64),
+            top_rows,
+            top_amounts,
+            (amount_column, cashback_column, card_column),
+            first_row + len(df),
+        )
+
+    def merge(self, other: "DailyAggregates") -> "DailyAggregates":
+        """Объединяет агрегаты (например, с агрегатами дописанных строк)."""
+        days = np.union1d(self.days, other.days)
+        cards = pd.Index(self.cards).append(pd.Index(other.cards)).unique()
+
+        def place(source: "DailyAggregates", matrix: np.ndarray) -> np.ndarray:
+            result = np.zeros((len(days), len(cards)), dtype=matrix.dtype)
+            result[np.ix_(np.searchsorted(days, source.days), cards.get_indexer(source.cards))] = matrix
+            return result
+
+        amounts = place(self, self.amounts) + place(other, other.amounts)
+        cashback = place(self, self.cashback) + place(other, other.cashback)
+        counts = place(self, self.counts) + place(other, other.counts)
+
+        top_rows = np.full((len(days), 2 * TOP_K), -1, dtype=np.int64)
+        top_amounts = np.full((len(days), 2 * TOP_K), np.nan)
+        for i, source in enumerate((self, other)):
+            positions = np.searchsorted(days, source.days)
+            top_rows[positions, i * TOP_K:(i + 1) * TOP_K] = source.top_rows
+            top_amounts[positions, i * TOP_K:(i + 1) * TOP_K] = source.top_amounts
+        # Внутри дня: по убыванию суммы, затем по номеру строки; пустые ячейки — в конец
+        width = 2 * TOP_K
+        day_ids = np.repeat(np.arange(len(days)), width)
+        row_key = np.where(top_rows < 0, np.iinfo(np.int64).max, top_rows).ravel()
+        amount_key = -np.nan_to_num(top_amounts, nan=-np.inf).ravel()
+        order = np.lexsort((row_key, amount_key, day_ids)).reshape(len(days), width)[:, :TOP_K]
+        top_rows = top_rows.ravel()[order]
+        top_amounts = top_amounts.ravel()[order]
+
+        return DailyAggregates(
+            days,
+            np.asarray(cards, dtype=object),
+            amounts,
+            cashback,
+            counts,
+            top_rows,
+            top_amounts,
+            self.columns,
+            max(self.rows, other.rows),
+        )
+
+    def extend(self, df: pd.DataFrame, first_row: int) -> "DailyAggregates":
+        """Агрегаты с учётом дописанных строк: считаются только новые строки, начиная с first_row."""
+        return self.merge(DailyAggregates.build(df, *self.columns, first_row))
+
+    def window(self, start: DateLike, end: DateLike) -> Tuple[List[Dict], np.ndarray]:
+        """
+        Суммы по картам и номера строк топ-K операций за дни [start, end].
+        Стоимость зависит только от числа дней в окне, а не от объёма истории.
+        """
+        lo = int(np.searchsorted(self.days, np.datetime64(pd.Timestamp(start).date(), "D"), side="left"))
+        hi = int(np.searchsorted(self.days, np.datetime64(pd.Timestamp(end).date(), "D"), side="right"))
+
+        counts = self.counts[lo:hi].sum(axis=0)
+        amounts = self.amounts[lo:hi].sum(axis=0)
+        cashback = self.cashback[lo:hi].sum(axis=0)
+        present = np.flatnonzero(counts > 0)
+        present = present[np.argsort(self.cards[present].astype(str), kind="stable")]
+        card_totals = [
+            {"card": self.cards[i], "amount": float(amounts[i]) / 100, "cashback": float(cashback[i]) / 100}
+            for i in present
+        ]
+
+        rows = self.top_rows[lo:hi].ravel()
+        values = self.top_amounts[lo:hi].ravel()
+        filled = rows >= 0
+        rows, values = rows[filled], values[filled]
+        top = rows[np.lexsort((rows, -values))][:TOP_K]
+        return card_totals, top
+
+    @property
+    def nbytes(self) -> int:
+        """Память матриц агрегатов."""
+        arrays = (self.days, self.cards, self.amounts, self.cashback, self.counts, self.top_rows, self.top_amounts)
+        return int(sum(array.nbytes for array in arrays))
+
+    def save(self, path: str) -> None:
+        save_atomically(path, lambda f: np.savez(
+            f,
+            days=self.days,
+            cards=self.cards.astype(str),
+            amounts=self.amounts,
+            cashback=self.cashback,
+            counts=self.counts,
+            top_rows=self.top_rows,
+            top_amounts=self.top_amounts,
+            columns=np.array(self.columns),
+            rows=self.rows,
+        ))
+
+    @classmethod
+    def load(cls, path: str) -> "DailyAggregates":
+        with np.load(path) as data:
+            return cls(
+                data["days"],
+                data["cards"].astype(object),
+                data["amounts"],
+                data["cashback"],
+                data["counts"],
+                data["top_rows"],
+                data["top_amounts"],
+                tuple(data["columns"].tolist()),
+                int(data["rows"]) if "rows" in data else -1,
+            )
+
+
+def daily_aggregates(df: pd.DataFrame, amount_column: str, cashback_column: str, card_column: str) -> DailyAggregates:
+    """
+    Дневные агрегаты таблицы: строятся один раз на DataFrame,
+    для таблиц из хранилища операций сохраняются рядом с кэшем.
+    """
+    columns = (amount_column, cashback_column, card_column)
+    return frame_memo(
+        df, aggregates_key(*columns), lambda: _build_daily_aggregates(df, *columns), columns=columns + (OPERATION_DATE,)
+    )
+
+
+def aggregates_key(amount_column: str, cashback_column: str, card_column: str) -> str:
+    """Имя агрегатов в frame_memo: по нему их находят выкладка в разделяемую память и главная."""
+    return f"daily_aggregates:{(amount_column, cashback_column, card_column)}"
+
+
+def _build_daily_aggregates(
+    df: pd.DataFrame, amount_column: str, cashback_column: str, card_column: str
+) -> DailyAggregates:
+    key = hashlib.md5("|".join((amount_column, cashback_column, card_column)).encode()).hexdigest()[:12]
+    name = AGGREGATES_FILE.format(key)
+    path = derived_path(df, name)
+    if path is not None and os.path.exists(path):
+        try:
+            aggregates = DailyAggregates.load(path)
+            if aggregates.rows == len(df):
+                return aggregates
+            logger.warning(f"Агрегаты {path} построены по {aggregates.rows} строкам из {len(df)}, строятся заново")
+        except Exception as e:
+            logger.error(f"Ошибка чтения агрегатов {path}: {e}")
+
+    aggregates = DailyAggregates.build(df, amount_column, cashback_column, card_column)
+    if path is not None:
+        try:
+            aggregates.save(path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения агрегатов {path}: {e}")
+    return aggregates
@@ -0,0 +1,253 @@
+"""
+Наборы данных пользователей: у каждого клиента своя выгрузка операций и свои настройки.
+
+DatasetManager сопоставляет идентификатору пользователя пути к его файлам, лениво загружает
+подготовленную таблицу и настройки, учитывает занимаемую ими память и при превышении бюджета
+вытесняет давно не использовавшихся пользователей (LRU). Одновременные первые запросы
+одного пользователя ждут одну общую загрузку.
+
+Пути берутся из реестра USERS_FILE ({"id": {"operations": путь, "settings": путь}}),
+а для незарегистрированных — по соглашению: USERS_DIR/<id>/operations.xlsx и user_settings.json.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Union
+
+import pandas as pd
+
+from src import operations_store
+from src.operations_store import BASE_DIR, load_typed_operations, memo_bytes, memo_version, source_version
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+USERS_DIR = os.getenv("USERS_DIR", os.path.join(BASE_DIR, "data", "users"))
+USERS_FILE = os.getenv("USERS_FILE", os.path.join(USERS_DIR, "users.json"))
+# Бюджет памяти на загруженные наборы пользователей, МиБ
+MEMORY_BUDGET = int(os.getenv("DATASET_MEMORY_MB", "1024")) << 20
+OPERATIONS_FILE = "operations.xlsx"
+SETTINGS_FILE = "user_settings.json"
+_USER_ID = re.compile(r"^[\w.-]+$")
+
+
+class UserContext(NamedTuple):
+    """Пользователь и пути к его выгрузке операций и настройкам."""
+
+    user_id: str
+    operations_path: str
+    settings_path: str
+
+
+class Dataset(NamedTuple):
+    """
+    Загруженные данные пользователя: таблица операций, настройки, версия источника и объём таблицы в памяти.
+    Построенные по таблице индексы и агрегаты учитываются отдельно (memory_bytes).
+    """
+
+    context: UserContext
+    operations: pd.DataFrame
+    settings: dict
+    version: Optional[str]
+    nbytes: int
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """Память таблицы: массивы столбцов, словари категорий и строки."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def memory_bytes(entry: Dataset) -> int:
+    """Память набора: таблица и построенные по ней структуры (индексы дат и поиска, дневные агрегаты)."""
+    return entry.nbytes + memo_bytes(entry.operations)
+
+
+def _read_settings(path: str) -> dict:
+    if not os.path.exists(path):
+        logger.warning(f"Файл настроек {path} не найден, используются пустые настройки")
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class DatasetManager:
+    """Кэш наборов данных пользователей с ограничением по памяти и вытеснением LRU."""
+
+    def __init__(
+        self,
+        users: Optional[Mapping[str, Mapping[str, str]]] = None,
+        users_dir: str = USERS_DIR,
+        memory_budget: int = MEMORY_BUDGET,
+    ):
+        self.users = dict(users) if users is not None else self._read_registry()
+        self.users_dir = users_dir
+        self.memory_budget = memory_budget
+        self._entries: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        # Объём наборов (memory_bytes) на момент метки memo_version: пересчитывается после построения структур
+        self._sizes: Dict[str, int] = {}
+        self._sizes_version = memo_version()
+        self._lock = threading.Lock()
+        self.hits = self.loads = self.evictions = 0
+
+    @staticmethod
+    def _read_registry() -> Dict[str, Dict[str, str]]:
+        try:
+            with open(USERS_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def context(self, user: Union[str, UserContext]) -> UserContext:
+        """Контекст пользователя по идентификатору (контекст возвращается как есть)."""
+        if isinstance(user, UserContext):
+            return user
+        if not _USER_ID.match(user or "") or user in (".", ".."):
+            raise ValueError(f"Некорректный идентификатор пользователя: {user}")
+        entry = self.users.get(user)
+        if entry is not None:
+            settings = entry.get("settings", os.path.join(self.users_dir, user, SETTINGS_FILE))
+            return UserContext(user, entry["operations"], settings)
+        user_dir = os.path.join(self.users_dir, user)
+        if not os.path.isdir(user_dir):
+            raise ValueError(f"Неизвестный пользователь: {user}")
+        return UserContext(user, os.path.join(user_dir, OPERATIONS_FILE), os.path.join(user_dir, SETTINGS_FILE))
+
+    @property
+    def memory_used(self) -> int:
+        # Структуры строятся по запросам после загрузки — объёмы пересчитываются, только если появились новые
+        version = memo_version()
+        if version != self._sizes_version:
+            self._sizes.clear()
+            self._sizes_version = version
+        for user_id, entry in self._entries.items():
+            if user_id not in self._sizes:
+                self._sizes[user_id] = memory_bytes(entry)
+        return sum(self._sizes.values())
+
+    def get(self, user: Union[str, UserContext]) -> Dataset:
+        """
+        Данные пользователя: из кэша, если источник не менялся, иначе — загрузка.
+        Пока идёт загрузка, остальные запросы того же пользователя ждут её результат.
+        """
+        context = self.context(user)
+        user_id = context.user_id
+        version = source_version(context.operations_path)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.context == context and entry.version == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            waiting = self._loading.get(user_id)
+            if waiting is None:
+                future = self._loading[user_id] = Future()
+        if waiting is not None:
+            return waiting.result()
+
+        try:
+            entry = self._load(context, version)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(user_id, None)
+            self._entries[user_id] = entry
+            self._sizes.pop(user_id, None)
+            self._entries.move_to_end(user_id)
+            self.loads += 1
+            self._evict_over_budget(keep=user_id)
+        future.set_result(entry)
+        return entry
+
+    def _load(self, context: UserContext, version: Optional[str]) -> Dataset:
+        with stage("datasets.load") as span:
+            operations = load_typed_operations(context.operations_path)
+            settings = _read_settings(context.settings_path)
+            entry = Dataset(context, operations, settings, version, frame_bytes(operations))
+            # Структуры, выложенные вместе с таблицей (разделяемая память), уже построены
+            nbytes = memory_bytes(entry)
+            span.add(rows=len(operations), size=nbytes)
+        logger.info(f"Загружены данные пользователя {context.user_id}: {len(operations)} строк, {nbytes >> 20} МиБ")
+        return entry
+
+    def _evict_over_budget(self, keep: str) -> None:
+        """Вытесняет самых давних пользователей, пока память не уложится в бюджет (текущего не трогает)."""
+        while self.memory_used > self.memory_budget and len(self._entries) > 1:
+            user_id = next(iter(self._entries))
+            if user_id == keep:
+                break
+            self._drop(user_id)
+            self.evictions += 1
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id)
+        size = self._sizes.pop(user_id, None)
+        # Та же таблица может быть у другого пользователя с общим источником — тогда она остаётся.
+        # Иначе она освобождается, когда её перестанут держать выполняющиеся запросы
+        path = entry.context.operations_path
+        if all(other.context.operations_path != path for other in self._entries.values()):
+            operations_store.forget(path, entry.operations)
+        logger.info(f"Данные пользователя {user_id} вытеснены из памяти ({(memory_bytes(entry) if size is None else size) >> 20} МиБ)")
+
+    def evict(self, user_id: str) -> bool:
+        """Выгружает данные пользователя; возвращает, были ли они загружены."""
+        with self._lock:
+            if user_id not in self._entries:
+                return False
+            self._drop(user_id)
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": list(self._entries),
+                "memory_bytes": self.memory_used,
+                "memory_budget": self.memory_budget,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+_manager: Optional[DatasetManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> DatasetManager:
+    """Общий менеджер наборов данных процесса."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = DatasetManager()
+        return _manager
+
+
+def set_manager(manager: Optional[DatasetManager]) -> None:
+    """Подменяет общий менеджер (None — создать заново при следующем обращении)."""
+    global _manager
+    with _manager_lock:
+        _manager = manager
+
+
+def operations_path(source: Union[str, UserContext]) -> str:
+    """Путь к операциям: сам путь или выгрузка пользователя."""
+    return source.operations_path if isinstance(source, UserContext) else source
+
+
+def operations_for(source: Union[str, UserContext]) -> pd.DataFrame:
+    """Таблица операций по пути или по контексту пользователя (через общий менеджер)."""
+    if isinstance(source, UserContext):
+        return get_manager().get(source).operations
+    return load_typed_operations(source)
+
+
+def settings_for(user: Union[str, UserContext]) -> dict:
+    """Настройки пользователя (загружаются вместе с его операциями)."""
+    return get_manager().get(user).settings
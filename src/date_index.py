@@ -0,0 +1,103 @@
+import logging
+import os
+from datetime import datetime
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from src.dtypes import DATE_FORMATS, parse_dates
+from src.operations_store import derived_path, frame_memo, save_atomically
+from src.schema import OPERATION_DATE, PAYMENT_DATE
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILES = {
+    OPERATION_DATE: "operation_date_index.npz",
+    PAYMENT_DATE: "payment_date_index.npz",
+}
+
+DateLike = Union[str, datetime, pd.Timestamp, np.datetime64]
+
+
+def to_datetime64(value: DateLike) -> np.datetime64:
+    """Приводит границу диапазона к numpy.datetime64[ns]."""
+    return pd.Timestamp(value).to_datetime64().astype("datetime64[ns]")
+
+
+class DateIndex:
+    """Отсортированный индекс по датам: диапазон ищется через searchsorted за O(log n + k)."""
+
+    def __init__(self, dates: np.ndarray, order: Optional[np.ndarray] = None):
+        self.dates = dates
+        # NaT при сортировке numpy оказываются в конце
+        self.order = np.argsort(dates, kind="stable") if order is None else order
+        self.sorted_dates = dates[self.order]
+        self.valid = len(dates) - int(np.isnat(self.sorted_dates).sum())
+
+    def positions(
+        self, start: Optional[DateLike] = None, end: Optional[DateLike] = None, keep_order: bool = True
+    ) -> np.ndarray:
+        """Номера строк с датой в [start, end]; keep_order — в исходном порядке строк, иначе по дате."""
+        sorted_dates = self.sorted_dates[: self.valid]
+        lo = 0 if start is None else int(np.searchsorted(sorted_dates, to_datetime64(start), side="left"))
+        hi = self.valid if end is None else int(np.searchsorted(sorted_dates, to_datetime64(end), side="right"))
+        positions = self.order[lo:max(lo, hi)]
+        return np.sort(positions) if keep_order else positions
+
+    @property
+    def nbytes(self) -> int:
+        """Память индекса; даты — вид столбца таблицы, если не скопированы."""
+        own_dates = self.dates.nbytes if self.dates.base is None else 0
+        return int(self.order.nbytes + self.sorted_dates.nbytes + own_dates)
+
+    def save(self, path: str) -> None:
+        save_atomically(path, lambda f: np.savez(f, dates=self.dates, order=self.order))
+
+    @classmethod
+    def load(cls, path: str) -> "DateIndex":
+        with np.load(path) as data:
+            return cls(data["dates"], data["order"])
+
+
+def date_index(df: pd.DataFrame, column: str = OPERATION_DATE) -> DateIndex:
+    """
+    Возвращает индекс дат для столбца таблицы, строя его один раз на DataFrame
+    (и заново, если столбец изменили на месте). Для таблиц из хранилища операций индекс сохраняется рядом с кэшем.
+    """
+    return frame_memo(df, f"date_index:{column}", lambda: _build_date_index(df, column), columns=(column,))
+
+
+def _build_date_index(df: pd.DataFrame, column: str) -> DateIndex:
+    path = derived_path(df, INDEX_FILES[column]) if column in INDEX_FILES else None
+    if path is not None and os.path.exists(path):
+        try:
+            index = DateIndex.load(path)
+            if len(index.dates) == len(df):
+                return index
+            logger.warning(f"Индекс дат {path} построен по {len(index.dates)} строкам из {len(df)}, строится заново")
+        except Exception as e:
+            logger.error(f"Ошибка чтения индекса дат {path}: {e}")
+
+    with stage("date_index.parse_dates") as span:
+        index = DateIndex(parse_dates(df[column], DATE_FORMATS.get(column)))
+        span.add(rows=len(df))
+    if path is not None:
+        try:
+            index.save(path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения индекса дат {path}: {e}")
+    return index
+
+
+def filter_by_date(
+    df: pd.DataFrame,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    column: str = OPERATION_DATE,
+) -> pd.DataFrame:
+    """Строки с датой в [start, end]; столбец дат в результате уже приведён к datetime64."""
+    index = date_index(df, column)
+    positions = index.positions(start, end)
+    return df.take(positions).assign(**{column: index.dates[positions]})
@@ -0,0 +1,138 @@
+"""
+Каноническая типизированная схема операций. Применяется один раз при загрузке:
+даты — datetime64, деньги — копейки в int64, короткий текст и номера карт — категории.
+"""
+import logging
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.schema import (AMOUNT, BASE_AMOUNT, BONUSES, CARD_NUMBER, CASHBACK, CATEGORY,
+                        DESCRIPTION, INVESTMENT_ROUNDING, MCC,
+                        OPERATION_AMOUNT, OPERATION_CURRENCY, OPERATION_DATE,
+                        PAYMENT_AMOUNT, PAYMENT_CURRENCY, PAYMENT_DATE, STATUS)
+
+logger = logging.getLogger(__name__)
+
+# Форматы дат в выгрузке банка; значения в другом формате разбираются с dayfirst=True
+DATE_FORMATS = {
+    OPERATION_DATE: "%d.%m.%Y %H:%M:%S",
+    PAYMENT_DATE: "%d.%m.%Y",
+}
+# Денежные столбцы хранятся в копейках (Int64 с пропусками)
+MONEY_COLUMNS = (OPERATION_AMOUNT, PAYMENT_AMOUNT, CASHBACK, AMOUNT, BASE_AMOUNT)
+# Текст с небольшим числом различных значений хранится кодами категорий
+CATEGORY_COLUMNS = (CARD_NUMBER, STATUS, OPERATION_CURRENCY, PAYMENT_CURRENCY, CATEGORY, DESCRIPTION)
+NARROW_INT_COLUMNS = {MCC: "Int16", BONUSES: "Int32", INVESTMENT_ROUNDING: "Int32"}
+MONEY_DTYPE = "Int64"
+
+
+def parse_dates(values: pd.Series, date_format: Optional[str] = None) -> np.ndarray:
+    """Однократно разбирает столбец дат в массив datetime64[ns] по явному формату."""
+    if values.dtype.kind == "M":
+        return values.to_numpy(dtype="datetime64[ns]")
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    # Сначала явный формат, затем ISO 8601 и лишь для остального — разбор с угадыванием
+    for fmt in (date_format, "ISO8601"):
+        rest = parsed.isna() & values.notna()
+        if fmt is not None and rest.any():
+            parsed[rest] = pd.to_datetime(values[rest], format=fmt, errors="coerce")
+    rest = parsed.isna() & values.notna()
+    if rest.any():
+        parsed[rest] = pd.to_datetime(values[rest], dayfirst=True, errors="coerce")
+    return parsed.to_numpy(dtype="datetime64[ns]")
+
+
+def is_money(series: pd.Series) -> bool:
+    """Столбец уже приведён к копейкам."""
+    return series.name in MONEY_COLUMNS and str(series.dtype) == MONEY_DTYPE
+
+
+def kopecks(series: pd.Series) -> np.ndarray:
+    """
+    Суммы столбца в копейках (float64 с NaN для пропусков; целые значения представлены точно).
+    Принимает как приведённые к схеме столбцы, так и исходные суммы в рублях.
+    """
+    if is_money(series):
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.round(pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64) * 100)
+
+
+def rubles(series: pd.Series) -> np.ndarray:
+    """Суммы столбца в рублях (float64, NaN для пропусков)."""
+    return kopecks(series) / 100
+
+
+def with_rubles(df: pd.DataFrame) -> pd.DataFrame:
+    """Таблица с денежными столбцами в рублях (float64, NaN для пропусков); остальные столбцы — как есть."""
+    return pd.DataFrame(
+        {name: rubles(df[name]) if is_money(df[name]) else df[name] for name in df.columns}, index=df.index
+    )
+
+
+def _to_kopecks(series: pd.Series) -> pd.Series:
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+    missing = np.isnan(values)
+    data = np.round(np.where(missing, 0, values) * 100).astype(np.int64)
+    return pd.Series(pd.arrays.IntegerArray(data, missing), index=series.index, name=series.name)
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Приводит выгрузку к канонической схеме; уже приведённые и незнакомые столбцы не трогает.
+    Исходный DataFrame не изменяется.
+    """
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        if name in DATE_FORMATS and series.dtype.kind != "M":
+            series = pd.Series(parse_dates(series, DATE_FORMATS[name]), index=df.index, name=name)
+        elif name in MONEY_COLUMNS and not is_money(series):
+            series = _to_kopecks(series)
+        elif name in CATEGORY_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        elif name in NARROW_INT_COLUMNS and str(series.dtype) != NARROW_INT_COLUMNS[name]:
+            values = pd.to_numeric(series, errors="coerce")
+            series = values.round().astype(NARROW_INT_COLUMNS[name])
+        columns[name] = series
+    return pd.DataFrame(columns, index=df.index)
+
+
+def concat_typed(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Склеивает приведённые к схеме части, объединяя словари категорий без перехода к object."""
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    categorical = [
+        name for name in frames[0].columns if isinstance(frames[0][name].dtype, pd.CategoricalDtype)
+    ]
+    categories = {}
+    for name in categorical:
+        union = pd.api.types.union_categoricals([frame[name] for frame in frames if name in frame.columns])
+        categories[name] = union.categories
+    aligned = [
+        frame.astype({name: pd.CategoricalDtype(categories[name]) for name in categorical if name in frame.columns})
+        for frame in frames
+    ]
+    return pd.concat(aligned, ignore_index=True)
+
+
+def display_values(series: pd.Series) -> pd.Series:
+    """Значения столбца в виде, как в выгрузке банка: даты — строками формата выгрузки, деньги — в рублях."""
+    if series.dtype.kind == "M":
+        return series.dt.strftime(DATE_FORMATS.get(series.name, "%Y-%m-%d %H:%M:%S")).astype(object)
+    if is_money(series):
+        return pd.Series(rubles(series), index=series.index, name=series.name)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(object)
+    return series
+
+
+def to_display(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Таблица в представлении выгрузки банка — для ответов и записей.
+    Предназначена для небольших срезов: сама таблица хранится в типизированном виде.
+    """
+    return pd.DataFrame({name: display_values(df[name]) for name in df.columns}, index=df.index)
@@ -0,0 +1,360 @@
+"""
+Выгрузка операций и отчётов в xlsx, CSV и Parquet порциями строк — память не растёт с размером выгрузки.
+
+xlsx пишется напрямую (SpreadsheetML в zip-архиве): лист кодируется порциями с векторной подготовкой
+ячеек и сразу сжимается в архив. Даты выгружаются датами Excel, суммы — числами с форматом «#,##0.00».
+
+Запуск:
+    python -m src.export operations operations.xlsx --start 2021-10-01 --end 2021-12-31
+    python -m src.export expenses-by-day-of-week report.xlsx --start-date 2021-10-01
+"""
+import argparse
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Union
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import date_index
+from src.dtypes import DATE_FORMATS, MONEY_COLUMNS, is_money, rubles, to_display
+from src.operations_store import OPERATIONS_PATH, load_typed_operations
+from src.responses import loads
+from src.schema import OPERATION_DATE
+from src.tracing import stage
+
+EXPORT_CHUNK_ROWS = 50_000
+# XML порции листа в несколько раз больше самих данных, поэтому порции xlsx меньше
+XLSX_CHUNK_ROWS = 10_000
+# Строк данных на листе Excel (без заголовка); большие выгрузки продолжаются на следующих листах
+XLSX_SHEET_ROWS = 1_048_575
+XLSX_COMPRESSLEVEL = 1
+
+# Индексы стилей ячеек в styles.xml
+STYLE_DATETIME, STYLE_DATE, STYLE_MONEY, STYLE_HEADER = 1, 2, 3, 4
+# Дата Excel — число дней от 1899-12-30; 25569 — 1970-01-01
+EXCEL_EPOCH_DAYS = 25569
+NS_PER_DAY = 86_400 * 10**9
+
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_EMPTY = "<c/>"
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "{sheets}</Types>"
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{i}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}"
+    '<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+_SHEET_REL = (
+    '<Relationship Id="rId{i}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{i}.xml"/>'
+)
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd.mm.yyyy hh:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="dd.mm.yyyy"/></numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>'
+    "<cols>{cols}</cols><sheetData>"
+)
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+
+def _text_cell(value: Any, style: int = 0) -> str:
+    text = _ILLEGAL_XML.sub("", str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    style_attr = f' s="{style}"' if style else ""
+    return f'<c t="inlineStr"{style_attr}><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _number_cells(values: np.ndarray, style: int = 0, integer: bool = False) -> List[str]:
+    """Ячейки чисел; NaN — пустые ячейки."""
+    prefix = f'<c s="{style}"><v>' if style else "<c><v>"
+    if integer:
+        return [_EMPTY if v != v else f"{prefix}{int(v)}</v></c>" for v in values.tolist()]
+    return [_EMPTY if v != v else f"{prefix}{v}</v></c>" for v in values.tolist()]
+
+
+def _cell_builder(series: pd.Series) -> Callable[[pd.Series], List[str]]:
+    """Функция, превращающая порцию столбца в XML ячеек; тип определяется один раз на столбец."""
+    dtype = series.dtype
+    if dtype.kind == "M":
+        with_time = "%H" in DATE_FORMATS.get(series.name, "%H")
+        style = STYLE_DATETIME if with_time else STYLE_DATE
+
+        def dates(chunk: pd.Series) -> List[str]:
+            values = chunk.to_numpy(dtype="datetime64[ns]")
+            serial = values.view(np.int64) / NS_PER_DAY + EXCEL_EPOCH_DAYS
+            serial[np.isnat(values)] = np.nan
+            return [_EMPTY if v != v else f'<c s="{style}"><v>{v}</v></c>' for v in serial.tolist()]
+
+        return dates
+    if is_money(series):
+        return lambda chunk: _number_cells(rubles(chunk), STYLE_MONEY)
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Категория кодируется в XML один раз, ячейки порции берутся по кодам
+        cells = np.array([_text_cell(value) for value in dtype.categories] + [_EMPTY], dtype=object)
+        return lambda chunk: cells[chunk.cat.codes.to_numpy()].tolist()
+    if pd.api.types.is_bool_dtype(dtype):
+        return lambda chunk: [_EMPTY if v is None or v != v else f'<c t="b"><v>{int(v)}</v></c>'
+                              for v in chunk.astype(object).tolist()]
+    if pd.api.types.is_integer_dtype(dtype):
+        return lambda chunk: _number_cells(chunk.to_numpy(dtype=np.float64, na_value=np.nan), integer=True)
+    if pd.api.types.is_float_dtype(dtype):
+        # Денежный формат — только у сумм в рублях (столбцы денег выгрузки), прочие числа — общий формат
+        style = STYLE_MONEY if series.name in MONEY_COLUMNS else 0
+        return lambda chunk: _number_cells(chunk.to_numpy(dtype=np.float64, na_value=np.nan), style)
+    return lambda chunk: [_EMPTY if pd.isna(v) else _text_cell(v) for v in chunk.tolist()]
+
+
+def _column_width(series: pd.Series) -> int:
+    if series.dtype.kind == "M":
+        return 20
+    if is_money(series) or pd.api.types.is_float_dtype(series.dtype):
+        return 14
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return 10
+    return 24
+
+
+def _chunks(df: pd.DataFrame, positions: Optional[np.ndarray], chunk_rows: int) -> Iterator[pd.DataFrame]:
+    total = len(df) if positions is None else len(positions)
+    for lo in range(0, total, chunk_rows):
+        hi = min(lo + chunk_rows, total)
+        yield df.iloc[lo:hi] if positions is None else df.take(positions[lo:hi])
+
+
+@contextmanager
+def _replaced_on_success(path: str) -> Iterator[str]:
+    """Временный файл рядом с path: после успешной записи заменяет path, при ошибке удаляется."""
+    tmp_path = path + ".tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_xlsx(
+    df: pd.DataFrame,
+    path: str,
+    positions: Optional[np.ndarray] = None,
+    sheet_name: str = "Операции",
+    chunk_rows: int = XLSX_CHUNK_ROWS,
+) -> int:
+    """Пишет таблицу (или её строки positions) в xlsx; возвращает число строк."""
+    total = len(df) if positions is None else len(positions)
+    builders = [_cell_builder(df[name]) for name in df.columns]
+    header = "<row r=\"1\">" + "".join(_text_cell(name, STYLE_HEADER) for name in df.columns) + "</row>"
+    cols = "".join(
+        f'<col min="{i}" max="{i}" width="{_column_width(df[name])}" customWidth="1"/>'
+        for i, name in enumerate(df.columns, start=1)
+    )
+    n_sheets = max(1, -(-total // XLSX_SHEET_ROWS))
+    names = [sheet_name[:31] if i == 1 else f"{sheet_name[:27]} {i}" for i in range(1, n_sheets + 1)]
+
+    with _replaced_on_success(path) as tmp_path:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=XLSX_COMPRESSLEVEL) as archive:
+            sheet_ids = range(1, n_sheets + 1)
+            archive.writestr(
+                "[Content_Types].xml", _CONTENT_TYPES.format(sheets="".join(_SHEET_CONTENT_TYPE.format(i=i) for i in sheet_ids))
+            )
+            archive.writestr("_rels/.rels", _ROOT_RELS)
+            archive.writestr(
+                "xl/workbook.xml",
+                _WORKBOOK.format(sheets="".join(
+                    f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>' for i, name in zip(sheet_ids, names)
+                )),
+            )
+            archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS.format(
+                sheets="".join(_SHEET_REL.format(i=i) for i in sheet_ids)
+            ))
+            archive.writestr("xl/styles.xml", _STYLES)
+
+            chunks = _chunks(df, positions, chunk_rows)
+            pending: Optional[pd.DataFrame] = None
+            for sheet in sheet_ids:
+                with archive.open(f"xl/worksheets/sheet{sheet}.xml", "w", force_zip64=True) as f:
+                    f.write((_SHEET_HEAD.format(cols=cols) + header).encode("utf-8"))
+                    row, left = 2, XLSX_SHEET_ROWS
+                    while left > 0:
+                        chunk = pending if pending is not None else next(chunks, None)
+                        if chunk is None:
+                            break
+                        # Порция, не поместившаяся на лист, продолжается на следующем
+                        pending = chunk.iloc[left:] if len(chunk) > left else None
+                        chunk = chunk.iloc[:left]
+                        columns = [build(chunk[name]) for build, name in zip(builders, chunk.columns)]
+                        rows = [
+                            f'<row r="{r}">' + "".join(cells) + "</row>"
+                            for r, cells in enumerate(zip(*columns), start=row)
+                        ]
+                        f.write("".join(rows).encode("utf-8"))
+                        row += len(chunk)
+                        left -= len(chunk)
+                    f.write(_SHEET_TAIL.encode("utf-8"))
+    return total
+
+
+def write_csv(df: pd.DataFrame, path: str, positions: Optional[np.ndarray] = None,
+              chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """CSV в представлении выгрузки банка (UTF-8 с BOM — так его открывает Excel)."""
+    total = 0
+    with _replaced_on_success(path) as tmp_path, open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        for chunk in _chunks(df, positions, chunk_rows):
+            to_display(chunk).to_csv(f, header=total == 0, index=False)
+            total += len(chunk)
+        if total == 0:
+            pd.DataFrame(columns=df.columns).to_csv(f, index=False)
+    return total
+
+
+def write_parquet(df: pd.DataFrame, path: str, positions: Optional[np.ndarray] = None,
+                  chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Parquet с типами схемы (даты, категории); суммы — в рублях. Нужен pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Для выгрузки в Parquet установите pyarrow")
+
+    total = 0
+    writer = None
+    with _replaced_on_success(path) as tmp_path:
+        try:
+            for chunk in _chunks(df, positions, chunk_rows):
+                frame = pd.DataFrame(
+                    {name: rubles(chunk[name]) if is_money(chunk[name]) else chunk[name] for name in chunk.columns}
+                )
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                writer.write_table(table)
+                total += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            pq.write_table(pa.Table.from_pandas(df.iloc[:0], preserve_index=False), tmp_path)
+    return total
+
+
+WRITERS = {".xlsx": write_xlsx, ".csv": write_csv, ".parquet": write_parquet}
+
+
+def export_frame(df: pd.DataFrame, path: str, positions: Optional[np.ndarray] = None, **kwargs: Any) -> int:
+    """Выгружает таблицу в формат по расширению файла (xlsx, csv, parquet); возвращает число строк."""
+    extension = os.path.splitext(path)[1].lower()
+    writer = WRITERS.get(extension)
+    if writer is None:
+        raise ValueError(f"Неизвестный формат выгрузки: {extension}")
+    with stage(f"export.{extension[1:]}") as span:
+        rows = writer(df, path, positions, **kwargs)
+        span.add(rows=rows, size=os.path.getsize(path))
+    return rows
+
+
+def export_operations(
+    path: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    file_path: str = OPERATIONS_PATH,
+    columns: Optional[Sequence[str]] = None,
+) -> int:
+    """Выгружает операции за период [start, end] (по дате операции) без копирования всей таблицы."""
+    source = load_typed_operations(file_path)
+    positions = None
+    if start is not None or end is not None:
+        positions = date_index(source, OPERATION_DATE).positions(start, end)
+    return export_frame(source if columns is None else source[list(columns)], path, positions)
+
+
+def export_report(report: Union[str, List[dict]], path: str, **kwargs: Any) -> int:
+    """Выгружает отчёт (JSON-строку функции отчёта или список записей)."""
+    records = loads(report) if isinstance(report, str) else report
+    if isinstance(records, dict) and "error" in records:
+        raise ValueError(records["error"])
+    if isinstance(records, dict):
+        records = [records]
+    if path.lower().endswith(".xlsx"):
+        kwargs.setdefault("sheet_name", "Отчет")
+    return export_frame(pd.DataFrame(records), path, **kwargs)
+
+
+def main() -> None:
+    from src.reports import get_expenses_by_day_of_week
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("what", choices=["operations", "expenses-by-day-of-week"])
+    parser.add_argument("output", help="файл выгрузки: .xlsx, .csv или .parquet")
+    parser.add_argument("--file", default=OPERATIONS_PATH, help="файл или хранилище операций")
+    parser.add_argument("--start", help="начало периода операций")
+    parser.add_argument("--end", help="конец периода операций")
+    parser.add_argument("--start-date", help="начало окна отчёта, ГГГГ-ММ-ДД")
+    args = parser.parse_args()
+
+    if args.what == "operations":
+        rows = export_operations(args.output, args.start, args.end, args.file)
+    else:
+        rows = export_report(get_expenses_by_day_of_week(args.file, args.start_date), args.output)
+    print(f"Выгружено строк: {rows} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+История курсов валют: локальная база SQLite, которая пополняется из API не чаще раза в день
+и без сети продолжает работать на накопленных курсах.
+
+Суммы операций (AMOUNT — в валюте платежа) переводятся в базовую валюту по курсу на дату операции
+одним as-of соединением: ключи «валюта, день» истории отсортированы, курс каждой строки находится
+searchsorted. Результат материализуется столбцом BASE_AMOUNT производной таблицы (with_base_amounts),
+в бэкенде SQLite — столбцом базы; его используют отчёты и главная страница.
+
+    python -m src.fx_rates update             # курсы за сегодня из API
+    python -m src.fx_rates import rates.csv   # история: date,currency,rate (единиц валюты за 1 USD)
+"""
+import argparse
+import csv
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date
+from typing import List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import date_index
+from src.dtypes import kopecks
+from src.operations_store import BASE_DIR, derive, frame_memo, source_of, source_version
+from src.schema import AMOUNT, BASE_AMOUNT, OPERATION_DATE, PAYMENT_CURRENCY
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+RATES_DB = os.getenv("FX_RATES_DB", os.path.join(BASE_DIR, "data", "fx_rates.sqlite"))
+RATES_URL = "https://api.exchangerate-api.com/v4/latest/USD"
+# Курсы хранятся относительно одной валюты: единиц валюты за 1 USD
+PIVOT = "USD"
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "RUB")
+# Сдвиг номера дня, чтобы даты до 1970 года давали неотрицательный ключ
+_DAY_OFFSET = 1 << 31
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rates (
+    day TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (day, currency)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fetches (day TEXT PRIMARY KEY, fetched_at TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class RateHistory(NamedTuple):
+    """История в виде для as-of поиска: валюты, отсортированные ключи «номер валюты << 32 | день» и курсы."""
+
+    currencies: List[str]
+    keys: np.ndarray
+    rates: np.ndarray
+
+
+class RateStore:
+    """База истории курсов; файл создаётся при первой записи, без него история пуста."""
+
+    def __init__(self, path: str = RATES_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._history: Optional[Tuple[int, RateHistory]] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.executescript(SCHEMA)
+        return connection
+
+    def version(self) -> int:
+        """Номер ревизии истории: растёт с каждой записью курсов."""
+        if not os.path.exists(self.path):
+            return 0
+        with closing(sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)) as connection:
+            try:
+                row = connection.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+            except sqlite3.OperationalError:
+                return 0
+        return row[0] if row else 0
+
+    def add(self, day: str, rates: Mapping[str, float], fetched_day: Optional[str] = None) -> int:
+        """
+        Записывает курсы дня (единиц валюты за 1 USD); fetched_day — день, за который опрошен API.
+        Возвращает число записанных курсов.
+        """
+        rows = [(day, currency, float(rate)) for currency, rate in rates.items() if rate and float(rate) > 0]
+        return self.add_many(rows, fetched_day)
+
+    def add_many(self, rows: List[Tuple[str, str, float]], fetched_day: Optional[str] = None) -> int:
+        if not rows:
+            return 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.executemany("INSERT OR REPLACE INTO rates VALUES (?, ?, ?)", rows)
+            if fetched_day is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO fetches VALUES (?, datetime('now'))", (fetched_day,)
+                )
+            connection.execute(
+                "INSERT INTO meta VALUES ('revision', 1) ON CONFLICT(key) DO UPDATE SET value = value + 1"
+            )
+        return len(rows)
+
+    def fetched_on(self, day: str) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT 1 FROM fetches WHERE day = ?", (day,)).fetchone() is not None
+
+    def history(self) -> RateHistory:
+        """История курсов, отсортированная по валюте и дню; читается заново только после записи."""
+        version = self.version()
+        cached = self._history
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if version == 0:
+            history = RateHistory([], np.zeros(0, dtype=np.int64), np.zeros(0))
+        else:
+            with closing(self._connect()) as connection:
+                rows = connection.execute("SELECT currency, day, rate FROM rates ORDER BY currency, day").fetchall()
+            frame = pd.DataFrame(rows, columns=["currency", "day", "rate"])
+            codes, currencies = pd.factorize(frame["currency"], sort=True)
+            days = pd.to_datetime(frame["day"]).to_numpy().astype("datetime64[D]").view(np.int64)
+            keys = (codes.astype(np.int64) << 32) + days + _DAY_OFFSET
+            history = RateHistory(currencies.tolist(), keys, frame["rate"].to_numpy(dtype=np.float64))
+        self._history = (version, history)
+        return history
+
+
+_store: Optional[RateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> RateStore:
+    """Общая для процесса база курсов."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RateStore()
+        return _store
+
+
+def set_store(store: Optional[RateStore]) -> None:
+    """Подменяет общую базу курсов (None — по умолчанию при следующем обращении)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def refresh(store: Optional[RateStore] = None, today: Optional[str] = None) -> bool:
+    """
+    Забирает курсы из API, если за сегодня они ещё не получены; возвращает, были ли записаны новые.
+    Ошибки сети только логируются — конвертация продолжает работать на накопленной истории.
+    """
+    from src.market_data import get_client
+
+    store = store or get_store()
+    today = today or date.today().isoformat()
+    if store.fetched_on(today):
+        return False
+    try:
+        data = get_client().get(RATES_URL)
+        rates = dict(data.get("rates") or {})
+    except Exception as e:
+        logger.error(f"Ошибка получения курсов валют: {e}")
+        return False
+    if not rates:
+        logger.warning("API курсов вернул пустой ответ, история не пополнена")
+        return False
+    rates[PIVOT] = 1.0
+    day = data.get("date") or today
+    count = store.add(day, rates, fetched_day=today)
+    logger.info(f"История курсов пополнена: {count} валют на {day}")
+    return True
+
+
+def _rates_asof(history: RateHistory, currency: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """
+    Курс (единиц валюты за 1 USD) на день для каждой строки: последний известный не позже дня,
+    а до начала истории валюты — первый известный. NaN — валюты нет в истории или дата пустая.
+    """
+    result = np.full(len(days), np.nan)
+    if len(history.keys) == 0:
+        return result
+    valid = (currency >= 0) & (days != np.iinfo(np.int64).min)
+    keys = (currency[valid].astype(np.int64) << 32) + days[valid] + _DAY_OFFSET
+    found = np.searchsorted(history.keys, keys, side="right") - 1
+    last = len(history.keys) - 1
+    previous, following = np.clip(found, 0, last), np.clip(found + 1, 0, last)
+    same_previous = (found >= 0) & (history.keys[previous] >> 32 == keys >> 32)
+    same_following = history.keys[following] >> 32 == keys >> 32
+    result[valid] = np.where(
+        same_previous, history.rates[previous], np.where(same_following, history.rates[following], np.nan)
+    )
+    return result
+
+
+def base_amounts(
+    df: pd.DataFrame,
+    base: str = BASE_CURRENCY,
+    store: Optional[RateStore] = None,
+    column: str = AMOUNT,
+    currency_column: str = PAYMENT_CURRENCY,
+) -> np.ndarray:
+    """
+    Суммы столбца в базовой валюте (копейки, float64 с NaN для пропусков) по курсу на дату операции.
+    currency_column — валюта, в которой записан столбец (AMOUNT — в валюте платежа); суммы в базовой валюте
+    и без указанной валюты остаются как есть. У валюты без известного курса сумма неизвестна (NaN,
+    с предупреждением в логе): в итоги она не попадает, а не складывается с рублями как есть.
+    """
+    amounts = kopecks(df[column])
+    if currency_column not in df.columns:
+        return amounts
+    values = df[currency_column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, labels = values.cat.codes.to_numpy(), [str(label) for label in values.cat.categories]
+    else:
+        codes, uniques = pd.factorize(values)
+        labels = [str(label) for label in uniques]
+    foreign = np.append(np.array([label != base for label in labels], dtype=bool), False)[codes]
+    if not foreign.any():
+        return amounts
+
+    history = (store or get_store()).history()
+    position = {currency: i for i, currency in enumerate(history.currencies)}
+    # Номер валюты строки в истории (-1 — нет в истории)
+    currency = np.append(np.array([position.get(label, -1) for label in labels], dtype=np.int64), -1)[codes]
+    days = date_index(df, OPERATION_DATE).dates.astype("datetime64[D]").view(np.int64)
+
+    rows = np.flatnonzero(foreign)
+    rates = _rates_asof(history, currency[rows], days[rows])
+    if base == PIVOT:
+        base_rates = np.ones(len(rows))
+    else:
+        base_rates = _rates_asof(history, np.full(len(rows), position.get(base, -1)), days[rows])
+    factors = base_rates / rates
+    unknown = np.isnan(factors)
+    if unknown.any():
+        missing = sorted({labels[code] for code in codes[rows[unknown]]})
+        logger.warning(f"Нет курса {', '.join(missing)} -> {base}: {int(unknown.sum())} операций без суммы в {base}")
+    converted = amounts.copy()
+    converted[rows] = np.round(amounts[rows] * factors)
+    return converted
+
+
+def with_base_amounts(
+    df: pd.DataFrame,
+    base: str = BASE_CURRENCY,
+    store: Optional[RateStore] = None,
+    column: Optional[pd.arrays.IntegerArray] = None,
+) -> pd.DataFrame:
+    """
+    Таблица со столбцом BASE_AMOUNT — суммой в базовой валюте. Строится один раз на версию данных
+    и ревизию истории курсов; остальные столбцы и индекс дат общие с исходной таблицей.
+    column — готовые суммы той же ревизии (из разделяемой памяти), тогда пересчёта нет.
+    """
+    if AMOUNT not in df.columns or OPERATION_DATE not in df.columns or BASE_AMOUNT in df.columns:
+        return df
+    store = store or get_store()
+
+    def build() -> pd.DataFrame:
+        with stage("fx_rates.convert") as span:
+            amounts = column
+            if amounts is None:
+                values = base_amounts(df, base, store)
+                missing = np.isnan(values)
+                amounts = pd.arrays.IntegerArray(np.where(missing, 0, values).astype(np.int64), missing)
+            converted = df.assign(**{BASE_AMOUNT: pd.Series(amounts, index=df.index)})
+            span.add(rows=len(df))
+        # Те же строки и даты: индекс дат берётся у исходной таблицы, а структуры по пересчитанным суммам
+        # (дневные агрегаты) сохраняются рядом с её кэшем — с пометкой версии данных и истории курсов
+        source = source_of(df)
+        if source is not None:
+            tag = hashlib.md5(f"{key}|{source_version(source)}".encode()).hexdigest()[:12]
+            derive(df, converted, f"fx_{tag}")
+        frame_memo(
+            converted, f"date_index:{OPERATION_DATE}", lambda: date_index(df, OPERATION_DATE), columns=(OPERATION_DATE,)
+        )
+        return converted
+
+    key = f"base_amounts:{revision(base, store)}"
+    return frame_memo(df, key, build, columns=(AMOUNT, OPERATION_DATE, PAYMENT_CURRENCY))
+
+
+def revision(base: str = BASE_CURRENCY, store: Optional[RateStore] = None) -> str:
+    """Метка пересчёта в базовую валюту: базовая валюта, файл и ревизия истории курсов."""
+    store = store or get_store()
+    return f"{base}:{store.path}:{store.version()}"
+
+
+def import_csv(path: str, store: Optional[RateStore] = None) -> int:
+    """Загружает историю из CSV с колонками date,currency,rate (единиц валюты за 1 USD)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = [(row["date"], row["currency"].upper(), float(row["rate"])) for row in csv.DictReader(f)]
+    return (store or get_store()).add_many(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="История курсов валют")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("update", help="курсы за сегодня из API")
+    import_parser = commands.add_parser("import", help="история из CSV: date,currency,rate")
+    import_parser.add_argument("path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "update":
+        refresh()
+    else:
+        print(f"Загружено курсов: {import_csv(args.path)}")
+
+
+if __name__ == "__main__":
+    main()
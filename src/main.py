@@ -1,31 +1,89 @@
-import json
+from __future__ import annotations
+
+import logging
 from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Union
+
+from src.responses import dumps
+from src.tracing import entry_point, stage
+from src.utils import (USER_SETTINGS_PATH, currency_rates, filtered_operations,
+                       get_date_range, get_operations_df, greetings,
+                       info_about_operations, top5_tran)
+
+if TYPE_CHECKING:
+    from src.datasets import UserContext
 
-import pandas as pd
 
-from src.utils import (analyze_data, fetch_data_from_api, load_operations_data,
-                       parse_datetime)
+def _number(value) -> float:
+    """Число из ячейки операции; пропуски (None, NaN) считаются нулём."""
+    if value is None or value != value:
+        return 0.0
+    return float(value)
 
 
-def home_page_function(datetime_str: str) -> str:
-    """Основная функция для страницы «Главная»"""
+@entry_point("main.home_page")
+def home_page_function(
+    datetime_str: str,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    count_only: bool = False,
+    cursor: Optional[str] = None,
+    user: Optional[Union[str, UserContext]] = None,
+    file_path: Optional[str] = None,
+) -> str:
+    """
+    Основная функция для страницы «Главная».
+    Таблица операций отдаётся постранично: limit/offset или cursor, поля fields;
+    при count_only — только сведения о числе строк.
+    user — идентификатор или контекст пользователя: его операции и настройки вместо файлов по умолчанию;
+    file_path — файл операций вместо OPERATIONS_PATH (без user).
+    """
     try:
-        dt = parse_datetime(datetime_str)
-        api_data = fetch_data_from_api(dt)
-        processed_data = analyze_data(api_data)
-        operations_data = pd.read_excel("data/operations.xlsx")
+        get_date_range(datetime_str)
+        from src.operations_store import OPERATIONS_PATH
+
+        settings_path, settings = USER_SETTINGS_PATH, None
+        source: Union[str, UserContext] = file_path or OPERATIONS_PATH
+        if user is not None:
+            from src.datasets import get_manager
+
+            dataset = get_manager().get(user)
+            source, settings_path, settings = dataset.context, dataset.context.settings_path, dataset.settings
+        operations = filtered_operations(datetime_str, source)
+
+        currency_info, stocks_info = currency_rates(settings_path, settings)
+        api_data = {"currency_rates": currency_info, "stock_prices": stocks_info}
+
+        # Суммы и кешбэк по картам за период
+        cards: dict = {}
+        with stage("main.card_totals") as span:
+            for card, amount, cashback in zip(*info_about_operations(operations)):
+                totals = cards.setdefault(card, {"last_digits": str(card)[-4:], "total_spent": 0.0, "cashback": 0.0})
+                totals["total_spent"] += _number(amount)
+                totals["cashback"] += _number(cashback)
+            span.add(rows=len(operations))
+        processed_data = {
+            "greeting": greetings(),
+            "cards": list(cards.values()),
+            "top_transactions": top5_tran(operations),
+        }
+        from src.sql_store import operations_backend
+
+        operations_page, page = operations_backend(source, lambda: get_operations_df(source)).page(
+            None, limit, offset, fields, count_only, cursor
+        )
 
+        data = {"api_data": api_data, "processed_data": processed_data, "operations_page": page}
+        if not count_only:
+            data["operations_data"] = operations_page
         response = {
             "status": "success",
-            "data": {
-                "api_data": api_data,
-                "processed_data": processed_data,
-                "operations_data": operations_data.to_dict(orient="records"),
-            },
+            "data": data,
             "timestamp": datetime.now().isoformat(),
         }
 
-        return json.dumps(response, ensure_ascii=False, indent=2)
+        return dumps(response)
 
     except Exception as e:
         error_response = {
@@ -33,10 +91,11 @@ def home_page_function(datetime_str: str) -> str:
             "message": str(e),
             "timestamp": datetime.now().isoformat(),
         }
-        return json.dumps(error_response, ensure_ascii=False, indent=2)
+        return dumps(error_response)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
     test_datetime = "2025-04-09 14:30:00"
     result = home_page_function(test_datetime)
     print(result)
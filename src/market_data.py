@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд ответ считается свежим и сколько ещё его можно отдавать устаревшим
+DEFAULT_TTL = 300
+DEFAULT_STALE_TTL = 3600
+DEFAULT_TIMEOUT = 5
+DEFAULT_WORKERS = 8
+# Заглушки внешних API: UPSTREAM_STUBS=1 — пустые ответы, либо путь к JSON {хост: ответ}
+UPSTREAM_STUBS = os.getenv("UPSTREAM_STUBS", "")
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...], bool]
+
+
+class MarketDataClient:
+    """
+    Клиент внешних API котировок: общий пул соединений, таймауты, параллельные запросы
+    и TTL-кэш со stale-while-revalidate — устаревший ответ отдаётся сразу,
+    а обновляется в фоне. Одновременные запросы одного адреса объединяются.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_workers: int = DEFAULT_WORKERS,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="market-data")
+        self._lock = threading.Lock()
+        self._cache: Dict[CacheKey, Tuple[float, Any]] = {}
+        self._inflight: Dict[CacheKey, Future] = {}
+
+    def _request(self, url: str, params: Optional[dict], as_json: bool) -> Any:
+        with stage("http.request") as span:
+            response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            span.add(size=len(response.content))
+        return response.json() if as_json else response.text
+
+    def _refresh(self, key: CacheKey) -> Future:
+        """Запускает запрос в пуле; повторный вызов для того же ключа получает тот же Future."""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            url, params, as_json = key
+            future = self.executor.submit(self._request, url, dict(params) or None, as_json)
+            self._inflight[key] = future
+
+        def store(done: Future) -> None:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if done.exception() is None:
+                    self._cache[key] = (time.monotonic(), done.result())
+                else:
+                    logger.error(f"Ошибка запроса {url}: {done.exception()}")
+
+        future.add_done_callback(store)
+        return future
+
+    def get_async(self, url: str, params: Optional[dict] = None, as_json: bool = True) -> Future:
+        """Future с ответом: из кэша, если он свежий или допустимо устаревший, иначе — из сети."""
+        key = (url, tuple(sorted((params or {}).items())), as_json)
+        with self._lock:
+            entry = self._cache.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl + self.stale_ttl:
+                if age >= self.ttl:
+                    self._refresh(key)
+                done: Future = Future()
+                done.set_result(entry[1])
+                return done
+        return self._refresh(key)
+
+    def get(self, url: str, params: Optional[dict] = None, as_json: bool = True) -> Any:
+        """Синхронный запрос через кэш."""
+        return self.get_async(url, params, as_json).result()
+
+    def get_many(self, requests_list: List[Tuple[str, Optional[dict]]], as_json: bool = True) -> List[Any]:
+        """Параллельно выполняет запросы; общее время — самый долгий из них, а не сумма."""
+        futures = [self.get_async(url, params, as_json) for url, params in requests_list]
+        return [future.result() for future in futures]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+class StubMarketDataClient(MarketDataClient):
+    """Клиент без сети: ответы берутся по имени хоста из словаря, для неизвестных — пустой ответ."""
+
+    def __init__(self, responses: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.responses = responses or {}
+
+    def _request(self, url: str, params: Optional[dict], as_json: bool) -> Any:
+        return self.responses.get(urlsplit(url).hostname, {} if as_json else "")
+
+
+def stub_client(stubs: str) -> StubMarketDataClient:
+    """Клиент-заглушка по значению UPSTREAM_STUBS: путь к JSON с ответами или флаг."""
+    responses = None
+    if os.path.isfile(stubs):
+        with open(stubs, encoding="utf-8") as f:
+            responses = json.load(f)
+    return StubMarketDataClient(responses)
+
+
+_client: Optional[MarketDataClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MarketDataClient:
+    """Общий для процесса клиент котировок (создаётся при первом обращении)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = stub_client(UPSTREAM_STUBS) if UPSTREAM_STUBS else MarketDataClient()
+        return _client
+
+
+def set_client(client: Optional[MarketDataClient]) -> None:
+    """Подменяет общий клиент (например, заглушкой); None — создать заново при следующем обращении."""
+    global _client
+    with _client_lock:
+        _client = client
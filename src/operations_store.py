@@ -0,0 +1,497 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import weakref
+from typing import Any, BinaryIO, Callable, Dict, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.dtypes import apply_schema, concat_typed, with_rubles
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Путь можно переопределить, например указав каталог секционированного хранилища
+OPERATIONS_PATH = os.getenv("OPERATIONS_PATH", os.path.join(BASE_DIR, "data", "operations.xlsx"))
+
+CACHE_DIR_NAME = ".cache"
+CACHE_FORMAT = 2
+META_FILE = "meta.json"
+# Файлы столбцов кэша: значения, маска пропусков, словарь значений
+_COLUMN_FILE = re.compile(r"col_\d+(\.mask)?\.(npy|json)$")
+
+# Секционированное хранилище: каталог с манифестом, секциями по месяцам и производными структурами
+MANIFEST_FILE = "manifest.json"
+DERIVED_DIR = "derived"
+
+# Абсолютный путь -> (отпечаток файла, DataFrame)
+_loaded: Dict[str, Tuple[dict, pd.DataFrame]] = {}
+# id таблицы хранилища -> (путь источника, отпечаток); запись удаляется вместе с DataFrame
+# или при загрузке новой версии источника, но не при forget — таблицу ещё держат начатые запросы
+_sources: Dict[int, Tuple[str, dict]] = {}
+# (id DataFrame, имя структуры) -> (метка содержимого, производная структура); запись удаляется вместе с DataFrame
+_frame_memo: Dict[Tuple[int, str], Tuple[tuple, Any]] = {}
+# Метка состояния _frame_memo: новое значение после каждой построенной структуры (см. memo_version)
+_memo_counter = itertools.count(1)
+_memo_version = 0
+# id чужой таблицы -> столбец (None — вся таблица) -> число изменений на месте (frame_changed)
+_changes: Dict[int, Dict[Optional[str], int]] = {}
+# id производной таблицы -> (слабая ссылка на исходную, пометка её структур)
+_derived: Dict[int, Tuple[Any, str]] = {}
+# Абсолютный путь -> отпечаток файла с хешем содержимого (для content_version)
+_content: Dict[str, dict] = {}
+
+
+def file_fingerprint(file_path: str, with_hash: bool = True) -> dict:
+    """Возвращает отпечаток файла: время изменения, размер и SHA-256 содержимого."""
+    stat = os.stat(file_path)
+    fingerprint = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if with_hash:
+        sha = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        fingerprint["sha256"] = sha.hexdigest()
+    return fingerprint
+
+
+def source_version(file_path: str) -> Optional[str]:
+    """
+    Дешёвая метка версии источника (время изменения и размер) без чтения содержимого;
+    у секционированного хранилища — метка манифеста. None, если источника нет.
+    """
+    if os.path.isdir(file_path):
+        file_path = os.path.join(file_path, MANIFEST_FILE)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def content_version(file_path: str) -> Optional[str]:
+    """
+    Версия источника по содержимому — SHA-256 файла (у хранилища — манифеста). Хеш пересчитывается,
+    только если изменились время изменения или размер; None, если источника нет.
+    """
+    file_path = os.path.abspath(file_path)
+    if os.path.isdir(file_path):
+        file_path = os.path.join(file_path, MANIFEST_FILE)
+    try:
+        stat = file_fingerprint(file_path, with_hash=False)
+        memo = _content.get(file_path)
+        if memo is None or not _same_stat(memo, stat):
+            memo = _content[file_path] = file_fingerprint(file_path)
+    except OSError:
+        return None
+    return memo["sha256"]
+
+
+def cache_dir_for(file_path: str) -> str:
+    """Каталог колоночного кэша для файла операций (рядом с самим файлом)."""
+    file_path = os.path.abspath(file_path)
+    return os.path.join(os.path.dirname(file_path), CACHE_DIR_NAME, os.path.basename(file_path))
+
+
+def _same_stat(a: dict, b: dict) -> bool:
+    return a.get("mtime_ns") == b.get("mtime_ns") and a.get("size") == b.get("size")
+
+
+def _read_meta(cache_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != CACHE_FORMAT:
+        return None
+    return meta
+
+
+def _write_meta(cache_dir: str, meta: dict) -> None:
+    tmp_path = os.path.join(cache_dir, META_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+
+
+def write_cache(cache_dir: str, df: pd.DataFrame, source: dict) -> None:
+    """Сохраняет DataFrame в колоночный кэш: по файлу .npy на столбец."""
+    os.makedirs(cache_dir, exist_ok=True)
+    # Сначала убираем метаданные, чтобы недописанный кэш не считался валидным, затем столбцы
+    # и производные структуры от прошлой версии файла; чужие файлы каталога (база SQLite) не трогаем
+    for name in [META_FILE] + sorted(os.listdir(cache_dir)):
+        path = os.path.join(cache_dir, name)
+        if (name == META_FILE or _COLUMN_FILE.match(name)) and os.path.isfile(path):
+            os.remove(path)
+    shutil.rmtree(os.path.join(cache_dir, DERIVED_DIR), ignore_errors=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        column = {"name": str(name), "dtype": str(series.dtype)}
+        values_path = os.path.join(cache_dir, f"col_{i}.npy")
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufcmM":
+            column["kind"] = "array"
+            np.save(values_path, series.to_numpy())
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            # Категории: коды и словарь значений
+            column["kind"] = "category"
+            np.save(values_path, series.cat.codes.to_numpy())
+            with open(os.path.join(cache_dir, f"col_{i}.json"), "w", encoding="utf-8") as f:
+                json.dump([str(u) for u in series.cat.categories], f, ensure_ascii=False)
+        elif isinstance(series.array, pd.arrays.IntegerArray):
+            # Целые с пропусками: значения и маска пропусков
+            column["kind"] = "masked"
+            np.save(values_path, series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+            np.save(os.path.join(cache_dir, f"col_{i}.mask.npy"), series.isna().to_numpy())
+        elif series.map(lambda v: isinstance(v, str) or pd.isna(v)).all():
+            # Строки храним как словарь уникальных значений и коды
+            codes, uniques = pd.factorize(series)
+            column["kind"] = "text"
+            np.save(values_path, codes.astype(np.int32))
+            with open(os.path.join(cache_dir, f"col_{i}.json"), "w", encoding="utf-8") as f:
+                json.dump([str(u) for u in uniques], f, ensure_ascii=False)
+        else:
+            column["kind"] = "object"
+            np.save(values_path, series.to_numpy(dtype=object), allow_pickle=True)
+        columns.append(column)
+
+    _write_meta(cache_dir, {"format": CACHE_FORMAT, "source": source, "rows": len(df), "columns": columns})
+
+
+def read_cache(cache_dir: str, meta: dict) -> pd.DataFrame:
+    """Читает DataFrame из колоночного кэша, числовые столбцы отображаются через mmap."""
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        values_path = os.path.join(cache_dir, f"col_{i}.npy")
+        if column["kind"] == "array":
+            data[column["name"]] = np.load(values_path, mmap_mode="r")
+        elif column["kind"] == "category":
+            codes = np.load(values_path, mmap_mode="r")
+            with open(os.path.join(cache_dir, f"col_{i}.json"), encoding="utf-8") as f:
+                categories = json.load(f)
+            data[column["name"]] = pd.Categorical.from_codes(codes, categories=categories)
+        elif column["kind"] == "masked":
+            mask = np.load(os.path.join(cache_dir, f"col_{i}.mask.npy"), mmap_mode="r")
+            data[column["name"]] = pd.arrays.IntegerArray(np.load(values_path, mmap_mode="r"), mask)
+        elif column["kind"] == "text":
+            codes = np.load(values_path)
+            with open(os.path.join(cache_dir, f"col_{i}.json"), encoding="utf-8") as f:
+                uniques = np.array(json.load(f) + [np.nan], dtype=object)
+            # Код -1 (пропуск) указывает на последний элемент — NaN
+            data[column["name"]] = pd.array(uniques[codes], dtype=column["dtype"])
+        else:
+            data[column["name"]] = np.load(values_path, allow_pickle=True)
+    return pd.DataFrame(data, columns=[column["name"] for column in meta["columns"]])
+
+
+def read_manifest(store_dir: str) -> dict:
+    """Манифест секционированного хранилища; для нового хранилища — пустой."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"format": CACHE_FORMAT, "version": 0, "rows": 0, "segments": []}
+
+
+def write_manifest(store_dir: str, manifest: dict) -> None:
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_path = os.path.join(store_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_FILE))
+
+
+def segment_dir(store_dir: str, segment: dict) -> str:
+    return os.path.join(store_dir, segment["partition"], f"segment-{segment['id']:06d}")
+
+
+def store_derived_dir(store_dir: str, version: int) -> str:
+    """
+    Каталог производных структур версии хранилища. Дозагрузка пишет структуры новой версии
+    в свой каталог, и они вступают в силу только вместе с манифестом этой версии.
+    """
+    return os.path.join(store_dir, DERIVED_DIR, str(version))
+
+
+def _load_store(store_dir: str) -> pd.DataFrame:
+    """
+    Читает секционированное хранилище. Сегменты склеиваются в порядке записи,
+    поэтому новые операции всегда оказываются в конце таблицы.
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    stat = file_fingerprint(manifest_path, with_hash=False)
+    memo = _loaded.get(store_dir)
+    if memo is not None and _same_stat(memo[0], stat):
+        return memo[1]
+
+    fingerprint = file_fingerprint(manifest_path)
+    manifest = read_manifest(store_dir)
+    fingerprint["version"] = manifest["version"]
+    frames = []
+    for segment in manifest["segments"]:
+        path = segment_dir(store_dir, segment)
+        frames.append(read_cache(path, _read_meta(path)))
+    df = concat_typed(frames)
+    logger.info(f"Операции загружены из хранилища {store_dir}: {len(df)} строк")
+    _register(store_dir, fingerprint, df)
+    return df
+
+
+def read_source(file_path: str) -> pd.DataFrame:
+    """Разбирает выгрузку операций (CSV или Excel — по расширению файла) и приводит её к схеме."""
+    if os.path.splitext(file_path)[1].lower() == ".csv":
+        return apply_schema(pd.read_csv(file_path))
+    return apply_schema(pd.read_excel(file_path))
+
+
+def load_typed_operations(file_path: str = OPERATIONS_PATH) -> pd.DataFrame:
+    """
+    Возвращает операции из Excel- или CSV-файла (или секционированного хранилища) в канонической схеме
+    (деньги — копейки Int64), разбирая его не чаще одного раза на версию файла.
+    Возвращаемый DataFrame общий для всех вызывающих — изменять его на месте нельзя.
+    """
+    abs_path = os.path.abspath(file_path)
+    if os.path.isdir(abs_path):
+        return _load_store(abs_path)
+    try:
+        stat = file_fingerprint(abs_path, with_hash=False)
+    except OSError:
+        # Без отпечатка файла кэшировать нечего — читаем напрямую
+        return read_source(file_path)
+
+    memo = _loaded.get(abs_path)
+    if memo is not None and _same_stat(memo[0], stat):
+        return memo[1]
+
+    cache_dir = cache_dir_for(abs_path)
+    meta = _read_meta(cache_dir)
+    df = None
+    if meta is not None:
+        if not _same_stat(meta["source"], stat):
+            # Файл трогали: сверяем содержимое по хешу, прежде чем разбирать заново
+            fingerprint = file_fingerprint(abs_path)
+            if fingerprint["sha256"] == meta["source"].get("sha256"):
+                meta["source"] = fingerprint
+                _write_meta(cache_dir, meta)
+            else:
+                meta = None
+        if meta is not None:
+            try:
+                with stage("store.read_cache") as span:
+                    df = read_cache(cache_dir, meta)
+                    span.add(rows=len(df))
+                logger.info(f"Операции загружены из кэша: {cache_dir}")
+            except Exception as e:
+                logger.error(f"Ошибка чтения кэша {cache_dir}: {e}")
+                df = None
+
+    if df is None:
+        logger.info(f"Разбор файла операций: {abs_path}")
+        fingerprint = file_fingerprint(abs_path)
+        with stage("store.parse_source") as span:
+            df = read_source(abs_path)
+            span.add(rows=len(df), size=fingerprint["size"])
+        try:
+            write_cache(cache_dir, df, fingerprint)
+        except Exception as e:
+            logger.error(f"Ошибка записи кэша {cache_dir}: {e}")
+        stat = fingerprint
+    else:
+        stat = meta["source"]
+
+    _register(abs_path, stat, df)
+    return df
+
+
+def load_operations(file_path: str = OPERATIONS_PATH) -> pd.DataFrame:
+    """
+    Операции с суммами в рублях (float64), как в выгрузке; остальные столбцы — в канонической схеме.
+    Таблица в рублях строится один раз на версию файла; вычисления внутри проекта идут по load_typed_operations.
+    """
+    df = load_typed_operations(file_path)
+    return frame_memo(df, "rubles", lambda: with_rubles(df))
+
+
+def dataset_version(file_path: str = OPERATIONS_PATH) -> Optional[str]:
+    """Версия набора данных — SHA-256 файла из кэша, если он уже загружался."""
+    memo = _loaded.get(os.path.abspath(file_path))
+    if memo is None:
+        return None
+    return memo[0].get("sha256")
+
+
+def _register(path: str, fingerprint: dict, df: pd.DataFrame) -> None:
+    """Запоминает таблицу как текущую версию источника; таблица прежней версии становится чужой."""
+    previous = _loaded.get(path)
+    if previous is not None and previous[1] is not df:
+        _sources.pop(id(previous[1]), None)
+    _loaded[path] = (fingerprint, df)
+    if id(df) not in _sources:
+        weakref.finalize(df, _sources.pop, id(df), None)
+    _sources[id(df)] = (path, fingerprint)
+
+
+def source_of(df: pd.DataFrame) -> Optional[str]:
+    """Путь к файлу, из которого хранилище загрузило этот DataFrame (None для чужих таблиц)."""
+    source = _sources.get(id(df))
+    return source[0] if source is not None else None
+
+
+def derived_path(df: pd.DataFrame, name: str) -> Optional[str]:
+    """
+    Путь для сохранения производной структуры (индекса, агрегатов) рядом с кэшем таблицы.
+    У Excel-файла она лежит в подкаталоге кэша и удаляется вместе с ним при изменении файла,
+    в секционированном хранилище — в каталоге версии манифеста, его обновляет дозагрузка (src.ingest).
+    """
+    parent = _derived.get(id(df))
+    if parent is not None and parent[0]() is not None:
+        return derived_path(parent[0](), f"{parent[1]}.{name}")
+    path = source_of(df)
+    if path is None:
+        return None
+    if os.path.isdir(path):
+        # Структуры хранилища — в каталоге той версии манифеста, по которой загружена таблица
+        version = _sources[id(df)][1].get("version")
+        directory = store_derived_dir(path, read_manifest(path)["version"] if version is None else version)
+    else:
+        directory = os.path.join(cache_dir_for(path), DERIVED_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def save_atomically(path: str, write: Callable[[BinaryIO], None]) -> None:
+    """
+    Записывает производную структуру через свой временный файл в том же каталоге и os.replace:
+    процессы, одновременно строящие одну структуру, не затирают чужой недописанный файл.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _content_signature(df: pd.DataFrame, columns: Optional[Sequence[str]]) -> tuple:
+    """
+    Метка содержимого таблицы для проверки построенных по ней структур, без просмотра строк.
+    Таблицы хранилища и производные от них не изменяются — для них достаточно числа строк;
+    у чужой таблицы к нему добавляется счётчик изменений на месте, о которых сообщил frame_changed.
+    """
+    if id(df) in _derived or source_of(df) is not None:
+        return (len(df),)
+    changes = _changes.get(id(df), {})
+    if columns is None:
+        return (len(df), sum(changes.values()))
+    return (len(df), changes.get(None, 0) + sum(changes.get(column, 0) for column in columns))
+
+
+def frame_changed(df: pd.DataFrame, columns: Optional[Sequence[str]] = None) -> None:
+    """
+    Сообщает, что чужую таблицу изменили на месте: структуры, зависящие от этих столбцов
+    (None — от любых), при следующем обращении строятся заново. Без вызова изменение не замечается.
+    """
+    changes = _changes.get(id(df))
+    if changes is None:
+        changes = _changes[id(df)] = {}
+        weakref.finalize(df, _changes.pop, id(df), None)
+    for column in columns if columns is not None else [None]:
+        changes[column] = changes.get(column, 0) + 1
+
+
+def frame_memo(
+    df: pd.DataFrame, name: str, build: Callable[[], Any], columns: Optional[Sequence[str]] = None
+) -> Any:
+    """
+    Строит производную структуру (индекс, агрегаты) один раз на объект DataFrame.
+    columns — столбцы, от которых она зависит (None — все): если их изменили на месте
+    и сообщили об этом frame_changed, структура строится заново.
+    """
+    key = (id(df), name)
+    signature = _content_signature(df, columns)
+    memo = _frame_memo.get(key)
+    if memo is None or memo[0] != signature:
+        value = build()
+        if memo is None:
+            weakref.finalize(df, _frame_memo.pop, key, None)
+        memo = _frame_memo[key] = (signature, value)
+        global _memo_version
+        _memo_version = next(_memo_counter)
+    return memo[1]
+
+
+def memo_version() -> int:
+    """Метка построенных структур: меняется, когда frame_memo строит новую, — по ней кэшируют memo_bytes."""
+    return _memo_version
+
+
+def memo_bytes(df: pd.DataFrame) -> int:
+    """
+    Память структур, построенных по таблице через frame_memo (индексы, агрегаты, производные таблицы).
+    У производной таблицы учитываются её собственные столбцы — новые или другого типа — и её структуры;
+    структура, общая для нескольких таблиц, считается один раз.
+    """
+    seen: Set[int] = set()
+
+    def structures(frame: pd.DataFrame) -> int:
+        total = 0
+        for (frame_id, _), (_, value) in list(_frame_memo.items()):
+            if frame_id != id(frame) or id(value) in seen:
+                continue
+            seen.add(id(value))
+            if isinstance(value, pd.DataFrame):
+                own = [name for name in value.columns if name not in frame.columns or value[name].dtype != frame[name].dtype]
+                total += int(value[own].memory_usage(deep=True, index=False).sum()) + structures(value)
+            else:
+                total += int(getattr(value, "nbytes", 0))
+        return total
+
+    return structures(df)
+
+
+def derive(df: pd.DataFrame, derived: pd.DataFrame, tag: str) -> None:
+    """
+    Отмечает derived как производную от df таблицу (те же строки, дополнительные столбцы):
+    её структуры сохраняются рядом с кэшем df под именами с пометкой tag.
+    Пометка должна меняться вместе с содержимым дополнительных столбцов.
+    """
+    _derived[id(derived)] = (weakref.ref(df), tag)
+    weakref.finalize(derived, _derived.pop, id(derived), None)
+
+
+def remember(file_path: str, fingerprint: dict, df: pd.DataFrame) -> None:
+    """Подставляет готовый DataFrame как загруженную версию источника (например, из разделяемой памяти)."""
+    _register(os.path.abspath(file_path), fingerprint, df)
+
+
+def forget(file_path: str, df: Optional[pd.DataFrame] = None) -> None:
+    """
+    Убирает набор операций из памяти процесса (кэш на диске остаётся): таблица больше не выдаётся,
+    а запросы, которые её держат, дорабатывают с ней как с таблицей хранилища. df — только эту таблицу,
+    если источник с тех пор не загружен заново.
+    """
+    abs_path = os.path.abspath(file_path)
+    memo = _loaded.get(abs_path)
+    if memo is not None and (df is None or memo[1] is df):
+        del _loaded[abs_path]
+
+
+def clear_memory_cache() -> None:
+    """Сбрасывает загруженные в память наборы операций (кэш на диске остаётся)."""
+    _loaded.clear()
+    _sources.clear()
+    _content.clear()
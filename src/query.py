@@ -0,0 +1,183 @@
+"""
+Язык структурированного поиска: запрос вида «category:Супермаркеты amount>5000 date:2024-03..2024-05 кофе»
+разбирается на условия по полям и текст. Разбор и границы условий общие для бэкендов pandas и SQLite;
+query_positions выполняет запрос над таблицей pandas.
+"""
+import re
+import shlex
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import date_index
+from src.dtypes import kopecks
+from src.schema import (AMOUNT, CARD_NUMBER, CATEGORY, DESCRIPTION, MCC,
+                        OPERATION_CURRENCY, OPERATION_DATE, STATUS)
+from src.search_index import search_index
+from src.tracing import stage
+
+# Поля структурированного запроса: имя -> (столбец, вид условия)
+QUERY_FIELDS = {
+    "date": (OPERATION_DATE, "date"),
+    "дата": (OPERATION_DATE, "date"),
+    "card": (CARD_NUMBER, "card"),
+    "карта": (CARD_NUMBER, "card"),
+    "category": (CATEGORY, "value"),
+    "категория": (CATEGORY, "value"),
+    "status": (STATUS, "value"),
+    "статус": (STATUS, "value"),
+    "currency": (OPERATION_CURRENCY, "value"),
+    "валюта": (OPERATION_CURRENCY, "value"),
+    "description": (DESCRIPTION, "text"),
+    "описание": (DESCRIPTION, "text"),
+    "amount": (AMOUNT, "amount"),
+    "сумма": (AMOUNT, "amount"),
+    "mcc": (MCC, "number"),
+}
+# Порядок выполнения: сначала дешёвые и избирательные условия по индексам и кодам, текст — в конце
+QUERY_COST = {"date": 0, "card": 1, "value": 1, "number": 2, "amount": 2, "text": 3}
+
+_CONDITION = re.compile(r"^(?P<field>[^\W\d]\w*)(?P<op>>=|<=|>|<|=|:)(?P<value>.+)$")
+
+
+class Condition(NamedTuple):
+    """Условие запроса: поле, оператор (:, =, >, >=, <, <=) и значение."""
+
+    field: str
+    op: str
+    value: str
+
+
+class ParsedQuery(NamedTuple):
+    conditions: List[Condition]
+    text: str
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """
+    Разбирает запрос вида «category:Супермаркеты amount>5000 date:2024-03..2024-05 card:*7197 кофе».
+    Условия по известным полям выделяются, остальное — текст для полнотекстового поиска.
+    Запрос без условий целиком остаётся текстом, как в простом поиске.
+    """
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        tokens = query.split()
+    conditions, words = [], []
+    for token in tokens:
+        match = _CONDITION.match(token)
+        if match and match["field"].lower() in QUERY_FIELDS:
+            conditions.append(Condition(match["field"].lower(), match["op"], match["value"]))
+        else:
+            words.append(token)
+    text = " ".join(words) if conditions else query.strip()
+    return ParsedQuery(conditions, text.lower())
+
+
+def condition_bounds(condition: Condition, parse: Callable[[str, bool], Any]) -> Tuple[Any, Any]:
+    """Границы [lo, hi] условия сравнения или диапазона a..b (любой конец можно опустить)."""
+    op, value = condition.op, condition.value
+    if op in (":", "=") and ".." in value:
+        lo, hi = value.split("..", 1)
+        return (parse(lo, False) if lo else None), (parse(hi, True) if hi else None)
+    if op in (":", "="):
+        return parse(value, False), parse(value, True)
+    if op.startswith(">"):
+        return parse(value, op == ">"), None
+    return None, parse(value, op == "<=")
+
+
+def date_bound(value: str, upper: bool) -> np.datetime64:
+    """Неполная дата (2024, 2024-03, 2024-03-15) — начало периода, для верхней границы — его конец."""
+    try:
+        day = np.datetime64(value)
+    except ValueError:
+        raise ValueError(f"Неверная дата в запросе: {value}")
+    return (day + 1).astype("datetime64[ns]") - np.timedelta64(1, "ns") if upper else day.astype("datetime64[ns]")
+
+
+def amount_bound(value: str, upper: bool) -> int:
+    """Сумма в рублях (допускается запятая) -> копейки."""
+    try:
+        return round(float(value.replace(",", ".")) * 100)
+    except ValueError:
+        raise ValueError(f"Неверная сумма в запросе: {value}")
+
+
+def _value_mask(values: pd.Series, positions: np.ndarray, match: Callable[[str], bool]) -> np.ndarray:
+    """Проверка выполняется один раз на уникальное значение, строки отбираются по кодам."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy()[positions], values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values.take(positions))
+    matched = np.fromiter((match(str(value).lower()) for value in uniques), dtype=bool, count=len(uniques))
+    return np.append(matched, False)[codes]
+
+
+def condition_matcher(condition: Condition) -> Callable[[str], bool]:
+    """Проверка значения (в нижнем регистре) для условий по значениям, номеру карты и тексту поля."""
+    column, kind = QUERY_FIELDS[condition.field]
+    value = condition.value.lower()
+    if kind == "value":
+        options = set(value.split(","))
+        return lambda text: text in options
+    if kind == "card":
+        # *7197 и 7197 — по последним цифрам, полный номер — точное совпадение
+        suffixes = tuple(option.lstrip("*") for option in value.split(","))
+        return lambda text: text.endswith(suffixes)
+    return lambda text: value in text
+
+
+def _apply_condition(df: pd.DataFrame, positions: np.ndarray, condition: Condition) -> np.ndarray:
+    column, kind = QUERY_FIELDS[condition.field]
+    if column not in df.columns:
+        raise ValueError(f"Поле {condition.field} отсутствует в данных")
+    if kind in ("value", "card", "text") and condition.op not in (":", "="):
+        raise ValueError(f"Поле {condition.field} поддерживает только «:»")
+
+    if kind == "date":
+        lo, hi = condition_bounds(condition, date_bound)
+        # Строгое сравнение: граница сдвигается на наносекунду
+        if condition.op == ">":
+            lo += np.timedelta64(1, "ns")
+        elif condition.op == "<":
+            hi -= np.timedelta64(1, "ns")
+        found = date_index(df, column).positions(lo, hi)
+        return found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+
+    positions = np.arange(len(df)) if positions is None else positions
+    if kind in ("value", "card", "text"):
+        mask = _value_mask(df[column], positions, condition_matcher(condition))
+    else:
+        parse = amount_bound if kind == "amount" else lambda v, upper: float(v)
+        lo, hi = condition_bounds(condition, parse)
+        numbers = kopecks(df[column])[positions] if kind == "amount" else \
+            pd.to_numeric(df[column].take(positions), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        mask = ~np.isnan(numbers)
+        if lo is not None:
+            mask &= numbers > lo if condition.op == ">" else numbers >= lo
+        if hi is not None:
+            mask &= numbers < hi if condition.op == "<" else numbers <= hi
+    return positions[mask]
+
+
+def query_positions(df: pd.DataFrame, query: str) -> np.ndarray:
+    """
+    Номера строк (по возрастанию), удовлетворяющих запросу. Условия выполняются от дешёвых к дорогим,
+    каждое — только над строками, прошедшими предыдущие; текст ищется по индексу в последнюю очередь.
+    """
+    parsed = parse_query(query)
+    positions = None
+    for condition in sorted(parsed.conditions, key=lambda c: QUERY_COST[QUERY_FIELDS[c.field][1]]):
+        with stage(f"services.query.{condition.field}") as span:
+            positions = _apply_condition(df, positions, condition)
+            span.add(rows=len(positions))
+        if len(positions) == 0:
+            return positions
+    if parsed.text or positions is None:
+        with stage("services.search_index") as span:
+            found = search_index(df).search(parsed.text)
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+            span.add(rows=len(positions))
+    return positions
@@ -0,0 +1,177 @@
+"""
+Кэш готовых отчётов: ограниченный LRU в памяти и каталог JSON-файлов на диске.
+Ключ — имя функции, нормализованные аргументы и версия данных операций.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Optional, Tuple
+
+from src.operations_store import BASE_DIR, CACHE_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(BASE_DIR, CACHE_DIR_NAME, "reports"))
+# Ограничения по умолчанию: число отчётов в памяти и общий размер файлов на диске
+MAX_ENTRIES = 128
+MAX_BYTES = 64 << 20
+
+
+def _normalize(value: Any) -> Any:
+    """Приводит аргумент к JSON-представлению, не зависящему от способа передачи."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and os.path.exists(value):
+        return os.path.abspath(value)
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def report_key(func: Any, bound: inspect.BoundArguments, version: str) -> str:
+    """
+    Ключ отчёта по аргументам с подставленными значениями по умолчанию (BoundArguments.apply_defaults):
+    одинаков для позиционной и именованной передачи.
+    """
+    payload = [f"{func.__module__}.{func.__qualname__}", _normalize(dict(bound.arguments)), version]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def atomic_write(path: str, text: str) -> None:
+    """Пишет файл через временный файл в том же каталоге и os.replace — читатель не увидит половину."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """Записывает файл, только если его содержимое отличается; возвращает, была ли запись."""
+    data = text.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    atomic_write(path, text)
+    return True
+
+
+class ReportCache:
+    """
+    Двухуровневый кэш отчётов. Память — LRU на max_entries записей,
+    диск — файлы <ключ>.json с вытеснением самых старых сверх max_bytes; ttl (секунды) — для обоих уровней.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = REPORT_CACHE_DIR,
+        max_entries: int = MAX_ENTRIES,
+        max_bytes: int = MAX_BYTES,
+        ttl: Optional[float] = None,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # ключ -> (время создания, отчёт)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            created = os.path.getmtime(path)
+            if self._expired(created):
+                os.unlink(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                value = f.read()
+        except OSError:
+            return None
+        self._remember(key, created, value)
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        self._remember(key, time.time(), value)
+        if self.directory is None:
+            return
+        try:
+            atomic_write(self._path(key), value)
+            self._evict_disk()
+        except OSError as e:
+            logger.error(f"Ошибка записи кэша отчётов {self.directory}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Удаляет просроченные файлы и самые старые сверх лимита размера."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json") or entry.name.startswith(".tmp-"):
+                continue
+            stat = entry.stat()
+            if self._expired(stat.st_mtime):
+                os.unlink(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.unlink(path)
+            total -= size
@@ -0,0 +1,179 @@
+"""
+Отчёты о тратах по произвольным измерениям за один проход.
+
+Строки окна дат кодируются целыми ключами по каждому измерению (день недели, час, категория, карта...),
+ключи объединяются в номер ячейки, и все показатели считаются np.bincount по этим номерам.
+
+Пример — тепловая карта трат «день недели × час»:
+    spending_report(df, "2021-10-01", "2021-12-31", ["day_of_week", "hour"], {"amount": "sum"})
+"""
+import argparse
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import DateLike, date_index
+from src.dtypes import kopecks
+from src.operations_store import OPERATIONS_PATH, load_typed_operations
+from src.responses import dumps
+from src.schema import (AMOUNT, CARD_NUMBER, CASHBACK, CATEGORY, MCC,
+                        OPERATION_CURRENCY, OPERATION_DATE, STATUS)
+from src.tracing import stage
+
+# Названия дней недели в порядке numpy: 0 — понедельник
+DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+# Больше ячеек, чем это, в плотный массив не раскладываются — ключи сжимаются через np.unique
+MAX_DENSE_CELLS = 10_000_000
+
+# Измерение: (таблица, номера строк окна, даты окна) -> (коды строк от 0, подписи кодов)
+Dimension = Callable[[pd.DataFrame, np.ndarray, np.ndarray], Tuple[np.ndarray, list]]
+
+
+def _day_of_week(df: pd.DataFrame, positions: np.ndarray, dates: np.ndarray) -> Tuple[np.ndarray, list]:
+    # 1970-01-01 — четверг (3)
+    return (dates.astype("datetime64[D]").view(np.int64) + 3) % 7, list(DAY_NAMES)
+
+
+def _hour(df: pd.DataFrame, positions: np.ndarray, dates: np.ndarray) -> Tuple[np.ndarray, list]:
+    return (dates - dates.astype("datetime64[D]")).astype("timedelta64[h]").view(np.int64), list(range(24))
+
+
+def _calendar(unit: str) -> Dimension:
+    def dimension(df: pd.DataFrame, positions: np.ndarray, dates: np.ndarray) -> Tuple[np.ndarray, list]:
+        periods = dates.astype(f"datetime64[{unit}]")
+        if len(periods) == 0:
+            return np.zeros(0, dtype=np.int64), []
+        first = periods.min()
+        codes = (periods - first).view(np.int64)
+        labels = np.arange(first, periods.max() + 1).astype(str).tolist()
+        return codes, labels
+
+    return dimension
+
+
+def column_dimension(column: str) -> Dimension:
+    """Измерение по значениям столбца (категории кодируются своими кодами, прочее — factorize)."""
+
+    def dimension(df: pd.DataFrame, positions: np.ndarray, dates: np.ndarray) -> Tuple[np.ndarray, list]:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values.cat.codes.to_numpy()[positions].astype(np.int64), values.cat.categories.tolist()
+        codes, uniques = pd.factorize(values.take(positions))
+        labels = [int(value) if isinstance(value, (int, np.integer)) else value for value in uniques.tolist()]
+        return codes.astype(np.int64), labels
+
+    return dimension
+
+
+DIMENSIONS: Dict[str, Dimension] = {
+    "day_of_week": _day_of_week,
+    "hour": _hour,
+    "date": _calendar("D"),
+    "month": _calendar("M"),
+    "category": column_dimension(CATEGORY),
+    "card": column_dimension(CARD_NUMBER),
+    "mcc": column_dimension(MCC),
+    "currency": column_dimension(OPERATION_CURRENCY),
+    "status": column_dimension(STATUS),
+}
+MEASURES = ("sum", "count", "mean", "cashback")
+
+
+def spending_report(
+    df: pd.DataFrame,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    dimensions: Sequence[str] = ("day_of_week",),
+    measures: Union[Sequence[str], Mapping[str, str]] = ("sum",),
+    date_column: str = OPERATION_DATE,
+    amount_column: str = AMOUNT,
+    cashback_column: str = CASHBACK,
+) -> pd.DataFrame:
+    """
+    Траты за [start, end] в разрезе измерений: по строке на непустое сочетание значений,
+    отсортированные по измерениям (как groupby). measures — список показателей
+    или словарь {имя столбца: показатель}; суммы — в рублях, пропуски сумм считаются нулём.
+    """
+    if isinstance(measures, Mapping):
+        measures = dict(measures)
+    else:
+        measures = {measure: measure for measure in measures}
+    unknown = [name for name in dimensions if name not in DIMENSIONS and name not in df.columns]
+    unknown += [measure for measure in measures.values() if measure not in MEASURES]
+    if amount_column not in df.columns and {"sum", "mean"} & set(measures.values()):
+        unknown.append(amount_column)
+    if unknown:
+        raise ValueError(f"Неизвестные измерения или показатели: {', '.join(map(str, unknown))}")
+
+    index = date_index(df, date_column)
+    positions = index.positions(start, end)
+    dates = index.dates[positions]
+
+    with stage("report_engine.codes") as span:
+        # Номер ячейки — смешанная система счисления по кодам измерений
+        cells = np.zeros(len(positions), dtype=np.int64)
+        all_labels: List[list] = []
+        for name in dimensions:
+            codes, labels = DIMENSIONS.get(name, column_dimension(name))(df, positions, dates)
+            # Пропуск в значении измерения — отдельная подпись None (код -1)
+            codes = np.where(codes < 0, len(labels), codes)
+            labels = labels + [None]
+            cells = cells * len(labels) + codes
+            all_labels.append(labels)
+        span.add(rows=len(positions))
+    shape = [len(labels) for labels in all_labels]
+    size = int(np.prod(shape, dtype=np.float64))
+    if size > MAX_DENSE_CELLS:
+        keys, cells = np.unique(cells, return_inverse=True)
+        size = len(keys)
+    else:
+        keys = None
+
+    with stage("report_engine.bincount") as span:
+        counts = np.bincount(cells, minlength=size)
+        amounts = kopecks(df[amount_column])[positions] if amount_column in df.columns else None
+        columns: Dict[str, np.ndarray] = {}
+        for column, measure in measures.items():
+            if measure == "count":
+                columns[column] = counts
+            elif measure == "cashback":
+                cashback = np.nan_to_num(kopecks(df[cashback_column])[positions])
+                columns[column] = np.bincount(cells, weights=cashback, minlength=size) / 100
+            else:
+                total = np.bincount(cells, weights=np.nan_to_num(amounts), minlength=size) / 100
+                if measure == "sum":
+                    columns[column] = total
+                else:
+                    valid = np.bincount(cells, weights=~np.isnan(amounts), minlength=size)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        columns[column] = np.where(valid > 0, total / valid, np.nan)
+        span.add(rows=len(positions))
+
+    present = np.flatnonzero(counts)
+    flat = present if keys is None else keys[present]
+    result = {}
+    for name, labels, codes in zip(dimensions, all_labels, np.unravel_index(flat, shape) if shape else ()):
+        result[name] = np.array(labels, dtype=object)[codes]
+    for column, values in columns.items():
+        result[column] = values[present]
+    frame = pd.DataFrame(result, columns=list(dimensions) + list(columns))
+    if len(dimensions) and len(frame):
+        frame = frame.sort_values(list(dimensions), kind="stable", na_position="last").reset_index(drop=True)
+    return frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Отчёт о тратах по измерениям за период")
+    parser.add_argument("--file", default=OPERATIONS_PATH, help="файл или хранилище операций")
+    parser.add_argument("--start", help="начало периода")
+    parser.add_argument("--end", help="конец периода")
+    parser.add_argument("--by", nargs="+", default=["day_of_week"], help=f"измерения: {', '.join(DIMENSIONS)}")
+    parser.add_argument("--measures", nargs="+", default=["sum", "count"], choices=MEASURES)
+    args = parser.parse_args()
+    frame = spending_report(load_typed_operations(args.file), args.start, args.end, args.by, args.measures)
+    print(dumps(frame, pretty=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,277 @@
-import json
+import argparse
+import inspect
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
-from typing import Callable, Optional
-import os
+from typing import Callable, Dict, List, Optional, Union
 
-import pandas as pd
+import numpy as np
 
-def save_report(file_name: Optional[str] = None):
+from src.datasets import UserContext, operations_for, operations_path
+from src.date_index import date_index
+from src.dtypes import kopecks
+from src.fx_rates import get_store, with_base_amounts
+from src.operations_store import OPERATIONS_PATH, content_version
+from src.report_engine import DAY_NAMES
+from src.report_cache import ReportCache, report_key, write_if_changed
+from src.responses import dumps, loads, write_ndjson
+from src.schema import AMOUNT, BASE_AMOUNT, OPERATION_DATE
+from src.sql_store import operations_backend
+from src.tracing import entry_point, stage
+
+def save_report(
+    file_name: Optional[str] = None,
+    memoize: bool = False,
+    cache: Optional[ReportCache] = None,
+    ttl: Optional[float] = None,
+    data_arg: str = "file_path",
+):
     """
     Декоратор для сохранения результата функции в JSON-файл.
     Если имя файла не указано — формируется автоматически.
+
+    memoize=True включает кэш отчётов (src.report_cache): ключ — имя функции, аргументы
+    и версия файла операций из аргумента data_arg (или файла по умолчанию).
+    Повторный запрос возвращается из кэша без загрузки данных, а совпадающий файл не перезаписывается.
     """
 
     def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        report_cache = cache or (ReportCache(ttl=ttl) if memoize else None)
+        # Путь -> ключ отчёта, уже записанного в этот файл
+        written: Dict[str, str] = {}
+
+        def save(result: str, key: Optional[str]) -> None:
+            if file_name is not None:
+                path = file_name
+            elif key is not None:
+                # Имя по ключу: одинаковый отчёт попадает в тот же файл
+                path = f"report_{func.__name__}_{key[:12]}.json"
+            else:
+                now = datetime.now().strftime("%Y%m%d_%H%M%S")
+                path = f"report_{func.__name__}_{now}.json"
+            if key is not None and written.get(path) == key and os.path.exists(path):
+                return
+            try:
+                with stage("reports.save") as span:
+                    changed = write_if_changed(path, result)
+                    span.add(size=len(result.encode("utf-8")) if changed else 0)
+                if key is not None:
+                    written[path] = key
+                if changed:
+                    print(f"Отчет сохранен в файл: {path}")
+            except Exception as e:
+                print(f"Ошибка при сохранении отчета: {e}")
+
         @wraps(func)
         def wrapper(*args, **kwargs) -> str:
+            key = None
+            if report_cache is not None:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                version = content_version(operations_path(bound.arguments.get(data_arg, OPERATIONS_PATH)))
+                # Без источника данных отчёт не кэшируется: версию не с чем сравнить
+                if version is not None:
+                    # Суммы пересчитаны по истории курсов: её пополнение меняет отчёт
+                    key = report_key(func, bound, f"{version}:fx{get_store().version()}")
+                    cached = report_cache.get(key)
+                    if cached is not None:
+                        save(cached, key)
+                        return cached
+
             result: str = func(*args, **kwargs)
 
             # Проверяем, является ли результат ошибкой
-            result_dict = json.loads(result)
+            result_dict = loads(result)
             if "error" in result_dict:
                 print(f"Ошибка: {result_dict['error']}")
                 return result
 
-            nonlocal file_name
-            if file_name is None:
-                now = datetime.now().strftime("%Y%m%d_%H%M%S")
-                file_name = f"report_{func.__name__}_{now}.json"
-
-            try:
-                with open(file_name, "w", encoding="utf-8") as f:
-                    f.write(result)
-                print(f"Отчет сохранен в файл: {file_name}")
-            except Exception as e:
-                print(f"Ошибка при сохранении отчета: {e}")
-
+            if key is not None:
+                report_cache.put(key, result)
+            save(result, key)
             return result
 
+        setattr(wrapper, "cache", report_cache)
         return wrapper
 
     # Поддержка вызова как без скобок, так и с параметром
     if callable(file_name):
-        return decorator(file_name)
+        func, file_name = file_name, None
+        return decorator(func)
     return decorator
 
-@save_report
-def get_expenses_by_day_of_week(file_path: str, start_date: str) -> str:
-    """Функция для получения отчета о тратах по дням недели за трехмесячный период."""
+@save_report(memoize=True)
+@entry_point("reports.expenses_by_day_of_week")
+def get_expenses_by_day_of_week(file_path: Union[str, UserContext], start_date: str) -> str:
+    """
+    Функция для получения отчета о тратах по дням недели за трехмесячный период.
+    Вместо пути можно передать контекст пользователя (src.datasets).
+    """
     try:
-        # Используем абсолютный путь к файлу
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        operations_data_path = os.path.join(base_dir, "data", "operations.xlsx")
-
-        df = pd.read_excel(operations_data_path)
+        operations = operations_backend(file_path, converted=True)
+        columns = operations.columns
 
         # Проверяем наличие столбца с датами
-        if 'date' not in df.columns:
-            # Если столбец называется по-другому, например, 'Дата операции'
-            if 'Дата операции' in df.columns:
-                df['date'] = df['Дата операции']
-            else:
-                return json.dumps(
-                    {"error": "Столбец с датами не найден."},
-                    ensure_ascii=False,
-                    indent=4,
-                )
-
-        # Указываем формат даты при преобразовании
-        df["date"] = pd.to_datetime(df["date"], format='%d.%m.%Y %H:%M:%S', dayfirst=True)
+        if 'date' in columns:
+            date_column = 'date'
+        # Если столбец называется по-другому, например, 'Дата операции'
+        elif OPERATION_DATE in columns:
+            date_column = OPERATION_DATE
+        else:
+            return dumps({"error": "Столбец с датами не найден."})
+        amount_column = "amount" if "amount" in columns else BASE_AMOUNT if BASE_AMOUNT in columns else AMOUNT
 
         start_date_dt = datetime.strptime(start_date, "%Y-%m-%d")
         end_date = start_date_dt + timedelta(days=90)
 
-        filtered_df = df[(df["date"] >= start_date_dt) & (df["date"] <= end_date)]
-
-        if filtered_df.empty:
-            return json.dumps(
-                {"error": "Нет данных для выбранного периода."},
-                ensure_ascii=False,
-                indent=4,
-            )
-
-        # Группировка по дням недели
-        filtered_df["day_of_week"] = filtered_df["date"].dt.day_name()
-        day_of_week_expenses = (
-            filtered_df.groupby("day_of_week")["amount"].sum().reset_index()
+        # Один проход движка отчётов (или GROUP BY в базе): измерение — день недели, показатель — сумма трат
+        day_of_week_expenses = operations.spending_report(
+            start_date_dt, end_date, ["day_of_week"], {"amount": "sum"}, date_column, amount_column
         )
+        if day_of_week_expenses.empty:
+            return dumps({"error": "Нет данных для выбранного периода."})
         result = day_of_week_expenses.to_dict(orient="records")
 
-        return json.dumps(result, ensure_ascii=False, indent=4)
+        return dumps(result)
 
     except Exception as e:
-        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=4)
+        return dumps({"error": str(e)})
 
-if __name__ == "__main__":
-    start_date = "2025-01-01"
-    result = get_expenses_by_day_of_week("data/operations.xlsx", start_date)
+# Длина окна отчёта по дням недели, дни
+REPORT_DAYS = 90
+# Дни недели в порядке ответа отчёта (по алфавиту названий)
+DAY_ORDER = sorted(range(7), key=lambda day: DAY_NAMES[day])
+# Начиная с этого числа строк дневные суммы можно считать в пуле процессов
+PARALLEL_MIN_ROWS = 1_000_000
+
+
+def rolling_start_dates(first: str, last: str, step_days: int) -> List[str]:
+    """Начала окон от first до last включительно с шагом step_days."""
+    starts = np.arange(np.datetime64(first, "D"), np.datetime64(last, "D") + 1, step_days)
+    return [str(day) for day in starts]
+
+
+def _daily_sums(dates: np.ndarray, amounts: np.ndarray, first_day: np.datetime64, n_days: int) -> np.ndarray:
+    """
+    Суммы (копейки) и число операций по дням периода, отдельно — операций ровно в полночь:
+    окно [начало, начало + N дней] включает полночь последнего дня. Массив формы (4, n_days).
+    """
+    days = dates.astype("datetime64[D]")
+    offsets = (days - first_day).astype(np.int64)
+    inside = ~np.isnat(dates) & (offsets >= 0) & (offsets < n_days)
+    offsets, amounts = offsets[inside], np.nan_to_num(amounts[inside])
+    midnight = dates[inside] == days[inside]
+    return np.stack([
+        np.bincount(offsets, weights=amounts, minlength=n_days),
+        np.bincount(offsets, minlength=n_days).astype(np.float64),
+        np.bincount(offsets[midnight], weights=amounts[midnight], minlength=n_days),
+        np.bincount(offsets[midnight], minlength=n_days).astype(np.float64),
+    ])
+
+
+def _parallel_daily_sums(
+    dates: np.ndarray, amounts: np.ndarray, first_day: np.datetime64, n_days: int, workers: int
+) -> np.ndarray:
+    """Дневные суммы по частям строк в пуле процессов; частичные результаты складываются."""
+    bounds = np.linspace(0, len(dates), workers + 1).astype(np.int64)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(
+            _daily_sums,
+            [dates[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+            [amounts[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+            [first_day] * workers,
+            [n_days] * workers,
+        )
+        return sum(parts)
+
+
+def expenses_by_day_of_week_batch(
+    file_path: Union[str, UserContext], start_dates: List[str], days: int = REPORT_DAYS, workers: int = 1
+) -> List[dict]:
+    """
+    Отчёты о тратах по дням недели для многих окон за один проход по данным.
+    Строки сводятся в дневные суммы, окна собираются из накопленных сумм по дням недели.
+    Для каждого начала окна — запись с датами окна и тратами (или ошибкой, как у одиночного отчёта).
+    """
+    df = with_base_amounts(operations_for(file_path))
+    date_column = "date" if "date" in df.columns else OPERATION_DATE
+    if date_column not in df.columns:
+        raise ValueError("Столбец с датами не найден.")
+    amount_column = "amount" if "amount" in df.columns else BASE_AMOUNT if BASE_AMOUNT in df.columns else AMOUNT
+    starts = np.array([np.datetime64(datetime.strptime(start, "%Y-%m-%d"), "D") for start in start_dates])
+    if len(starts) == 0:
+        return []
+
+    first_day = starts.min()
+    # Последний нужный день — полночь конца самого позднего окна
+    n_days = int((starts.max() - first_day).astype(np.int64)) + days + 1
+    dates = date_index(df, date_column).dates
+    amounts = kopecks(df[amount_column])
+    with stage("reports.daily_sums") as span:
+        if workers > 1 and len(df) >= PARALLEL_MIN_ROWS:
+            sums = _parallel_daily_sums(dates, amounts, first_day, n_days, workers)
+        else:
+            sums = _daily_sums(dates, amounts, first_day, n_days)
+        span.add(rows=len(df))
+
+    with stage("reports.windows") as span:
+        # Накопленные суммы по дням недели: cumulative[k, 0|1, d] — за первые k дней периода
+        weekdays = (np.arange(n_days) + (first_day.astype(np.int64) + 3)) % 7
+        by_weekday = np.zeros((n_days + 1, 2, 7))
+        by_weekday[np.arange(1, n_days + 1), 0, weekdays] = sums[0]
+        by_weekday[np.arange(1, n_days + 1), 1, weekdays] = sums[1]
+        cumulative = np.cumsum(by_weekday, axis=0)
+
+        lo = (starts - first_day).astype(np.int64)
+        hi = lo + days
+        totals = cumulative[hi] - cumulative[lo]
+        # Операции ровно в полночь последнего дня входят в окно
+        totals[np.arange(len(lo)), 0, weekdays[hi]] += sums[2, hi]
+        totals[np.arange(len(lo)), 1, weekdays[hi]] += sums[3, hi]
+        span.add(rows=len(starts))
+
+    results = []
+    for start, window in zip(starts, totals):
+        record = {"start_date": str(start), "end_date": str(start + days)}
+        expenses = [
+            {"day_of_week": DAY_NAMES[day], "amount": window[0, day] / 100} for day in DAY_ORDER if window[1, day] > 0
+        ]
+        if expenses:
+            record["expenses"] = expenses
+        else:
+            record["error"] = "Нет данных для выбранного периода."
+        results.append(record)
+    return results
 
-    print(result)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Отчёты о тратах по дням недели")
+    parser.add_argument("start_dates", nargs="*", default=["2025-01-01"], help="начала окон, ГГГГ-ММ-ДД")
+    parser.add_argument("--until", help="последнее начало окна: окна с шагом --step от первой даты")
+    parser.add_argument("--step", type=int, default=7, help="шаг скользящих окон, дни")
+    parser.add_argument("--days", type=int, default=REPORT_DAYS, help="длина окна, дни")
+    parser.add_argument("--file", default=OPERATIONS_PATH, help="файл или хранилище операций")
+    parser.add_argument("--workers", type=int, default=1, help="процессов для дневных сумм")
+    parser.add_argument("--output", help="файл результата: .ndjson — по окну на строку, иначе один JSON")
+    args = parser.parse_args()
+
+    start_dates = args.start_dates
+    if args.until:
+        start_dates = rolling_start_dates(start_dates[0], args.until, args.step)
+    results = expenses_by_day_of_week_batch(args.file, start_dates, args.days, args.workers)
+
+    if args.output is None:
+        write_ndjson(sys.stdout.buffer, results)
+    elif args.output.endswith(".ndjson"):
+        with open(args.output + ".tmp", "wb") as f:
+            write_ndjson(f, results)
+        os.replace(args.output + ".tmp", args.output)
+    else:
+        write_if_changed(args.output, dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import base64
+import os
+from itertools import chain
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.tracing import stage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - без orjson работает стандартный json
+    orjson = None  # type: ignore[assignment]
+    import json
+
+# Отладочный режим: ответы с отступами (по умолчанию — компактные)
+PRETTY_JSON = os.getenv("JSON_PRETTY", "").lower() in ("1", "true", "yes")
+# Сколько строк таблицы кодируется за один шаг потоковой выдачи NDJSON
+NDJSON_CHUNK_ROWS = 10_000
+# Размер страницы без limit; следующие страницы листаются курсором next_cursor
+DEFAULT_PAGE_SIZE = 100
+
+
+def frame_records(df: Any, columns: Optional[List[str]] = None) -> List[dict]:
+    """
+    Строки таблицы в виде списка словарей, собранные прямо из массивов столбцов.
+    Даты отдаются строками ISO 8601, пропуски — null.
+    """
+    import numpy as np
+
+    names = list(df.columns) if columns is None else columns
+    values = []
+    for name in names:
+        series = df[name]
+        column = series.to_numpy()
+        if column.dtype.kind == "M":
+            missing = np.isnat(column)
+            column = np.datetime_as_string(column, unit="s").astype(object)
+        else:
+            missing = series.isna().to_numpy()
+        if missing.any():
+            column = column.astype(object)
+            column[missing] = None
+        values.append(column.tolist())
+    return [dict(zip(names, row)) for row in zip(*values)] if names else [{} for _ in range(len(df))]
+
+
+def _encode_scalar(value: Any) -> str:
+    if orjson is None:
+        return json.dumps(value, ensure_ascii=False)
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+
+
+def _column_fragments(series: Any, prefix: str, suffix: str) -> List[str]:
+    """
+    Значения столбца в виде фрагментов JSON с ключом: prefix + значение + suffix.
+    Числа форматируются numpy целиком, остальные значения кодируются по одному разу
+    на уникальное значение и раскладываются по кодам строк.
+    """
+    import numpy as np
+    import pandas as pd
+
+    dtype = series.dtype
+    if dtype.kind in "iuf" and not isinstance(dtype, pd.CategoricalDtype):
+        missing = series.isna().to_numpy()
+        values = series.to_numpy(dtype=np.float64 if dtype.kind == "f" else np.int64, na_value=0)
+        text = values.astype(str).astype(object)
+        if dtype.kind == "f":
+            missing = missing | ~np.isfinite(values)
+        text[missing] = "null"
+        return (prefix + text + suffix).tolist()
+
+    codes, uniques = pd.factorize(series)
+    if uniques.dtype.kind == "M":
+        shown = ['"' + value + '"' for value in np.datetime_as_string(uniques.to_numpy(), unit="s").tolist()]
+    else:
+        shown = [_encode_scalar(value) for value in np.asarray(uniques, dtype=object).tolist()]
+    # Код -1 (пропуск) указывает на последний элемент — null
+    fragments = np.array([prefix + value + suffix for value in shown] + [prefix + "null" + suffix], dtype=object)
+    return fragments[codes].tolist()
+
+
+def _frame_rows(df: Any, columns: Optional[List[str]], row_start: str, row_end: str) -> str:
+    """Строки таблицы объектами JSON: row_start перед каждой строкой, row_end после; словари строк не создаются."""
+    names = list(df.columns) if columns is None else columns
+    if not names:
+        return (row_start + "{}" + row_end) * len(df)
+    parts = []
+    for i, name in enumerate(names):
+        prefix = (row_start + "{" if i == 0 else ",") + _encode_scalar(str(name)) + ":"
+        suffix = "}" + row_end if i == len(names) - 1 else ""
+        parts.append(_column_fragments(df[name], prefix, suffix))
+    return "".join(chain.from_iterable(zip(*parts)))
+
+
+def frame_json(df: Any, columns: Optional[List[str]] = None) -> bytes:
+    """
+    Таблица как массив объектов JSON — то же, что frame_records, но текст собирается
+    прямо из массивов столбцов, без словаря на каждую строку.
+    """
+    return ("[" + _frame_rows(df, columns, ",", "")[1:] + "]").encode("utf-8")
+
+
+def _detach_frames(data: Any, frames: Dict[str, bytes]) -> Any:
+    """Заменяет таблицы pandas в ответе (в значениях словарей и элементах списков) метками, таблицы кодируются отдельно."""
+    if hasattr(data, "columns") and hasattr(data, "iloc"):
+        token = f"\0frame:{len(frames)}\0"
+        frames[token] = frame_json(data)
+        return token
+    if isinstance(data, dict):
+        return {key: _detach_frames(value, frames) for key, value in data.items()}
+    if isinstance(data, (list, tuple)) and any(isinstance(item, (dict, list, tuple)) or hasattr(item, "iloc") for item in data):
+        return [_detach_frames(item, frames) for item in data]
+    return data
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые orjson не кодирует сам: таблицы pandas, Timestamp, пропуски pandas."""
+    module = type(value).__module__
+    if module.startswith("pandas"):
+        import pandas as pd
+
+        if isinstance(value, pd.DataFrame):
+            return frame_records(value)
+        if isinstance(value, pd.Series):
+            return value.tolist()
+        if value is pd.NA or value is pd.NaT:
+            return None
+        if isinstance(value, pd.Timestamp):
+            return value.isoformat()
+    if module == "numpy":
+        return value.tolist()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _encode(data: Any, pretty: bool) -> bytes:
+    if orjson is None:
+        return json.dumps(data, ensure_ascii=False, indent=2 if pretty else None, default=_default).encode()
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=_default, option=option)
+
+
+def dumps_bytes(data: Any, pretty: Optional[bool] = None) -> bytes:
+    """
+    Кодирует ответ в JSON (UTF-8). pretty включает отступы, по умолчанию — PRETTY_JSON.
+    В компактном режиме таблицы pandas кодируются из массивов столбцов (frame_json) и вставляются в готовый текст.
+    """
+    pretty = PRETTY_JSON if pretty is None else pretty
+    with stage("json.encode") as span:
+        if pretty:
+            encoded = _encode(data, pretty)
+        else:
+            frames: Dict[str, bytes] = {}
+            encoded = _encode(_detach_frames(data, frames), pretty)
+            for token, frame in frames.items():
+                encoded = encoded.replace(_encode(token, pretty), frame, 1)
+        span.add(size=len(encoded))
+    return encoded
+
+
+def dumps(data: Any, pretty: Optional[bool] = None) -> str:
+    """Кодирует ответ в строку JSON; таблицы pandas внутри ответа кодируются как списки записей."""
+    return dumps_bytes(data, pretty).decode("utf-8")
+
+
+def loads(text: Any) -> Any:
+    """Разбирает JSON (строку или байты)."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def iter_ndjson(rows: Any, chunk_rows: int = NDJSON_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    Потоковая выдача в формате NDJSON (по объекту на строку) порциями по chunk_rows строк.
+    Принимает DataFrame или любой итерируемый набор записей; в памяти одновременно только одна порция.
+    """
+    if hasattr(rows, "columns") and hasattr(rows, "iloc"):
+        for start in range(0, len(rows), chunk_rows):
+            yield _frame_rows(rows.iloc[start:start + chunk_rows], None, "", "\n").encode("utf-8")
+        return
+
+    chunk: List[bytes] = []
+    for record in rows:
+        chunk.append(dumps_bytes(record, pretty=False) + b"\n")
+        if len(chunk) >= chunk_rows:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+
+
+def write_ndjson(stream: IO[bytes], rows: Any, chunk_rows: int = NDJSON_CHUNK_ROWS) -> int:
+    """Пишет записи в бинарный поток в формате NDJSON; возвращает число записанных байт."""
+    written = 0
+    for chunk in iter_ndjson(rows, chunk_rows):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def read_ndjson(lines: Iterable[Any]) -> Iterator[Any]:
+    """Разбирает NDJSON построчно, пропуская пустые строки."""
+    for line in lines:
+        if line.strip():
+            yield loads(line)
+
+
+def encode_cursor(offset: int) -> str:
+    """Непрозрачный курсор следующей страницы."""
+    return base64.urlsafe_b64encode(f"offset:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, offset = text.partition(":")
+        if prefix != "offset" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Некорректный курсор: {cursor}") from None
+
+
+def page_info(
+    total: int,
+    columns: Any,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+) -> dict:
+    """
+    Проверяет параметры страницы и возвращает сведения о ней для ответа (total, offset, limit, курсор).
+    Без limit страница — DEFAULT_PAGE_SIZE строк; следующую отдаёт next_cursor.
+    """
+    if cursor is not None:
+        offset = decode_cursor(cursor)
+    limit = DEFAULT_PAGE_SIZE if limit is None else limit
+    if (limit is not None and limit < 0) or offset < 0:
+        raise ValueError("limit и offset не могут быть отрицательными")
+    if fields is not None:
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(map(str, unknown))}")
+
+    end = min(offset + limit, total)
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_cursor": encode_cursor(end) if end < total else None,
+    }
+
+
+def page_bounds(page: dict) -> Tuple[int, int]:
+    """Границы среза [начало, конец) по сведениям о странице из page_info."""
+    offset, total = page["offset"], page["total"]
+    return offset, max(offset, min(offset + page["limit"], total))
+
+
+def paginate(
+    df: Any,
+    positions: Any = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    count_only: bool = False,
+    cursor: Optional[str] = None,
+) -> Tuple[Any, dict]:
+    """
+    Страница строк таблицы: срез [offset, offset + limit) из всех строк или из positions
+    (номеров отобранных строк), только с полями fields. Материализуется лишь сам срез.
+    Возвращает срез (None при count_only) и сведения о странице для ответа.
+    """
+    total = len(df) if positions is None else len(positions)
+    page = page_info(total, df.columns, limit, offset, fields, cursor)
+    if count_only:
+        return None, page
+
+    from src.dtypes import to_display
+
+    offset, end = page_bounds(page)
+    projected = df if fields is None else df[fields]
+    if positions is None:
+        return to_display(projected.iloc[offset:end]), page
+    return to_display(projected.take(positions[offset:end])), page
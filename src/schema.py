@@ -0,0 +1,18 @@
+"""Названия столбцов выгрузки операций банка."""
+
+OPERATION_DATE = "Дата операции"
+PAYMENT_DATE = "Дата платежа"
+CARD_NUMBER = "Номер карты"
+STATUS = "Статус"
+OPERATION_AMOUNT = "Сумма операции"
+OPERATION_CURRENCY = "Валюта операции"
+PAYMENT_AMOUNT = "Сумма платежа"
+PAYMENT_CURRENCY = "Валюта платежа"
+CASHBACK = "Кэшбэк"
+CATEGORY = "Категория"
+MCC = "MCC"
+DESCRIPTION = "Описание"
+BONUSES = "Бонусы (включая кэшбэк)"
+INVESTMENT_ROUNDING = "Округление на инвесткопилку"
+AMOUNT = "Сумма операции с округлением"
+BASE_AMOUNT = "Сумма в базовой валюте"
@@ -0,0 +1,258 @@
+import logging
+import os
+import pickle
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.dtypes import display_values
+from src.operations_store import derived_path, frame_memo, save_atomically
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "search_index.pkl"
+# n-граммы длиной от 1 до 3 символов; кодовая точка Unicode занимает 21 бит
+MAX_NGRAM = 3
+_BITS = 21
+# Доля новых значений, после которой дельта вливается в основной индекс
+COMPACT_RATIO = 0.1
+
+
+def _cell_strings(values: pd.Series) -> Tuple[np.ndarray, List[str]]:
+    """
+    Коды строк столбца и уникальные значения в том виде, в каком их видит str.contains
+    в выгрузке банка (даты — в формате выгрузки, суммы — в рублях).
+    Пропуски получают код -1 и, как и при сканировании, ничему не соответствуют.
+    """
+    codes, uniques = pd.factorize(values)
+    shown = display_values(pd.Series(uniques, name=values.name))
+    return codes, [str(value).lower().replace("\0", " ") for value in shown]
+
+
+def _ngram_keys(text: str, n: int) -> np.ndarray:
+    points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    keys = np.zeros(len(points) - n + 1, dtype=np.int64)
+    for shift in range(n):
+        keys |= points[shift:len(points) - n + 1 + shift] << (_BITS * (MAX_NGRAM - 1 - shift))
+    return keys
+
+
+def _build_postings(strings: List[str], first_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Инвертированный индекс n-грамм: отсортированные ключи n-грамм, границы списков
+    и номера значений словаря. Строится векторно по склейке всех строк через '\\0'.
+    """
+    if not strings:
+        empty = np.array([], dtype=np.int64)
+        return empty, np.zeros(1, dtype=np.int64), empty.astype(np.int32)
+    joined = "\0".join(strings) + "\0"
+    points = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    lengths = np.fromiter((len(s) + 1 for s in strings), dtype=np.int64, count=len(strings))
+    owners = np.repeat(np.arange(first_id, first_id + len(strings), dtype=np.int32), lengths)
+
+    keys_parts, owners_parts = [], []
+    valid = points != 0
+    for n in range(1, MAX_NGRAM + 1):
+        size = len(points) - n + 1
+        keys = np.zeros(size, dtype=np.int64)
+        mask = np.ones(size, dtype=bool)
+        for shift in range(n):
+            keys |= points[shift:size + shift] << (_BITS * (MAX_NGRAM - 1 - shift))
+            mask &= valid[shift:size + shift]
+        keys_parts.append(keys[mask])
+        owners_parts.append(owners[:size][mask])
+
+    keys = np.concatenate(keys_parts)
+    owners = np.concatenate(owners_parts)
+    order = np.lexsort((owners, keys))
+    keys, owners = keys[order], owners[order]
+    unique = np.ones(len(keys), dtype=bool)
+    unique[1:] = (keys[1:] != keys[:-1]) | (owners[1:] != owners[:-1])
+    keys, owners = keys[unique], owners[unique]
+
+    gram_keys, starts = np.unique(keys, return_index=True)
+    offsets = np.append(starts, len(keys)).astype(np.int64)
+    return gram_keys, offsets, owners
+
+
+def _lookup(gram_keys: np.ndarray, offsets: np.ndarray, owners: np.ndarray, key: int) -> np.ndarray:
+    i = int(np.searchsorted(gram_keys, key))
+    if i == len(gram_keys) or gram_keys[i] != key:
+        return owners[:0]
+    return owners[offsets[i]:offsets[i + 1]]
+
+
+def _gather(offsets: np.ndarray, values: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Склеивает срезы values[offsets[i]:offsets[i + 1]] для всех ids без цикла Python."""
+    starts, ends = offsets[ids], offsets[ids + 1]
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return values[:0]
+    shift = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return values[np.arange(total) + shift]
+
+
+class SearchIndex:
+    """
+    Полнотекстовый индекс по строковым представлениям ячеек операций.
+    Словарь уникальных значений покрыт инвертированным индексом n-грамм (1–3 символа),
+    для каждого значения хранится список строк, где оно встречается.
+    Новые операции добавляются в дельту, которая периодически вливается в основной индекс.
+    """
+
+    def __init__(self, columns: Optional[List[str]] = None):
+        self.columns = columns
+        self.n_rows = 0
+        self.vocab: List[str] = []
+        self._vocab_ids: Optional[Dict[str, int]] = None
+        # Основной индекс n-грамм и дельта для значений, добавленных после сборки
+        self._grams = _build_postings([], 0)
+        self._delta_start = 0
+        self._delta_grams = _build_postings([], 0)
+        # Строки по значениям словаря в CSR-виде: строки значения i — _rows[_row_offsets[i]:_row_offsets[i + 1]]
+        self._row_offsets = np.zeros(1, dtype=np.int64)
+        self._rows = np.array([], dtype=np.int64)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, columns: Optional[List[str]] = None) -> "SearchIndex":
+        index = cls(columns)
+        index.append(df)
+        return index
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Добавляет новые строки операций (их номера продолжают уже проиндексированные)."""
+        if self._vocab_ids is None:
+            self._vocab_ids = {value: i for i, value in enumerate(self.vocab)}
+        first_new = len(self.vocab)
+        rows = np.arange(len(df), dtype=np.int64)
+
+        pair_vocab, pair_rows = [], []
+        for column in self.columns or list(df.columns):
+            if column not in df.columns:
+                continue
+            codes, strings = _cell_strings(df[column])
+            mapping = np.empty(len(strings), dtype=np.int32)
+            for i, value in enumerate(strings):
+                vocab_id = self._vocab_ids.get(value)
+                if vocab_id is None:
+                    vocab_id = self._vocab_ids[value] = len(self.vocab)
+                    self.vocab.append(value)
+                mapping[i] = vocab_id
+            present = codes >= 0
+            pair_vocab.append(mapping[codes[present]])
+            pair_rows.append(rows[present])
+
+        if pair_vocab:
+            # Одно и то же значение в нескольких столбцах строки учитываем один раз
+            n_new = max(len(df), 1)
+            pairs = np.unique(np.concatenate(pair_vocab).astype(np.int64) * n_new + np.concatenate(pair_rows))
+            self._add_rows((pairs // n_new).astype(np.int32), pairs % n_new + self.n_rows)
+        self.n_rows += len(df)
+
+        if len(self.vocab) - self._delta_start > COMPACT_RATIO * max(self._delta_start, 1):
+            self.compact()
+        elif len(self.vocab) > first_new:
+            self._delta_grams = _build_postings(self.vocab[self._delta_start:], self._delta_start)
+
+    def compact(self) -> None:
+        """Вливает дельту в основной индекс n-грамм."""
+        self._grams = _build_postings(self.vocab, 0)
+        self._delta_start = len(self.vocab)
+        self._delta_grams = _build_postings([], self._delta_start)
+
+    def _add_rows(self, vocab_ids: np.ndarray, rows: np.ndarray) -> None:
+        # Новые строки вставляются в конец списков своих значений: O(N + k log k)
+        order = np.argsort(vocab_ids, kind="stable")
+        vocab_ids, rows = vocab_ids[order], rows[order]
+        offsets = np.pad(self._row_offsets, (0, len(self.vocab) + 1 - len(self._row_offsets)), mode="edge")
+        self._rows = np.insert(self._rows, offsets[vocab_ids + 1], rows)
+        counts = np.bincount(vocab_ids, minlength=len(self.vocab))
+        self._row_offsets = offsets + np.concatenate(([0], np.cumsum(counts)))
+
+    def _candidates(self, key: int) -> np.ndarray:
+        return np.concatenate([_lookup(*self._grams, key), _lookup(*self._delta_grams, key)])
+
+    def matching_values(self, query: str, prefix: bool = False) -> np.ndarray:
+        """Номера значений словаря, содержащих запрос (или начинающихся с него при prefix=True)."""
+        query = query.lower()
+        if not query:
+            return np.arange(len(self.vocab), dtype=np.int32)
+        n = min(len(query), MAX_NGRAM)
+        keys = _ngram_keys(query, n)
+        candidates = None
+        for key in np.unique(keys):
+            postings = self._candidates(int(key))
+            candidates = postings if candidates is None else np.intersect1d(candidates, postings, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        # Для запросов до трёх символов список n-граммы точен, длиннее — нужна проверка
+        if prefix:
+            return np.array([i for i in candidates if self.vocab[i].startswith(query)], dtype=np.int32)
+        if len(query) > MAX_NGRAM:
+            return np.array([i for i in candidates if query in self.vocab[i]], dtype=np.int32)
+        return candidates
+
+    def search(self, query: str, prefix: bool = False) -> np.ndarray:
+        """Номера строк (по возрастанию), в которых хотя бы одна ячейка содержит запрос."""
+        values = self.matching_values(query, prefix)
+        rows = _gather(self._row_offsets, self._rows, values.astype(np.int64))
+        if len(values) == 1:
+            # Строки одного значения уже упорядочены и не повторяются
+            return rows
+        # Объединение через битовую маску — O(n + k) без сортировки
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return np.flatnonzero(mask)
+
+    @property
+    def nbytes(self) -> int:
+        """Память индекса: массивы n-грамм и строк, словарь значений."""
+        arrays = (*self._grams, *self._delta_grams, self._row_offsets, self._rows)
+        vocab = sys.getsizeof(self.vocab) + sum(sys.getsizeof(value) for value in self.vocab)
+        ids = sys.getsizeof(self._vocab_ids) if self._vocab_ids is not None else 0
+        return int(sum(array.nbytes for array in arrays) + vocab + ids)
+
+    def save(self, path: str) -> None:
+        save_atomically(path, lambda f: pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_vocab_ids"] = None
+        return state
+
+
+def search_index(df: pd.DataFrame) -> SearchIndex:
+    """
+    Поисковый индекс по всем столбцам таблицы, строится один раз на версию данных.
+    Для таблиц из хранилища операций сохраняется рядом с кэшем.
+    """
+    return frame_memo(df, "search_index", lambda: _build_search_index(df))
+
+
+def _build_search_index(df: pd.DataFrame) -> SearchIndex:
+    path = derived_path(df, INDEX_FILE)
+    if path is not None and os.path.exists(path):
+        try:
+            index = SearchIndex.load(path)
+            if index.n_rows == len(df):
+                return index
+            logger.warning(f"Поисковый индекс {path} построен по {index.n_rows} строкам из {len(df)}, строится заново")
+        except Exception as e:
+            logger.error(f"Ошибка чтения поискового индекса {path}: {e}")
+
+    index = SearchIndex.build(df)
+    logger.info(f"Поисковый индекс построен: {len(index.vocab)} значений, {index.n_rows} строк")
+    if path is not None:
+        try:
+            index.save(path)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения поискового индекса {path}: {e}")
+    return index
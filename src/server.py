@@ -0,0 +1,415 @@
+"""
+Локальный HTTP-сервис (ASGI) с тёплыми данными: операции загружаются один раз при старте
+и перечитываются в фоне при изменении файла.
+
+Обработчики — синхронные функции проекта; они выполняются в пуле потоков,
+который делит один загруженный DataFrame только для чтения.
+
+Запуск (нужен uvicorn):
+    python -m src.server --port 8000 --workers 4
+    UPSTREAM_STUBS=stubs.json python -m src.server   # внешние API — заглушки
+    python -m src.server --processes 8               # процессы делят данные через /dev/shm
+
+Маршруты (параметр user — данные пользователя вместо файла сервиса, см. src.datasets):
+    GET /home?datetime=2021-12-31 12:00:00&user=&limit=&offset=&fields=&count_only=&cursor=
+    GET /search?q=магнит&limit=&offset=&fields=&count_only=&cursor=
+    GET /reports/expenses-by-day-of-week?start_date=2021-10-01
+    GET /reports/expenses-by-day-of-week/batch?start_date=2021-01-01&until=2021-12-01&step=7&days=90
+    GET /health, GET /metrics (Prometheus), GET /metrics.json
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qs
+
+from src import main as main_module
+from src import fx_rates, operations_store, reports, services, tracing
+from src.datasets import UserContext, get_manager
+from src.operations_store import load_typed_operations, source_version
+from src.responses import dumps_bytes, iter_ndjson
+from src.shared_dataset import SharedPublisher, attach, current_directory
+
+logger = logging.getLogger(__name__)
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Как часто (в секундах) проверять, не изменился ли файл операций
+RELOAD_SECONDS = float(os.getenv("SERVER_RELOAD_SECONDS", "2"))
+
+JSON_TYPE = b"application/json; charset=utf-8"
+NDJSON_TYPE = b"application/x-ndjson"
+TEXT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+
+# Тело ответа: готовые байты или поток порций
+Body = Union[bytes, Iterable[bytes]]
+Response = Tuple[int, bytes, Body]
+
+
+class BadRequest(ValueError):
+    """Ошибка в параметрах запроса (ответ 400)."""
+
+
+def _one(params: Dict[str, List[str]], name: str, default: Optional[str] = None) -> Optional[str]:
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _required(params: Dict[str, List[str]], name: str) -> str:
+    value = _one(params, name)
+    if not value:
+        raise BadRequest(f"Не указан параметр {name}")
+    return value
+
+
+def _int(params: Dict[str, List[str]], name: str, default: Optional[int] = None) -> Optional[int]:
+    value = _one(params, name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise BadRequest(f"Параметр {name} должен быть целым числом")
+
+
+def _page_params(params: Dict[str, List[str]]) -> dict:
+    fields = _one(params, "fields")
+    return {
+        "limit": _int(params, "limit"),
+        "offset": _int(params, "offset", 0),
+        "fields": [field for field in fields.split(",") if field] if fields else None,
+        "count_only": (_one(params, "count_only") or "").lower() in ("1", "true", "yes"),
+        "cursor": _one(params, "cursor"),
+    }
+
+
+def _json(text: str) -> Response:
+    return 200, JSON_TYPE, text.encode("utf-8")
+
+
+class Service:
+    """ASGI-приложение: маршрутизация, пул обработчиков, фоновая перезагрузка данных."""
+
+    def __init__(
+        self,
+        data_path: Optional[str] = None,
+        workers: int = SERVER_WORKERS,
+        reload_seconds: float = RELOAD_SECONDS,
+        shared_root: Optional[str] = None,
+    ):
+        # Корень выкладки родителя (src.shared_dataset): данные берутся из неё, а не из файла
+        self.shared_root = shared_root
+        self.shared_directory: Optional[str] = None
+        if shared_root is not None:
+            self.shared_directory = current_directory(shared_root)
+            shared = attach(self.shared_directory)
+            data_path = data_path or operations_store.source_of(shared)
+        # Путь передаётся обработчикам явно: глобальный OPERATIONS_PATH не меняется
+        self.data_path = data_path or operations_store.OPERATIONS_PATH
+        self.workers = workers
+        self.reload_seconds = reload_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="server")
+        self.version: Optional[str] = None
+        self.rows = 0
+        self.loaded_at: Optional[str] = None
+        self.started = time.time()
+        # Счётчики увеличиваются в потоках пула — под блокировкой
+        self.requests = 0
+        self.errors = 0
+        self._counters_lock = threading.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self.routes: Dict[str, Callable[[Dict[str, List[str]]], Response]] = {
+            "/home": self.home,
+            "/search": self.search,
+            "/reports/expenses-by-day-of-week": self.expenses_by_day_of_week,
+            "/reports/expenses-by-day-of-week/batch": self.expenses_by_day_of_week_batch,
+            "/health": self.health,
+            "/metrics": self.metrics,
+            "/metrics.json": self.metrics_json,
+        }
+
+    # Данные
+
+    def load(self) -> None:
+        """Загружает (или перечитывает изменившиеся) операции; запросы тем временем идут по старой версии."""
+        version = source_version(self.data_path)
+        df = load_typed_operations(self.data_path)
+        self.version, self.rows = version, len(df)
+        self.loaded_at = datetime.now().isoformat()
+        logger.info(f"Данные загружены: {self.data_path}, строк: {self.rows}")
+
+    def refresh_rates(self) -> None:
+        """Пополняет историю курсов раз в день; без сети сервис работает на накопленной истории."""
+        try:
+            fx_rates.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка обновления курсов валют: {e}")
+
+    def check_reload(self) -> bool:
+        """Перечитывает данные, если файл изменился; возвращает, была ли перезагрузка."""
+        self.refresh_rates()
+        if self.shared_root is not None:
+            return self.check_shared(self.shared_root)
+        if source_version(self.data_path) == self.version:
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки данных {self.data_path}: {e}")
+            return False
+        return True
+
+    def check_shared(self, root: str) -> bool:
+        """Файл перечитывает родитель: процесс подключается к его новой выкладке, если она появилась."""
+        directory = current_directory(root)
+        if directory == self.shared_directory:
+            return False
+        try:
+            attach(directory)
+            self.shared_directory = directory
+            self.load()
+        except Exception as e:
+            logger.error(f"Ошибка подключения к выкладке {directory}: {e}")
+            return False
+        return True
+
+    async def _watch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_seconds)
+            await loop.run_in_executor(self.executor, self.check_reload)
+
+    # Обработчики
+
+    def _user(self, params: Dict[str, List[str]]) -> Optional[UserContext]:
+        """Контекст пользователя из параметра user (без него — файл операций сервиса)."""
+        user = _one(params, "user")
+        if not user:
+            return None
+        try:
+            return get_manager().context(user)
+        except ValueError as e:
+            raise BadRequest(str(e)) from None
+
+    def _source(self, params: Dict[str, List[str]]) -> Union[str, UserContext]:
+        return self._user(params) or self.data_path
+
+    def home(self, params: Dict[str, List[str]]) -> Response:
+        return _json(main_module.home_page_function(
+            _required(params, "datetime"), user=self._user(params), file_path=self.data_path, **_page_params(params)
+        ))
+
+    def search(self, params: Dict[str, List[str]]) -> Response:
+        return _json(services.simple_search(_required(params, "q"), self._source(params), **_page_params(params)))
+
+    def expenses_by_day_of_week(self, params: Dict[str, List[str]]) -> Response:
+        return _json(reports.get_expenses_by_day_of_week(self._source(params), _required(params, "start_date")))
+
+    def expenses_by_day_of_week_batch(self, params: Dict[str, List[str]]) -> Response:
+        start_dates = params.get("start_date")
+        if not start_dates:
+            raise BadRequest("Не указан параметр start_date")
+        until = _one(params, "until")
+        if until:
+            start_dates = reports.rolling_start_dates(start_dates[0], until, _int(params, "step", 7))
+        results = reports.expenses_by_day_of_week_batch(
+            self._source(params), start_dates, _int(params, "days", reports.REPORT_DAYS)
+        )
+        return 200, NDJSON_TYPE, iter_ndjson(results)
+
+    def health(self, params: Dict[str, List[str]]) -> Response:
+        status = {
+            "status": "ok" if self.version is not None else "loading",
+            "dataset": {
+                "path": self.data_path,
+                "version": self.version,
+                "rows": self.rows,
+                "loaded_at": self.loaded_at,
+                "current": source_version(self.data_path) == self.version,
+            },
+            "users": get_manager().stats(),
+            "workers": self.workers,
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+        return 200, JSON_TYPE, dumps_bytes(status)
+
+    def metrics(self, params: Dict[str, List[str]]) -> Response:
+        lines = [
+            "# HELP server_requests_total Запросы к сервису.",
+            "# TYPE server_requests_total counter",
+            f"server_requests_total {self.requests}",
+            "# HELP server_errors_total Запросы, завершившиеся ошибкой.",
+            "# TYPE server_errors_total counter",
+            f"server_errors_total {self.errors}",
+            "# HELP dataset_rows Строк в загруженных операциях.",
+            "# TYPE dataset_rows gauge",
+            f"dataset_rows {self.rows}",
+        ]
+        return 200, TEXT_TYPE, ("\n".join(lines) + "\n" + tracing.prometheus_text()).encode("utf-8")
+
+    def metrics_json(self, params: Dict[str, List[str]]) -> Response:
+        return 200, JSON_TYPE, dumps_bytes(tracing.json_summary())
+
+    def _count(self, error: bool = False) -> None:
+        with self._counters_lock:
+            if error:
+                self.errors += 1
+            else:
+                self.requests += 1
+
+    def handle(self, method: str, path: str, query: bytes) -> Response:
+        """Выполняет запрос синхронно (в потоке пула)."""
+        handler = self.routes.get(path.rstrip("/") or "/")
+        if handler is None:
+            return 404, JSON_TYPE, dumps_bytes({"error": f"Не найдено: {path}"})
+        if method not in ("GET", "HEAD"):
+            return 405, JSON_TYPE, dumps_bytes({"error": f"Метод не поддерживается: {method}"})
+        self._count()
+        try:
+            return handler(parse_qs(query.decode("utf-8"), keep_blank_values=True))
+        except BadRequest as e:
+            self._count(error=True)
+            return 400, JSON_TYPE, dumps_bytes({"error": str(e)})
+        except Exception as e:
+            self._count(error=True)
+            logger.error(f"Ошибка обработки {path}: {e}")
+            return 500, JSON_TYPE, dumps_bytes({"error": str(e)})
+
+    # ASGI
+
+    async def startup(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.load)
+        except Exception as e:
+            # Сервис поднимается и без данных: /health покажет «loading», watcher повторит попытку
+            logger.error(f"Ошибка загрузки данных {self.data_path}: {e}")
+        await loop.run_in_executor(self.executor, self.refresh_rates)
+        if self.reload_seconds > 0:
+            self._watcher = loop.create_task(self._watch())
+
+    async def shutdown(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        self.executor.shutdown(wait=False)
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await self.startup()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await self.shutdown()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        loop = asyncio.get_running_loop()
+        status, content_type, body = await loop.run_in_executor(
+            self.executor, self.handle, scope["method"], scope["path"], scope.get("query_string", b"")
+        )
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+        if scope["method"] == "HEAD":
+            # Только заголовки: поток не вычисляется
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if isinstance(body, bytes):
+            await send({"type": "http.response.body", "body": body})
+            return
+        # Потоковый ответ: порции кодируются в пуле, в памяти одновременно одна порция
+        chunks = iter(body)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except Exception as e:
+            # Заголовки уже отправлены: ошибка — последней строкой потока, ответ завершается как обычно
+            self._count(error=True)
+            logger.error(f"Ошибка потоковой выдачи {scope['path']}: {e}")
+            await send({"type": "http.response.body", "body": dumps_bytes({"error": str(e)}, pretty=False) + b"\n"})
+            return
+        await send({"type": "http.response.body", "body": b""})
+
+
+def create_app(data_path: Optional[str] = None, **kwargs: Any) -> Service:
+    """
+    ASGI-приложение сервиса (для uvicorn: --factory src.server:create_app).
+    Если задан SHARED_DATASET, процесс подключается к выложенным родителем данным (src.shared_dataset)
+    и следует за их новыми выкладками.
+    """
+    return Service(data_path, shared_root=os.getenv("SHARED_DATASET") or None, **kwargs)
+
+
+def _republish(publisher: SharedPublisher, interval: float, stop: threading.Event) -> None:
+    """Выкладывает данные заново при изменении файла; рабочие процессы подключаются к ним в check_reload."""
+    while not stop.wait(interval):
+        try:
+            publisher.refresh()
+        except Exception as e:
+            logger.error(f"Ошибка повторной выкладки {publisher.file_path}: {e}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервис операций")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data", help="файл или хранилище операций (по умолчанию OPERATIONS_PATH)")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="потоков обработки запросов")
+    parser.add_argument("--reload-seconds", type=float, default=RELOAD_SECONDS, help="0 — не следить за файлом")
+    parser.add_argument("--no-tracing", action="store_true", help="не собирать метрики этапов")
+    parser.add_argument(
+        "--processes", type=int, default=1,
+        help="рабочих процессов; при >1 данные готовятся один раз и делятся через разделяемую память, "
+        "при изменении файла (раз в --reload-seconds) выкладываются заново, процессы переподключаются",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Для запуска сервиса установите uvicorn: pip install uvicorn")
+    tracing.enable(not args.no_tracing)
+    if args.processes > 1:
+        # Процессы uvicorn создают приложение сами, без аргументов: настройки передаются через окружение
+        os.environ["SERVER_WORKERS"] = str(args.workers)
+        os.environ["SERVER_RELOAD_SECONDS"] = str(args.reload_seconds)
+        os.environ["TRACING"] = "0" if args.no_tracing else "1"
+        with SharedPublisher(args.data or operations_store.OPERATIONS_PATH) as publisher:
+            publisher.refresh()
+            os.environ["SHARED_DATASET"] = publisher.root
+            stop = threading.Event()
+            watcher = threading.Thread(target=_republish, args=(publisher, args.reload_seconds, stop), daemon=True)
+            if args.reload_seconds > 0:
+                watcher.start()
+            try:
+                uvicorn.run(
+                    "src.server:create_app", factory=True, host=args.host, port=args.port,
+                    workers=args.processes, log_level="info",
+                )
+            finally:
+                stop.set()
+                if watcher.is_alive():
+                    watcher.join()
+        return
+    app = create_app(args.data, workers=args.workers, reload_seconds=args.reload_seconds)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
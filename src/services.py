@@ -1,18 +1,204 @@
-import json
 import logging
-from typing import Any
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
 
+import numpy as np
 import pandas as pd
 
-logging.basicConfig(level=logging.INFO)
+from src.datasets import UserContext, operations_for, operations_path
+from src.date_index import date_index, to_datetime64
+from src.dtypes import kopecks, with_rubles
+from src.operations_store import OPERATIONS_PATH, frame_memo
+from src.responses import dumps, paginate
+from src.schema import AMOUNT, CASHBACK, CATEGORY, DESCRIPTION, OPERATION_AMOUNT, OPERATION_DATE, STATUS
+from src.sql_store import operations_backend
+from src.tracing import entry_point, stage, traced
+
 logger = logging.getLogger(__name__)
 
+# Номер телефона в описании: +7 921 111-22-33, 8 (921) 111-22-33, 89211112233
+# Номер абонента — 3-2-2 цифры или, только с разделителями, 2-2-2 («+7 921 11-22-33»)
+PHONE_PATTERN = re.compile(
+    r"(?<!\d)(?:\+7|8)[\s(-]*\d{3}[\s)-]*(?:\d{3}[\s-]*\d{2}[\s-]*\d{2}|\d{2}[\s-]+\d{2}[\s-]+\d{2})(?!\d)"
+)
+# Перевод физическому лицу: имя и первая буква фамилии («Иван С.»)
+PERSON_PATTERN = re.compile(r"^[А-ЯЁ][а-яё]+\s[А-ЯЁ]\.$")
+TRANSFERS_CATEGORY = "Переводы"
+# Категории без покупок: за них кэшбэк не начисляется, в выборе категорий повышенного кэшбэка их нет
+NON_PURCHASE_CATEGORIES = frozenset({TRANSFERS_CATEGORY, "Наличные", "Услуги банка", "Финансы", "Пополнения"})
+MONTH_PATTERN = re.compile(r"\d{4}-(?:0[1-9]|1[0-2])")
+# Ячеек матрицы «строки × сценарии» за один шаг: строки обрабатываются частями, чтобы не держать её целиком
+BROADCAST_CELLS = 4_000_000
+
+
+def pattern_mask(values: pd.Series, pattern: re.Pattern) -> np.ndarray:
+    """
+    Маска строк, значение которых содержит совпадение с выражением. Выражение проверяется
+    векторно по словарю уникальных значений (категории или factorize), результат раскладывается по кодам.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    matched = pd.Index(uniques, dtype=object).astype(str).str.contains(pattern, na=False)
+    return np.append(np.asarray(matched, dtype=bool), False)[codes]
+
+
+def phone_positions(df: pd.DataFrame) -> np.ndarray:
+    """Номера строк с телефонным номером в описании; считаются один раз на версию данных."""
+    if DESCRIPTION not in df.columns:
+        raise ValueError(f"Поле {DESCRIPTION} отсутствует в данных")
+    return frame_memo(
+        df, "phone_positions", lambda: np.flatnonzero(pattern_mask(df[DESCRIPTION], PHONE_PATTERN)), columns=(DESCRIPTION,)
+    )
+
+
+def person_transfer_positions(df: pd.DataFrame) -> np.ndarray:
+    """Номера строк переводов физическим лицам; считаются один раз на версию данных."""
+    for column in (CATEGORY, DESCRIPTION):
+        if column not in df.columns:
+            raise ValueError(f"Поле {column} отсутствует в данных")
+
+    def build() -> np.ndarray:
+        transfers = (df[CATEGORY] == TRANSFERS_CATEGORY).to_numpy(dtype=bool, na_value=False)
+        return np.flatnonzero(transfers & pattern_mask(df[DESCRIPTION], PERSON_PATTERN))
+
+    return frame_memo(df, "person_transfer_positions", build, columns=(CATEGORY, DESCRIPTION))
+
+
+class MonthlyExpenses(NamedTuple):
+    """Траты за выбранные месяцы: номера строк, номер месяца каждой строки и сумма траты в копейках."""
+
+    positions: np.ndarray
+    month_codes: np.ndarray
+    months: List[str]
+    amounts: np.ndarray
+
+
+def monthly_expenses(df: pd.DataFrame, months: List[str]) -> MonthlyExpenses:
+    """
+    Успешные траты (списания) за месяцы ГГГГ-ММ: строки окна от первого до последнего месяца
+    берутся из индекса дат, месяц каждой строки находится searchsorted по отсортированным месяцам.
+    """
+    # Полная дата тоже разбирается как месяц — формат проверяется строго
+    invalid = [str(month) for month in months if not isinstance(month, str) or not MONTH_PATTERN.fullmatch(month)]
+    if invalid:
+        raise ValueError(f"Неверный месяц (нужен ГГГГ-ММ): {', '.join(invalid)}")
+    periods = np.unique(np.array([np.datetime64(month, "M") for month in months]))
+    if len(periods) == 0:
+        raise ValueError("Не указаны месяцы")
+    labels = [str(period) for period in periods]
+    if AMOUNT not in df.columns:
+        raise ValueError(f"Поле {AMOUNT} отсутствует в данных")
+
+    index = date_index(df, OPERATION_DATE)
+    end = to_datetime64(periods[-1] + 1) - np.timedelta64(1, "ns")
+    positions = index.positions(to_datetime64(periods[0]), end)
+    row_months = index.dates[positions].astype("datetime64[M]")
+    codes = np.searchsorted(periods, row_months)
+    keep = periods[np.minimum(codes, len(periods) - 1)] == row_months
+
+    amounts = np.abs(kopecks(df[AMOUNT])[positions])
+    keep &= ~np.isnan(amounts)
+    if OPERATION_AMOUNT in df.columns:
+        # Знак берётся из суммы операции: поступления не считаются тратами
+        keep &= kopecks(df[OPERATION_AMOUNT])[positions] < 0
+    if STATUS in df.columns:
+        keep &= (df[STATUS].take(positions) == "OK").to_numpy(dtype=bool, na_value=False)
+    return MonthlyExpenses(positions[keep], codes[keep], labels, amounts[keep].astype(np.int64))
+
+
+def investment_savings(df: pd.DataFrame, months: List[str], limits: List[int]) -> List[dict]:
+    """
+    Сколько отложилось бы в инвесткопилку, если округлять каждую трату вверх до кратного limit рублей:
+    по записи на пару (месяц, лимит). Остатки всех сценариев считаются одной матрицей «траты × лимиты»,
+    суммы по месяцам — одним bincount.
+    """
+    steps = np.array([int(limit) for limit in limits], dtype=np.int64)
+    if len(steps) == 0 or (steps <= 0).any():
+        raise ValueError("Лимиты округления должны быть положительными")
+    expenses = monthly_expenses(df, months)
+    steps_kop = steps * 100
+    n_scenarios = len(steps)
+    totals = np.zeros(len(expenses.months) * n_scenarios)
+    chunk = max(1, BROADCAST_CELLS // n_scenarios)
+    with stage("services.investment_savings") as span:
+        for lo in range(0, len(expenses.amounts), chunk):
+            amounts = expenses.amounts[lo:lo + chunk]
+            # Дополнение до кратного шага: (-сумма) mod шаг
+            savings = np.mod(-amounts[:, None], steps_kop[None, :])
+            cells = expenses.month_codes[lo:lo + chunk, None] * n_scenarios + np.arange(n_scenarios)
+            totals += np.bincount(cells.ravel(), weights=savings.ravel(), minlength=len(totals))
+        span.add(rows=len(expenses.amounts))
+    totals = totals.reshape(len(expenses.months), n_scenarios) / 100
+    return [
+        {"month": month, "limit": int(limit), "savings": round(float(totals[i, j]), 2)}
+        for i, month in enumerate(expenses.months)
+        for j, limit in enumerate(steps)
+    ]
+
+
+def cashback_by_category(
+    df: pd.DataFrame, months: List[str], rate: float = 1.0, top: Optional[int] = None
+) -> Dict[str, List[dict]]:
+    """
+    Категории, выгодные для повышенного кэшбэка: по каждому месяцу — траты категории, начисленный кэшбэк
+    и кэшбэк, который дала бы ставка rate процентов, по убыванию последнего (top — только первые).
+    Категории без покупок (NON_PURCHASE_CATEGORIES) не предлагаются.
+    Все месяцы считаются одним bincount по ячейкам «месяц × категория».
+    """
+    if top is not None and top <= 0:
+        raise ValueError("Число категорий top должно быть положительным")
+    if CATEGORY not in df.columns:
+        raise ValueError(f"Поле {CATEGORY} отсутствует в данных")
+    expenses = monthly_expenses(df, months)
+    values = df[CATEGORY]
+    with stage("services.cashback_by_category") as span:
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, labels = values.cat.codes.to_numpy()[expenses.positions].astype(np.int64), values.cat.categories
+        else:
+            codes, labels = pd.factorize(values.take(expenses.positions))
+            codes = codes.astype(np.int64)
+        n_categories = len(labels) + 1
+        # Пропуск категории (код -1) — отдельная ячейка, в ответ не попадает
+        cells = expenses.month_codes * n_categories + np.where(codes < 0, len(labels), codes)
+        size = len(expenses.months) * n_categories
+        shape = (len(expenses.months), n_categories)
+        spent = np.bincount(cells, weights=expenses.amounts, minlength=size).reshape(shape)
+        cashback = np.nan_to_num(np.abs(kopecks(df[CASHBACK])[expenses.positions])) if CASHBACK in df.columns \
+            else np.zeros(len(cells))
+        earned = np.bincount(cells, weights=cashback, minlength=size).reshape(shape)
+        span.add(rows=len(cells))
+
+    potential = spent * rate / 100
+    purchases = ~pd.Index(labels, dtype=object).isin(NON_PURCHASE_CATEGORIES)
+    result: Dict[str, List[dict]] = {}
+    for i, month in enumerate(expenses.months):
+        present = np.flatnonzero((spent[i, :-1] != 0) & purchases)
+        order = present[np.argsort(-potential[i, present], kind="stable")][:top]
+        result[month] = [
+            {
+                "category": str(labels[j]),
+                "spent": spent[i, j] / 100,
+                "cashback": earned[i, j] / 100,
+                "potential_cashback": round(potential[i, j] / 100, 2),
+            }
+            for j in order
+        ]
+    return result
+
+
+def load_operations_data(file_path: Union[str, UserContext]) -> pd.DataFrame:
+    """Загружает данные из Excel-файла (или выгрузки пользователя) и возвращает DataFrame; суммы — в рублях."""
+    return with_rubles(load_typed_operations_data(file_path))
 
-def load_operations_data(file_path: str) -> pd.DataFrame:
-    """Загружает данные из Excel-файла и возвращает DataFrame."""
-    logger.info(f"Загрузка данных из файла: {file_path}")
+
+@traced("services.load_operations_data")
+def load_typed_operations_data(file_path: Union[str, UserContext]) -> pd.DataFrame:
+    """Загружает данные из Excel-файла (или выгрузки пользователя) в канонической схеме: суммы — в копейках."""
+    logger.info(f"Загрузка данных из файла: {operations_path(file_path)}")
     try:
-        df = pd.read_excel(file_path)
+        df = operations_for(file_path)
         if df.empty:
             raise ValueError("Файл пустой или не содержит данных.")
         logger.info(f"Успешная загрузка. Всего записей: {len(df)}")
@@ -22,38 +208,133 @@ def load_operations_data(file_path: str) -> pd.DataFrame:
         raise
 
 
-def simple_search(query: str, file_path: str) -> str:
-    """Выполняет простой поиск по всем полям файла на соответствие текстовому запросу."""
+@entry_point("services.simple_search")
+def simple_search(
+    query: str,
+    file_path: Union[str, UserContext],
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    count_only: bool = False,
+    cursor: Optional[str] = None,
+) -> str:
+    """
+    Выполняет поиск по всем полям файла на соответствие текстовому запросу.
+    Запрос может содержать условия по полям (см. parse_query): category:Супермаркеты amount>5000
+    date:2024-03..2024-05 card:*7197 — они проверяются по индексам до полнотекстового поиска.
+    Результаты отдаются постранично (limit/offset или cursor) и только с полями fields;
+    при count_only — только число совпадений. Вместо пути можно передать контекст пользователя.
+    """
     logger.info(f"Поисковый запрос: {query}")
     try:
-        query_lower = query.strip().lower()
-        df = load_operations_data(file_path)
-
-        matched = df[
-            df.apply(
-                lambda row: row.astype(str)
-                .str.contains(query_lower, case=False, na=False)
-                .any(),
-                axis=1,
-            )
-        ]
+        # Бэкенд SQLite выполняет запрос целиком в базе; в pandas индексы строятся один раз на версию данных
+        operations = operations_backend(file_path, lambda: load_typed_operations_data(file_path))
+        positions = operations.query_positions(query)
+        logger.info(f"Найдено совпадений: {len(positions)}")
 
-        logger.info(f"Найдено совпадений: {len(matched)}")
+        # В записи превращается только запрошенная страница
+        results, page = operations.page(positions, limit, offset, fields, count_only, cursor)
+        response: dict[str, Any] = {"query": query, "results_count": len(positions), "page": page}
+        if not count_only:
+            response["results"] = results
 
-        response: dict[str, Any] = {
-            "query": query,
-            "results_count": len(matched),
-            "results": matched.to_dict(orient="records"),
-        }
+        return dumps(response)
+
+    except Exception as e:
+        logger.error(f"Ошибка при поиске: {e}")
+        return dumps({"error": str(e)})
 
-        return json.dumps(response, ensure_ascii=False)
 
+def _positions_response(
+    name: str,
+    find: Callable[[pd.DataFrame], np.ndarray],
+    file_path: Union[str, UserContext],
+    limit: Optional[int],
+    offset: int,
+    fields: Optional[List[str]],
+    count_only: bool,
+    cursor: Optional[str],
+) -> str:
+    try:
+        df = load_typed_operations_data(file_path)
+        with stage(f"services.{name}") as span:
+            positions = find(df)
+            span.add(rows=len(positions))
+        logger.info(f"Найдено операций: {len(positions)}")
+        results, page = paginate(df, positions, limit, offset, fields, count_only, cursor)
+        response: dict[str, Any] = {"results_count": len(positions), "page": page}
+        if not count_only:
+            response["results"] = results
+        return dumps(response)
     except Exception as e:
         logger.error(f"Ошибка при поиске: {e}")
-        return json.dumps({"error": str(e)}, ensure_ascii=False)
+        return dumps({"error": str(e)})
+
+
+@entry_point("services.search_phone_numbers")
+def search_phone_numbers(
+    file_path: Union[str, UserContext] = OPERATIONS_PATH,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    count_only: bool = False,
+    cursor: Optional[str] = None,
+) -> str:
+    """Операции, в описании которых есть номер мобильного телефона (постранично, как simple_search)."""
+    logger.info("Поиск операций с телефонными номерами")
+    return _positions_response("phone_positions", phone_positions, file_path, limit, offset, fields, count_only, cursor)
+
+
+@entry_point("services.search_person_transfers")
+def search_person_transfers(
+    file_path: Union[str, UserContext] = OPERATIONS_PATH,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    fields: Optional[List[str]] = None,
+    count_only: bool = False,
+    cursor: Optional[str] = None,
+) -> str:
+    """Переводы физическим лицам: категория «Переводы» и описание вида «Имя Ф.»."""
+    logger.info("Поиск переводов физическим лицам")
+    return _positions_response(
+        "person_transfer_positions", person_transfer_positions, file_path, limit, offset, fields, count_only, cursor
+    )
+
+
+@entry_point("services.investment_bank")
+def investment_bank(
+    months: List[str], limits: List[int], file_path: Union[str, UserContext] = OPERATIONS_PATH
+) -> str:
+    """Инвесткопилка: накопления за каждый месяц при каждом лимите округления — одним ответом."""
+    logger.info(f"Инвесткопилка: месяцы {months}, лимиты {limits}")
+    try:
+        df = load_typed_operations_data(file_path)
+        scenarios = investment_savings(df, months, limits)
+        return dumps({"scenarios": scenarios})
+    except Exception as e:
+        logger.error(f"Ошибка при расчёте инвесткопилки: {e}")
+        return dumps({"error": str(e)})
+
+
+@entry_point("services.cashback_categories")
+def cashback_categories(
+    months: List[str],
+    file_path: Union[str, UserContext] = OPERATIONS_PATH,
+    rate: float = 1.0,
+    top: Optional[int] = None,
+) -> str:
+    """Выгодные категории повышенного кэшбэка по месяцам (см. cashback_by_category)."""
+    logger.info(f"Категории кэшбэка: месяцы {months}, ставка {rate}%")
+    try:
+        df = load_typed_operations_data(file_path)
+        return dumps({"rate": rate, "months": cashback_by_category(df, months, rate, top)})
+    except Exception as e:
+        logger.error(f"Ошибка при расчёте категорий кэшбэка: {e}")
+        return dumps({"error": str(e)})
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     user_query = input("Введите запрос для поиска: ").title()
-    result = simple_search(user_query, "../data/operations.xlsx")
+    result = simple_search(user_query, OPERATIONS_PATH)
     print(result)
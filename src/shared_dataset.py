@@ -0,0 +1,294 @@
+"""
+Общий для процессов набор операций: родительский процесс один раз готовит типизированные столбцы
+и производные структуры (индекс дат, поисковый индекс, суммы в базовой валюте и дневные агрегаты
+по ним) и выкладывает их файлами .npy в разделяемую память (/dev/shm). Рабочие процессы отображают файлы через mmap
+только для чтения: страницы общие для всех процессов, копий данных и повторного разбора нет.
+
+    with publish(OPERATIONS_PATH) as shared:
+        pool = ProcessPoolExecutor(8, initializer=attach, initargs=(shared.directory,))
+
+После attach обычные функции проекта (load_typed_operations, simple_search, отчёты, главная)
+получают общий DataFrame по пути источника.
+
+SharedPublisher выкладывает источник заново при его изменении: каждая версия — в свой подкаталог,
+указатель current переключается атомарно, рабочие процессы подключаются к новой версии сами.
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src import operations_store
+from src.aggregates import CARD_COLUMNS, aggregates_key, daily_aggregates
+from src.date_index import date_index
+from src.fx_rates import revision, with_base_amounts
+from src.operations_store import OPERATIONS_PATH, file_fingerprint, frame_memo, load_typed_operations, source_version
+from src.schema import BASE_AMOUNT, OPERATION_DATE
+from src.search_index import search_index
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# Каталог для выкладки: tmpfs, если он есть (страницы сразу в памяти), иначе временный каталог
+SHARED_DIR = os.getenv("SHARED_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+MANIFEST_FILE = "shared.json"
+# Указатель на подкаталог текущей выкладки в корне SharedPublisher
+CURRENT_FILE = "current"
+
+# Производные структуры, которые выкладываются вместе с таблицей: имя в frame_memo -> построение
+STRUCTURES: Dict[str, Callable[[pd.DataFrame], Any]] = {
+    f"date_index:{OPERATION_DATE}": lambda df: date_index(df, OPERATION_DATE),
+    "search_index": search_index,
+}
+# Структуры таблицы с суммами в базовой валюте (with_base_amounts): по ней считает главная страница
+CONVERTED_STRUCTURES: Dict[str, Callable[[pd.DataFrame], Any]] = {
+    aggregates_key(*CARD_COLUMNS): lambda df: daily_aggregates(df, *CARD_COLUMNS),
+}
+
+
+class _ArrayRef:
+    """Место массива в сохранённом состоянии объекта: имя файла .npy."""
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+
+def _save_array(directory: str, file_name: str, values: np.ndarray) -> _ArrayRef:
+    np.save(os.path.join(directory, file_name), np.ascontiguousarray(values), allow_pickle=False)
+    return _ArrayRef(file_name)
+
+
+def _save_object(directory: str, name: str, obj: Any) -> None:
+    """Сохраняет объект: массивы numpy (и кортежи массивов) — отдельными .npy, остальное — pickle."""
+    state = dict(obj.__getstate__() if hasattr(obj, "__getstate__") else obj.__dict__)
+    for key, value in state.items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            state[key] = _save_array(directory, f"{name}.{key}.npy", value)
+        elif isinstance(value, tuple) and value and all(isinstance(v, np.ndarray) for v in value):
+            state[key] = tuple(_save_array(directory, f"{name}.{key}.{i}.npy", v) for i, v in enumerate(value))
+    with open(os.path.join(directory, f"{name}.pkl"), "wb") as f:
+        pickle.dump((type(obj), state), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_object(directory: str, name: str) -> Any:
+    def resolve(value: Any) -> Any:
+        if isinstance(value, _ArrayRef):
+            return np.load(os.path.join(directory, value.file_name), mmap_mode="r")
+        if isinstance(value, tuple):
+            return tuple(resolve(v) for v in value)
+        return value
+
+    with open(os.path.join(directory, f"{name}.pkl"), "rb") as f:
+        cls, state = pickle.load(f)
+    obj = cls.__new__(cls)
+    obj.__dict__.update({key: resolve(value) for key, value in state.items()})
+    return obj
+
+
+def _save_frame(directory: str, df: pd.DataFrame, prefix: str = "col") -> list:
+    """Столбцы таблицы: массивы значений, коды категорий со словарём, значения и маски целых с пропусками."""
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        column = {"name": str(name), "dtype": str(series.dtype)}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            column["kind"] = "category"
+            column["categories"] = [str(value) for value in series.cat.categories]
+            _save_array(directory, f"{prefix}_{i}.npy", series.array.codes)
+        elif isinstance(series.array, pd.arrays.IntegerArray):
+            column["kind"] = "masked"
+            _save_array(directory, f"{prefix}_{i}.npy", series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0))
+            _save_array(directory, f"{prefix}_{i}.mask.npy", series.isna().to_numpy())
+        elif isinstance(series.dtype, np.dtype) and series.dtype.kind in "biufmM":
+            column["kind"] = "array"
+            _save_array(directory, f"{prefix}_{i}.npy", series.to_numpy())
+        else:
+            raise ValueError(f"Столбец {name} ({series.dtype}) нельзя выложить в разделяемую память")
+        columns.append(column)
+    return columns
+
+
+def _load_frame(directory: str, columns: list, prefix: str = "col") -> pd.DataFrame:
+    """Таблица поверх отображённых файлов; copy=False — столбцы остаются видами на общие страницы."""
+    data = {}
+    for i, column in enumerate(columns):
+        values = np.load(os.path.join(directory, f"{prefix}_{i}.npy"), mmap_mode="r")
+        if column["kind"] == "category":
+            dtype = pd.CategoricalDtype(column["categories"])
+            data[column["name"]] = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+        elif column["kind"] == "masked":
+            mask = np.load(os.path.join(directory, f"{prefix}_{i}.mask.npy"), mmap_mode="r")
+            data[column["name"]] = pd.arrays.IntegerArray(values, mask)
+        else:
+            data[column["name"]] = values
+    return pd.DataFrame(data, columns=[column["name"] for column in columns], copy=False)
+
+
+def _save_structures(directory: str, df: pd.DataFrame, builders: Dict[str, Callable[[pd.DataFrame], Any]], prefix: str) -> list:
+    """Строит структуры таблицы и сохраняет их; не построенная структура пропускается."""
+    structures = []
+    for i, (name, build) in enumerate(builders.items()):
+        try:
+            obj = build(df)
+        except Exception as e:
+            logger.error(f"Структура {name} не выложена: {e}")
+            continue
+        _save_object(directory, f"{prefix}_{i}", obj)
+        structures.append({"name": name, "file": f"{prefix}_{i}"})
+    return structures
+
+
+def _attach_structures(directory: str, df: pd.DataFrame, structures: list) -> None:
+    """Подставляет выложенные структуры в кэш frame_memo таблицы."""
+    for structure in structures:
+        obj = _load_object(directory, structure["file"])
+        frame_memo(df, structure["name"], lambda: obj)
+
+
+class SharedDataset:
+    """Выложенный набор операций; каталог удаляется при close() (или выходе из with)."""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.directory = directory
+        self.manifest = manifest
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory))
+
+    def close(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self) -> "SharedDataset":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def publish(file_path: str = OPERATIONS_PATH, directory: Optional[str] = None) -> SharedDataset:
+    """Готовит таблицу и производные структуры источника и выкладывает их для рабочих процессов."""
+    source = os.path.abspath(file_path)
+    df = load_typed_operations(source)
+    directory = directory or tempfile.mkdtemp(prefix="cours-shared-", dir=SHARED_DIR)
+    os.makedirs(directory, exist_ok=True)
+    with stage("shared.publish") as span:
+        columns = _save_frame(directory, df)
+        structures = _save_structures(directory, df, STRUCTURES, "struct")
+        # Суммы в базовой валюте и агрегаты по ним — с ревизией истории курсов, по которой они посчитаны
+        converted = None
+        frame = with_base_amounts(df)
+        if frame is not df:
+            converted = {
+                "revision": revision(),
+                "columns": _save_frame(directory, frame[[BASE_AMOUNT]], "base"),
+                "structures": _save_structures(directory, frame, CONVERTED_STRUCTURES, "base_struct"),
+            }
+        span.add(rows=len(df))
+    fingerprint = (
+        file_fingerprint(os.path.join(source, operations_store.MANIFEST_FILE)) if os.path.isdir(source)
+        else file_fingerprint(source)
+    )
+    manifest = {
+        "source": source, "fingerprint": fingerprint, "rows": len(df), "columns": columns, "structures": structures,
+        "converted": converted,
+    }
+    # Манифест пишется последним: по нему рабочий процесс понимает, что выкладка завершена
+    tmp_path = os.path.join(directory, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+    shared = SharedDataset(directory, manifest)
+    logger.info(f"Операции выложены в {directory}: {len(df)} строк, {shared.nbytes >> 20} МиБ")
+    return shared
+
+
+class SharedPublisher:
+    """
+    Выкладки источника в подкаталогах root: refresh() публикует новую версию, если источник изменился,
+    и переключает указатель current. Предыдущая выкладка остаётся, пока процессы могут к ней подключаться.
+    """
+
+    def __init__(self, file_path: str = OPERATIONS_PATH, root: Optional[str] = None):
+        self.file_path = os.path.abspath(file_path)
+        self.root = root or tempfile.mkdtemp(prefix="cours-shared-", dir=SHARED_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.version: Optional[str] = None
+        self.generation = 0
+        self._published: List[SharedDataset] = []
+
+    def refresh(self) -> bool:
+        """Выкладывает источник, если он изменился с прошлой выкладки; возвращает, была ли она."""
+        # Версия берётся до загрузки: изменение во время выкладки заметит следующий вызов
+        version = source_version(self.file_path)
+        if version == self.version:
+            return False
+        self.generation += 1
+        name = f"v{self.generation}"
+        shared = publish(self.file_path, os.path.join(self.root, name))
+        tmp_path = os.path.join(self.root, CURRENT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(tmp_path, os.path.join(self.root, CURRENT_FILE))
+        self.version = version
+        self._published.append(shared)
+        # Отображённые страницы переживают удаление файлов, но к прошлой выкладке ещё может идти подключение
+        while len(self._published) > 2:
+            self._published.pop(0).close()
+        return True
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self) -> "SharedPublisher":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def current_directory(directory: str) -> str:
+    """Каталог текущей выкладки: для корня SharedPublisher — по указателю current, иначе сам каталог."""
+    pointer = os.path.join(directory, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return directory
+    with open(pointer, encoding="utf-8") as f:
+        return os.path.join(directory, f.read().strip())
+
+
+def attach(directory: str) -> pd.DataFrame:
+    """
+    Подключает процесс к выложенному набору: таблица и производные структуры отображаются
+    только для чтения и подставляются в кэши хранилища, чтобы load_typed_operations(путь источника)
+    и индексы возвращали общие данные без разбора и копирования.
+    """
+    with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+        manifest = json.load(f)
+    with stage("shared.attach") as span:
+        df = _load_frame(directory, manifest["columns"])
+        # Таблица становится общей до подстановки структур: их метка — метка таблицы хранилища
+        operations_store.remember(manifest["source"], manifest["fingerprint"], df)
+        _attach_structures(directory, df, manifest["structures"])
+        # Пересчёт в базовую валюту годен, пока история курсов не изменилась, иначе он построится заново
+        converted = manifest.get("converted")
+        if converted and converted["revision"] == revision():
+            column = _load_frame(directory, converted["columns"], "base")[BASE_AMOUNT].array
+            _attach_structures(directory, with_base_amounts(df, column=column), converted["structures"])
+        span.add(rows=len(df))
+    logger.info(f"Подключены общие операции {directory}: {len(df)} строк")
+    return df
+
+
+def attach_from_env() -> Optional[pd.DataFrame]:
+    """
+    Подключает набор из каталога в переменной окружения SHARED_DATASET, если она задана
+    (её выставляет родительский процесс перед запуском рабочих); корень SharedPublisher — по указателю.
+    """
+    directory = os.getenv("SHARED_DATASET")
+    return attach(current_directory(directory)) if directory else None
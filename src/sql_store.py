@@ -0,0 +1,737 @@
+"""
+Встроенная SQL-база операций (SQLite) — необязательный бэкенд хранения и запросов.
+
+Включается переменной окружения OPERATIONS_BACKEND=sqlite. Выгрузка один раз на версию источника
+импортируется в файл SQLite рядом с колоночным кэшем; дальше отборы по датам, структурированный поиск,
+отчёты по измерениям и суммы по картам выполняются в базе, а в pandas собираются только
+отобранные строки. Номер строки в базе (pos) совпадает с номером строки таблицы pandas.
+
+Суммы в базовой валюте (BASE_AMOUNT, src.fx_rates) хранятся производным столбцом базы: при пополнении
+истории курсов пересчитывается только он, в копии файла базы. Его видят операции converted().
+
+Вызывающий код не выбирает бэкенд сам: operations_backend возвращает SqlOperations или FrameOperations
+(та же таблица pandas за теми же методами).
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import weakref
+from contextlib import closing
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.aggregates import TOP_K, daily_aggregates
+from src.datasets import UserContext, operations_for, operations_path
+from src.date_index import DateLike, date_index, to_datetime64
+from src.dtypes import display_values, is_money, to_display
+from src.fx_rates import revision, with_base_amounts
+from src.operations_store import (DERIVED_DIR, OPERATIONS_PATH, cache_dir_for,
+                                  load_typed_operations, source_version)
+from src.query import (QUERY_COST, QUERY_FIELDS, amount_bound,
+                       condition_bounds, condition_matcher, date_bound,
+                       parse_query, query_positions)
+from src.report_engine import DAY_NAMES, DIMENSIONS, MEASURES, spending_report
+from src.responses import page_bounds, page_info, paginate
+from src.schema import (AMOUNT, CARD_NUMBER, CASHBACK, CATEGORY, MCC,
+                        OPERATION_CURRENCY, OPERATION_DATE, STATUS)
+from src.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+# Бэкенд хранения операций: pandas (по умолчанию) или sqlite
+BACKEND = os.getenv("OPERATIONS_BACKEND", "pandas").lower()
+# Путь к файлу базы; по умолчанию — рядом с колоночным кэшем выгрузки
+DATABASE_PATH = os.getenv("OPERATIONS_DB")
+DATABASE_FILE = "operations.sqlite"
+SCHEMA_VERSION = 2
+# Строк за один шаг импорта
+IMPORT_CHUNK_ROWS = 50_000
+# Столбцы с индексами в базе
+INDEXED_COLUMNS = (OPERATION_DATE, CARD_NUMBER, CATEGORY)
+# Разделитель ячеек в документе полнотекстового индекса: не встречается в запросах
+CELL_SEPARATOR = "\x1f"
+# Измерения отчёта по значениям столбцов
+COLUMN_DIMENSIONS = {
+    "category": CATEGORY,
+    "card": CARD_NUMBER,
+    "mcc": MCC,
+    "currency": OPERATION_CURRENCY,
+    "status": STATUS,
+}
+
+# Абсолютный путь источника -> открытая база его текущей версии
+_stores: Dict[str, "SqlOperations"] = {}
+_lock = threading.Lock()
+
+
+def _column_kind(series: pd.Series) -> str:
+    if series.dtype.kind == "M":
+        return "date"
+    if is_money(series):
+        return "money"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "category"
+    if series.dtype.kind in "iu" or isinstance(series.array, pd.arrays.IntegerArray):
+        return "int"
+    if series.dtype.kind == "f":
+        return "float"
+    return "text"
+
+
+def _date_unit(values: np.ndarray) -> str:
+    """Самая грубая единица, в которой даты столбца записываются без потерь."""
+    ticks = values[~np.isnat(values)].view(np.int64)
+    for unit, step in (("s", 10**9), ("ms", 10**6), ("us", 10**3)):
+        if not (ticks % step).any():
+            return unit
+    return "ns"
+
+
+def _date_text(values: np.ndarray, unit: Any) -> np.ndarray:
+    """Даты строками ISO «ГГГГ-ММ-ДД ЧЧ:ММ:СС[.доли]»: в таком виде они сравниваются как строки."""
+    text = np.char.replace(np.datetime_as_string(values, unit=unit), "T", " ").astype(object)
+    text[np.isnat(values)] = None
+    return text
+
+
+def _column_values(series: pd.Series, kind: str, unit: Optional[str]) -> list:
+    """Значения столбца для записи в базу (пропуски — None)."""
+    if kind == "date":
+        return _date_text(series.to_numpy(dtype="datetime64[ns]"), unit).tolist()
+    if kind == "category":
+        values = np.array(series.cat.categories.tolist() + [None], dtype=object)
+        return values[series.cat.codes.to_numpy()].tolist()
+    missing = series.isna().to_numpy()
+    values = series.to_numpy(dtype=object, na_value=None).copy()
+    if kind in ("money", "int"):
+        values[~missing] = series[~missing].to_numpy(dtype=np.int64).tolist()
+    values[missing] = None
+    return values.tolist()
+
+
+def _document_parts(series: pd.Series) -> List[str]:
+    """Ячейки столбца в нижнем регистре в том виде, в каком их ищет поисковый индекс; пропуск — пустая строка."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        shown = [str(value).lower().replace("\0", " ") for value in series.cat.categories]
+        return np.array(shown + [""], dtype=object)[series.cat.codes.to_numpy()].tolist()
+    missing = series.isna().to_numpy()
+    shown = display_values(series).tolist()
+    return ["" if skip else str(value).lower().replace("\0", " ") for value, skip in zip(shown, missing)]
+
+
+def database_path(file_path: str) -> str:
+    """Файл базы для источника операций: рядом с колоночным кэшем (у хранилища — среди производных структур)."""
+    if DATABASE_PATH:
+        return DATABASE_PATH
+    file_path = os.path.abspath(file_path)
+    if os.path.isdir(file_path):
+        return os.path.join(file_path, DERIVED_DIR, DATABASE_FILE)
+    return os.path.join(cache_dir_for(file_path), DATABASE_FILE)
+
+
+def _read_meta(db_path: str) -> Optional[dict]:
+    try:
+        connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+        return {key: json.loads(value) for key, value in meta.items()}
+    except sqlite3.Error:
+        return None
+    finally:
+        connection.close()
+
+
+def _converted(file_path: str) -> Tuple[pd.DataFrame, List[str]]:
+    """Таблица источника с суммами в базовой валюте и имена добавленных (производных) столбцов."""
+    df = load_typed_operations(file_path)
+    converted = with_base_amounts(df)
+    return converted, [name for name in converted.columns if name not in df.columns]
+
+
+def _write_meta(connection: sqlite3.Connection, meta: dict) -> None:
+    connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    connection.executemany(
+        "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+        [(key, json.dumps(value, ensure_ascii=False)) for key, value in meta.items()],
+    )
+
+
+def import_operations(file_path: str, db_path: str, version: str, fx: Optional[str] = None) -> dict:
+    """
+    Импортирует операции источника в новый файл базы и атомарно подменяет им db_path.
+    Возвращает метаданные базы: версию источника, ревизию пересчёта в базовую валюту,
+    число строк и описание столбцов.
+    """
+    fx = fx or revision()
+    df, derived = _converted(file_path)
+    columns = []
+    for i, name in enumerate(df.columns):
+        kind = _column_kind(df[name])
+        column: Dict[str, Any] = {"name": str(name), "sql": f"c{i}", "kind": kind, "dtype": str(df[name].dtype)}
+        if kind == "date":
+            column["unit"] = _date_unit(df[name].to_numpy(dtype="datetime64[ns]"))
+        if name in derived:
+            column["derived"] = True
+        columns.append(column)
+    types = {"date": "TEXT", "money": "INTEGER", "int": "INTEGER", "float": "REAL"}
+    meta = {"schema": SCHEMA_VERSION, "source_version": version, "fx": fx, "rows": len(df), "columns": columns}
+    # Производные столбцы в поиск не входят: он ищет по ячейкам выгрузки
+    documented = [column for column in columns if not column.get("derived")]
+
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".sqlite", dir=os.path.dirname(db_path) or ".")
+    os.close(fd)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        definitions = ", ".join(f"{column['sql']} {types.get(column['kind'], 'TEXT')}" for column in columns)
+        connection.execute(f"CREATE TABLE operations (pos INTEGER PRIMARY KEY, {definitions})")
+        # Триграммный индекс ищет подстроки; регистр уже приведён при записи документа
+        connection.execute(
+            "CREATE VIRTUAL TABLE operations_fts USING fts5(doc, tokenize = 'trigram case_sensitive 1')"
+        )
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        with stage("sql_store.import") as span:
+            for start in range(0, len(df), IMPORT_CHUNK_ROWS):
+                chunk = df.iloc[start:start + IMPORT_CHUNK_ROWS]
+                positions = range(start, start + len(chunk))
+                values = [
+                    _column_values(chunk[column["name"]], column["kind"], column.get("unit")) for column in columns
+                ]
+                connection.executemany(f"INSERT INTO operations VALUES ({placeholders})", zip(positions, *values))
+                parts = [_document_parts(chunk[column["name"]]) for column in documented]
+                documents = (CELL_SEPARATOR.join(cells) for cells in zip(*parts))
+                connection.executemany("INSERT INTO operations_fts (rowid, doc) VALUES (?, ?)", zip(positions, documents))
+            span.add(rows=len(df))
+        for column in columns:
+            if column["name"] in INDEXED_COLUMNS:
+                connection.execute(f"CREATE INDEX idx_{column['sql']} ON operations ({column['sql']})")
+        # Статистика индексов: без неё планировщик выбирает индекс категории вместо диапазона дат
+        connection.execute("ANALYZE")
+        _write_meta(connection, meta)
+        connection.commit()
+    except Exception:
+        connection.close()
+        os.remove(tmp_path)
+        raise
+    connection.close()
+    os.replace(tmp_path, db_path)
+    logger.info(f"Операции импортированы в базу {db_path}: {len(df)} строк")
+    return meta
+
+
+def rebase_operations(file_path: str, db_path: str, meta: dict, fx: str) -> dict:
+    """
+    Пересчитывает производные столбцы (суммы в базовой валюте) по новой ревизии истории курсов:
+    база копируется, в копии обновляются только они, затем копия атомарно подменяет db_path.
+    """
+    df, _ = _converted(file_path)
+    derived = [column for column in meta["columns"] if column.get("derived")]
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".sqlite", dir=os.path.dirname(db_path) or ".")
+    os.close(fd)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as source:
+            source.backup(connection)
+        with stage("sql_store.rebase") as span:
+            for column in derived:
+                values = _column_values(df[column["name"]], column["kind"], column.get("unit"))
+                connection.executemany(
+                    f"UPDATE operations SET {column['sql']} = ? WHERE pos = ?", zip(values, range(len(values)))
+                )
+            span.add(rows=len(df))
+        meta = dict(meta, fx=fx)
+        _write_meta(connection, meta)
+        connection.commit()
+    except Exception:
+        connection.close()
+        os.remove(tmp_path)
+        raise
+    connection.close()
+    os.replace(tmp_path, db_path)
+    logger.info(f"Суммы в базовой валюте пересчитаны в базе {db_path}")
+    return meta
+
+
+def _close_connections(connections: List[sqlite3.Connection]) -> None:
+    while connections:
+        connections.pop().close()
+
+
+class _Connections:
+    """
+    Соединения с файлом базы только для чтения: по одному на поток; close закрывает соединения всех потоков.
+    Без close соединения закрываются, когда базу отпустит последний использующий её запрос.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.closed = False
+        weakref.finalize(self, _close_connections, self._connections)
+
+    def get(self) -> sqlite3.Connection:
+        if self.closed:
+            raise RuntimeError(f"База {self.db_path} закрыта")
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            with self._lock:
+                if self.closed:
+                    raise RuntimeError(f"База {self.db_path} закрыта")
+                connection = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+                self._connections.append(connection)
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            _close_connections(self._connections)
+
+
+class SqlOperations:
+    """Операции одной версии источника в базе SQLite: соединение на поток, только чтение."""
+
+    def __init__(self, db_path: str, meta: dict, connections: Optional[_Connections] = None, converted: bool = False):
+        self.db_path = db_path
+        self.meta = meta
+        self.version = meta["source_version"]
+        self.fx = meta.get("fx")
+        self.rows = meta["rows"]
+        self.specs = {column["name"]: column for column in meta["columns"]}
+        # Производные столбцы видны только операциям converted(), как столбцы with_base_amounts
+        self.columns = [column["name"] for column in meta["columns"] if converted or not column.get("derived")]
+        self.connections = connections or _Connections(db_path)
+        self.is_converted = converted
+        self._converted: Optional[SqlOperations] = None
+        # Различные значения столбцов для условий по значениям; данные версии не меняются
+        self._distinct: Dict[str, list] = {}
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.connections.get()
+
+    def converted(self) -> "SqlOperations":
+        """Те же операции со столбцом BASE_AMOUNT — суммами в базовой валюте (как with_base_amounts)."""
+        if self.is_converted:
+            return self
+        if self._converted is None:
+            self._converted = SqlOperations(self.db_path, self.meta, self.connections, converted=True)
+        return self._converted
+
+    def _spec(self, name: str) -> dict:
+        if name not in self.specs:
+            raise ValueError(f"Столбец {name} отсутствует в данных")
+        return self.specs[name]
+
+    def _kopecks(self, name: str) -> str:
+        """Выражение суммы столбца в копейках."""
+        spec = self._spec(name)
+        return spec["sql"] if spec["kind"] == "money" else f"round({spec['sql']} * 100)"
+
+    def _date_bound(self, name: str, value: Optional[np.datetime64], upper: bool) -> Optional[str]:
+        """Граница диапазона дат строкой в единицах столбца (нижняя округляется вверх, верхняя — вниз)."""
+        spec = self._spec(name)
+        if spec["kind"] != "date":
+            raise ValueError(f"Столбец {name} не содержит дат")
+        if value is None:
+            return None
+        exact = np.asarray(value, dtype="datetime64[ns]")
+        rounded = exact.astype(f"datetime64[{spec['unit']}]")
+        if not upper and rounded.astype("datetime64[ns]") < exact:
+            rounded += 1
+        return str(_date_text(np.array([rounded]), spec["unit"])[0])
+
+    def _date_where(self, name: str, lo: Optional[np.datetime64], hi: Optional[np.datetime64]) -> Tuple[List[str], list]:
+        column = self._spec(name)["sql"]
+        where, params = [f"{column} IS NOT NULL"], []
+        for bound, op, upper in ((lo, ">=", False), (hi, "<=", True)):
+            text = self._date_bound(name, bound, upper)
+            if text is not None:
+                where.append(f"{column} {op} ?")
+                params.append(text)
+        return where, params
+
+    def _positions(self, sql: str, params: Sequence[Any] = ()) -> np.ndarray:
+        rows = self.connection.execute(sql, params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def take(self, positions: Union[Sequence[int], np.ndarray], fields: Optional[List[str]] = None) -> pd.DataFrame:
+        """Строки с номерами positions (в их порядке) в типизированном виде, как в таблице pandas."""
+        selected = np.asarray(positions, dtype=np.int64)
+        names = self.columns if fields is None else list(fields)
+        specs = [self._spec(name) for name in names]
+        select = ", ".join(spec["sql"] for spec in specs) or "NULL"
+        with stage("sql_store.take") as span:
+            rows = self.connection.execute(
+                f"SELECT {select} FROM json_each(?) AS p JOIN operations ON operations.pos = p.value ORDER BY p.key",
+                (json.dumps(selected.tolist()),),
+            ).fetchall()
+            span.add(rows=len(rows))
+        values = list(zip(*rows)) if rows else [()] * len(specs)
+        data = {}
+        for spec, values_of_column in zip(specs, values):
+            column = list(values_of_column)
+            kind = spec["kind"]
+            if kind == "date":
+                series = pd.to_datetime(pd.Series(column, dtype=object), format="ISO8601")
+                data[spec["name"]] = series.to_numpy(dtype="datetime64[ns]")
+            elif kind == "category":
+                data[spec["name"]] = pd.Categorical(column)
+            elif kind in ("money", "int"):
+                data[spec["name"]] = pd.array(column, dtype=spec["dtype"])
+            elif kind == "float":
+                data[spec["name"]] = pd.Series(column, dtype=object).astype(spec["dtype"]).to_numpy()
+            else:
+                data[spec["name"]] = pd.array(column, dtype=spec["dtype"])
+        return pd.DataFrame(data, index=selected, columns=names)
+
+    def date_positions(
+        self, start: Optional[DateLike] = None, end: Optional[DateLike] = None, column: str = OPERATION_DATE
+    ) -> np.ndarray:
+        """Номера строк с датой в [start, end] по возрастанию (как DateIndex.positions)."""
+        lo = None if start is None else to_datetime64(start)
+        hi = None if end is None else to_datetime64(end)
+        where, params = self._date_where(column, lo, hi)
+        return self._positions(f"SELECT pos FROM operations WHERE {' AND '.join(where)} ORDER BY pos", params)
+
+    def _distinct_values(self, name: str) -> list:
+        if name not in self._distinct:
+            column = self._spec(name)["sql"]
+            rows = self.connection.execute(f"SELECT DISTINCT {column} FROM operations WHERE {column} IS NOT NULL")
+            self._distinct[name] = [row[0] for row in rows]
+        return self._distinct[name]
+
+    def _condition_where(self, condition: Any) -> Tuple[Optional[str], list]:
+        """Условие структурированного запроса в виде SQL; None — условию не отвечает ни одна строка."""
+        name, kind = QUERY_FIELDS[condition.field]
+        if name not in self.specs:
+            raise ValueError(f"Поле {condition.field} отсутствует в данных")
+        if kind in ("value", "card", "text") and condition.op not in (":", "="):
+            raise ValueError(f"Поле {condition.field} поддерживает только «:»")
+        column = self._spec(name)["sql"]
+
+        if kind == "date":
+            lo, hi = condition_bounds(condition, date_bound)
+            if condition.op == ">":
+                lo += np.timedelta64(1, "ns")
+            elif condition.op == "<":
+                hi -= np.timedelta64(1, "ns")
+            where, params = self._date_where(name, lo, hi)
+            return " AND ".join(where), params
+        if kind in ("value", "card", "text"):
+            # Как и в pandas, проверка выполняется на различных значениях, строки отбираются по индексу
+            match = condition_matcher(condition)
+            values = [value for value in self._distinct_values(name) if match(str(value).lower())]
+            if not values:
+                return None, []
+            return f"{column} IN (SELECT value FROM json_each(?))", [json.dumps(values, ensure_ascii=False)]
+
+        if kind == "amount":
+            lo, hi = condition_bounds(condition, amount_bound)
+            column = self._kopecks(name)
+        else:
+            lo, hi = condition_bounds(condition, lambda v, upper: float(v))
+        where, params = [f"{column} IS NOT NULL"], []
+        if lo is not None:
+            where.append(f"{column} {'>' if condition.op == '>' else '>='} ?")
+            params.append(lo)
+        if hi is not None:
+            where.append(f"{column} {'<' if condition.op == '<' else '<='} ?")
+            params.append(hi)
+        return " AND ".join(where), params
+
+    def query_positions(self, query: str) -> np.ndarray:
+        """Номера строк, удовлетворяющих запросу (см. services.parse_query) — одним запросом к базе."""
+        parsed = parse_query(query)
+        where, params = [], []
+        for condition in sorted(parsed.conditions, key=lambda c: QUERY_COST[QUERY_FIELDS[c.field][1]]):
+            clause, values = self._condition_where(condition)
+            if clause is None:
+                return np.zeros(0, dtype=np.int64)
+            where.append(clause)
+            params.extend(values)
+        if parsed.text and len(parsed.text) >= 3:
+            # Триграммный индекс: фраза в кавычках — поиск подстроки
+            where.append("pos IN (SELECT rowid FROM operations_fts WHERE doc MATCH ?)")
+            params.append('"' + parsed.text.replace('"', '""') + '"')
+        elif parsed.text:
+            # Для одного-двух символов триграмм нет — просмотр документов
+            where.append("pos IN (SELECT rowid FROM operations_fts WHERE instr(doc, ?) > 0)")
+            params.append(parsed.text)
+        elif not parsed.conditions:
+            # Пустой запрос находит строки, где есть хоть одно значение
+            where.append("pos IN (SELECT rowid FROM operations_fts WHERE doc <> '')")
+        with stage("sql_store.query") as span:
+            positions = self._positions(
+                f"SELECT pos FROM operations WHERE {' AND '.join(where) or '1'} ORDER BY pos", params
+            )
+            span.add(rows=len(positions))
+        return positions
+
+    def _dimension(self, name: str, date_column: str) -> Tuple[str, Any]:
+        """SQL-выражение измерения отчёта и преобразование его значений в подписи."""
+        date = self._spec(date_column)["sql"]
+        if name == "day_of_week":
+            # strftime('%w'): 0 — воскресенье
+            return f"CAST(strftime('%w', {date}) AS INTEGER)", lambda value: DAY_NAMES[(value + 6) % 7]
+        if name == "hour":
+            return f"CAST(substr({date}, 12, 2) AS INTEGER)", None
+        if name == "date":
+            return f"substr({date}, 1, 10)", None
+        if name == "month":
+            return f"substr({date}, 1, 7)", None
+        column = COLUMN_DIMENSIONS.get(name, name)
+        if column not in self.specs:
+            raise ValueError(f"Неизвестные измерения или показатели: {name}")
+        return self._spec(column)["sql"], None
+
+    def spending_report(
+        self,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+        dimensions: Sequence[str] = ("day_of_week",),
+        measures: Union[Sequence[str], Mapping[str, str]] = ("sum",),
+        date_column: str = OPERATION_DATE,
+        amount_column: str = AMOUNT,
+        cashback_column: str = CASHBACK,
+    ) -> pd.DataFrame:
+        """Тот же отчёт, что report_engine.spending_report, посчитанный GROUP BY в базе."""
+        if isinstance(measures, Mapping):
+            measures = dict(measures)
+        else:
+            measures = {measure: measure for measure in measures}
+        unknown = [name for name in dimensions if name not in DIMENSIONS and name not in self.specs]
+        unknown += [measure for measure in measures.values() if measure not in MEASURES]
+        if amount_column not in self.specs and {"sum", "mean"} & set(measures.values()):
+            unknown.append(amount_column)
+        if unknown:
+            raise ValueError(f"Неизвестные измерения или показатели: {', '.join(map(str, unknown))}")
+
+        lo = None if start is None else to_datetime64(start)
+        hi = None if end is None else to_datetime64(end)
+        where, params = self._date_where(date_column, lo, hi)
+        keys = [self._dimension(name, date_column) for name in dimensions]
+        amount = self._kopecks(amount_column) if amount_column in self.specs else "NULL"
+        cashback = self._kopecks(cashback_column) if "cashback" in measures.values() else "NULL"
+        select = [expression for expression, _ in keys]
+        select += ["count(*)", f"total({amount})", f"count({amount})", f"total({cashback})"]
+        group = f" GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}" if keys else ""
+        with stage("sql_store.report") as span:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(select)} FROM operations WHERE {' AND '.join(where)}{group}", params
+            ).fetchall()
+            span.add(rows=len(rows))
+        if not keys and rows and rows[0][0] == 0:
+            rows = []
+
+        values = list(zip(*rows)) if rows else [()] * len(select)
+        counts = np.array(values[len(keys)], dtype=np.int64)
+        total = np.array(values[len(keys) + 1], dtype=np.float64) / 100
+        valid = np.array(values[len(keys) + 2], dtype=np.float64)
+        result: Dict[str, np.ndarray] = {}
+        for name, (_, label), keys_of_rows in zip(dimensions, keys, values):
+            labels = list(keys_of_rows) if label is None else [label(value) for value in keys_of_rows]
+            result[name] = np.array(labels + [None], dtype=object)[:-1]
+        for output, measure in measures.items():
+            if measure == "count":
+                result[output] = counts
+            elif measure == "cashback":
+                result[output] = np.array(values[len(keys) + 3], dtype=np.float64) / 100
+            elif measure == "sum":
+                result[output] = total
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result[output] = np.where(valid > 0, total / valid, np.nan)
+        frame = pd.DataFrame(result, columns=list(dimensions) + list(measures))
+        if len(dimensions) and len(frame):
+            frame = frame.sort_values(list(dimensions), kind="stable", na_position="last").reset_index(drop=True)
+        return frame
+
+    def card_window(
+        self,
+        start: DateLike,
+        end: DateLike,
+        amount_column: str = AMOUNT,
+        cashback_column: str = CASHBACK,
+        card_column: str = CARD_NUMBER,
+    ) -> Tuple[List[Dict], np.ndarray]:
+        """Суммы по картам и номера строк топ-K операций за дни [start, end] (как DailyAggregates.window)."""
+        date = self._spec(OPERATION_DATE)["sql"]
+        card = self._spec(card_column)["sql"]
+        amount, cashback = self._kopecks(amount_column), self._kopecks(cashback_column)
+        first = pd.Timestamp(start).date()
+        after = pd.Timestamp(end).date() + pd.Timedelta(days=1)
+        window = f"{date} >= ? AND {date} < ?"
+        params = (first.isoformat(), after.isoformat())
+        with stage("sql_store.card_window"):
+            totals = self.connection.execute(
+                f"SELECT {card}, total({amount}), total({cashback}) FROM operations "
+                f"WHERE {window} AND {card} IS NOT NULL GROUP BY {card}",
+                params,
+            ).fetchall()
+            top = self._positions(
+                f"SELECT pos FROM operations WHERE {window} AND {amount} IS NOT NULL "
+                f"ORDER BY {amount} DESC, pos LIMIT {TOP_K}",
+                params,
+            )
+        card_totals = [
+            {"card": value, "amount": float(amount_sum) / 100, "cashback": float(cashback_sum) / 100}
+            for value, amount_sum, cashback_sum in sorted(totals, key=lambda row: str(row[0]))
+        ]
+        return card_totals, top
+
+    def page(
+        self,
+        positions: Optional[np.ndarray] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        fields: Optional[List[str]] = None,
+        count_only: bool = False,
+        cursor: Optional[str] = None,
+    ) -> Tuple[Optional[pd.DataFrame], dict]:
+        """Страница строк базы, как responses.paginate: из базы читается только сам срез."""
+        total = self.rows if positions is None else len(positions)
+        page = page_info(total, self.columns, limit, offset, fields, cursor)
+        if count_only:
+            return None, page
+        offset, end = page_bounds(page)
+        selected = np.arange(offset, end) if positions is None else positions[offset:end]
+        return to_display(self.take(selected, fields)), page
+
+    def close(self) -> None:
+        """Закрывает соединения всех потоков; после этого база больше не открывается."""
+        self.connections.close()
+
+
+class FrameOperations:
+    """Операции в таблице pandas с методами SqlOperations — бэкенд по умолчанию."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.rows = len(df)
+        self.columns = list(df.columns)
+
+    def converted(self) -> "FrameOperations":
+        """Та же таблица со столбцом BASE_AMOUNT (with_base_amounts)."""
+        return FrameOperations(with_base_amounts(self.df))
+
+    def take(self, positions: Union[Sequence[int], np.ndarray], fields: Optional[List[str]] = None) -> pd.DataFrame:
+        return (self.df if fields is None else self.df[fields]).take(np.asarray(positions, dtype=np.int64))
+
+    def date_positions(
+        self, start: Optional[DateLike] = None, end: Optional[DateLike] = None, column: str = OPERATION_DATE
+    ) -> np.ndarray:
+        return date_index(self.df, column).positions(start, end)
+
+    def query_positions(self, query: str) -> np.ndarray:
+        return query_positions(self.df, query)
+
+    def spending_report(
+        self,
+        start: Optional[DateLike] = None,
+        end: Optional[DateLike] = None,
+        dimensions: Sequence[str] = ("day_of_week",),
+        measures: Union[Sequence[str], Mapping[str, str]] = ("sum",),
+        date_column: str = OPERATION_DATE,
+        amount_column: str = AMOUNT,
+        cashback_column: str = CASHBACK,
+    ) -> pd.DataFrame:
+        return spending_report(self.df, start, end, dimensions, measures, date_column, amount_column, cashback_column)
+
+    def card_window(
+        self,
+        start: DateLike,
+        end: DateLike,
+        amount_column: str = AMOUNT,
+        cashback_column: str = CASHBACK,
+        card_column: str = CARD_NUMBER,
+    ) -> Tuple[List[Dict], np.ndarray]:
+        """Суммы по картам и топ-K операций окна — из дневных агрегатов таблицы."""
+        return daily_aggregates(self.df, amount_column, cashback_column, card_column).window(start, end)
+
+    def page(
+        self,
+        positions: Optional[np.ndarray] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        fields: Optional[List[str]] = None,
+        count_only: bool = False,
+        cursor: Optional[str] = None,
+    ) -> Tuple[Optional[pd.DataFrame], dict]:
+        return paginate(self.df, positions, limit, offset, fields, count_only, cursor)
+
+
+Operations = Union[SqlOperations, FrameOperations]
+
+
+def open_store(file_path: str = OPERATIONS_PATH) -> Optional[SqlOperations]:
+    """
+    База операций текущей версии источника: открывается готовая, при её отсутствии
+    или устаревании источник импортируется заново. None, если источника нет.
+    """
+    abs_path = os.path.abspath(file_path)
+    version = source_version(abs_path)
+    if version is None:
+        return None
+    # Пополнение истории курсов меняет суммы в базовой валюте
+    fx = revision()
+    store = _stores.get(abs_path)
+    if store is not None and store.version == version and store.fx == fx:
+        return store
+    with _lock:
+        store = _stores.get(abs_path)
+        if store is not None and store.version == version and store.fx == fx:
+            return store
+        db_path = database_path(abs_path)
+        meta = _read_meta(db_path) if os.path.exists(db_path) else None
+        if meta is None or meta.get("schema") != SCHEMA_VERSION or meta.get("source_version") != version:
+            meta = import_operations(abs_path, db_path, version, fx)
+        elif meta.get("fx") != fx:
+            meta = rebase_operations(abs_path, db_path, meta, fx)
+        # База прежней версии больше не выдаётся, но не закрывается: её ещё могут читать начатые запросы.
+        # Соединения закроются, когда последний из них её отпустит
+        store = _stores[abs_path] = SqlOperations(db_path, meta)
+        return store
+
+
+def sql_backend(file_path: str = OPERATIONS_PATH) -> Optional[SqlOperations]:
+    """База операций, если включён бэкенд sqlite; иначе None — запросы выполняются в pandas."""
+    if BACKEND != "sqlite":
+        return None
+    return open_store(file_path)
+
+
+def operations_backend(
+    source: Union[str, UserContext], load: Optional[Callable[[], pd.DataFrame]] = None, converted: bool = False
+) -> Operations:
+    """
+    Операции источника (пути или контекста пользователя) за общим интерфейсом: база SQLite,
+    если включён бэкенд sqlite, иначе таблица pandas — её возвращает load (по умолчанию operations_for).
+    converted — со столбцом BASE_AMOUNT (суммы в базовой валюте).
+    """
+    operations: Operations
+    store = sql_backend(operations_path(source))
+    if store is not None:
+        operations = store
+    else:
+        operations = FrameOperations(load() if load is not None else operations_for(source))
+    return operations.converted() if converted else operations
+
+
+def clear_stores() -> None:
+    """Закрывает открытые базы (файлы на диске остаются)."""
+    with _lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
@@ -0,0 +1,255 @@
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Трассировка включается переменной окружения TRACING=1 или вызовом enable()
+ENABLED = os.getenv("TRACING", "").lower() in ("1", "true", "yes")
+# Запросы дольше порога (в секундах) попадают в журнал медленных; доля запросов, снимаемых cProfile
+SLOW_REQUEST_SECONDS = float(os.getenv("TRACING_SLOW_SECONDS", "1.0"))
+PROFILE_SAMPLE_RATE = float(os.getenv("TRACING_PROFILE_RATE", "0"))
+PROFILE_DIR = os.getenv("TRACING_PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".profiles"))
+# Границы корзин гистограммы длительностей, секунды
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_LOG_SIZE = 50
+
+
+class _StageStats:
+    __slots__ = ("count", "total", "max", "rows", "bytes", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.buckets = [0] * len(BUCKETS)
+
+
+_lock = threading.Lock()
+_stats: Dict[str, _StageStats] = {}
+_slow_requests: List[dict] = []
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("tracing_span", default=None)
+
+
+def enable(flag: bool = True) -> None:
+    """Включает или выключает сбор метрик."""
+    global ENABLED
+    ENABLED = flag
+
+
+def reset() -> None:
+    """Сбрасывает накопленные метрики и журнал медленных запросов."""
+    with _lock:
+        _stats.clear()
+        _slow_requests.clear()
+
+
+def _record(name: str, duration: float, rows: int, size: int) -> None:
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = _StageStats()
+        stats.count += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+        stats.rows += rows
+        stats.bytes += size
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                stats.buckets[i] += 1
+                break
+
+
+class Span:
+    """Этап обработки: длительность, число строк и байт; вложенные этапы попадают в дерево запроса."""
+
+    __slots__ = ("name", "rows", "bytes", "started", "duration", "children", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self.children: List["Span"] = []
+        self._token = None
+
+    def add(self, rows: int = 0, size: int = 0) -> None:
+        """Учитывает обработанные строки и байты."""
+        self.rows += rows
+        self.bytes += size
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.duration = time.perf_counter() - self.started
+        _current.reset(self._token)
+        _record(self.name, self.duration, self.rows, self.bytes)
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "seconds": round(self.duration, 6),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _NoopSpan:
+    """Заглушка на время выключенной трассировки: ничего не измеряет и ничего не стоит."""
+
+    __slots__ = ()
+
+    def add(self, rows: int = 0, size: int = 0) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def stage(name: str) -> Any:
+    """Контекстный менеджер этапа: with stage("views.groupby") as span: ...; span.add(rows=n)."""
+    return Span(name) if ENABLED else _NOOP
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Декоратор: вызов функции — этап с её именем (или name)."""
+
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _Request(Span):
+    """Запрос к точке входа: медленные запросы сохраняются с деревом этапов, часть из них — с профилем."""
+
+    __slots__ = ("_profiler",)
+
+    def __enter__(self) -> "Span":
+        self._profiler = None
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # Профилировщик уже работает (вложенный запрос или другой поток)
+                self._profiler = None
+        return super().__enter__()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        super().__exit__(*exc_info)
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.duration < SLOW_REQUEST_SECONDS:
+            return
+        entry = self.to_dict()
+        if self._profiler is not None:
+            entry["profile"] = _save_profile(self._profiler, self.name)
+        logger.warning(f"Медленный запрос {self.name}: {self.duration:.3f} с")
+        with _lock:
+            _slow_requests.append(entry)
+            del _slow_requests[:-SLOW_LOG_SIZE]
+
+
+def _save_profile(profiler: Any, name: str) -> Optional[str]:
+    path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(path)
+        return path
+    except OSError as e:
+        logger.error(f"Ошибка сохранения профиля {path}: {e}")
+        return None
+
+
+def request(name: str) -> Any:
+    """Контекстный менеджер запроса к точке входа (корень дерева этапов)."""
+    return _Request(name) if ENABLED else _NOOP
+
+
+def json_summary() -> dict:
+    """Сводка по этапам и журнал медленных запросов."""
+    with _lock:
+        stages = {
+            name: {
+                "count": stats.count,
+                "total_seconds": round(stats.total, 6),
+                "mean_seconds": round(stats.total / stats.count, 6),
+                "max_seconds": round(stats.max, 6),
+                "rows": stats.rows,
+                "bytes": stats.bytes,
+            }
+            for name, stats in sorted(_stats.items())
+        }
+        return {"enabled": ENABLED, "stages": stages, "slow_requests": list(_slow_requests)}
+
+
+def prometheus_text() -> str:
+    """Метрики в текстовом формате Prometheus."""
+    lines = [
+        "# HELP stage_duration_seconds Длительность этапов обработки.",
+        "# TYPE stage_duration_seconds histogram",
+    ]
+    with _lock:
+        items = sorted(_stats.items())
+        for name, stats in items:
+            cumulative = 0
+            for bound, count in zip(BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(f'stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stats.count}')
+            lines.append(f'stage_duration_seconds_sum{{stage="{name}"}} {stats.total:.6f}')
+            lines.append(f'stage_duration_seconds_count{{stage="{name}"}} {stats.count}')
+        lines += ["# HELP stage_rows_total Обработано строк.", "# TYPE stage_rows_total counter"]
+        lines += [f'stage_rows_total{{stage="{name}"}} {stats.rows}' for name, stats in items]
+        lines += ["# HELP stage_bytes_total Обработано байт.", "# TYPE stage_bytes_total counter"]
+        lines += [f'stage_bytes_total{{stage="{name}"}} {stats.bytes}' for name, stats in items]
+    return "\n".join(lines) + "\n"
+
+
+def entry_point(name: str) -> Callable:
+    """Декоратор точки входа: вызов — запрос с деревом этапов и проверкой на медленность."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Request(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,32 +1,59 @@
+from __future__ import annotations
+
 import json
 import logging
 import os
-import sys
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+
+from src.tracing import stage, traced
 
-import pandas as pd
-import requests
-from dotenv import load_dotenv
+if TYPE_CHECKING:
+    import pandas as pd
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from src.datasets import UserContext
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-API_KEY_CUR_USD = os.getenv("API_KEY_CUR_USD")
-API_KEY_POS = os.getenv("API_KEY_STOCK")
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_SETTINGS_PATH = os.path.join(BASE_DIR, "user_settings.json")
+
+
+@lru_cache(maxsize=None)
+def api_keys() -> Tuple[Optional[str], Optional[str]]:
+    """Читает ключи API из окружения (и .env) при первом обращении."""
+    from dotenv import load_dotenv
 
-try:
-    df = pd.read_excel("data/operations.xlsx")
-    operations_df = df.to_dict(orient="records")
-    logger.info("Файл успешно загружен.")
-except Exception as e:
-    logger.error(f"Ошибка загрузки файла Excel: {e}")
-    operations_df = []
+    load_dotenv()
+    return os.getenv("API_KEY_CUR_USD"), os.getenv("API_KEY_STOCK")
+
+
+@traced("utils.get_operations_df")
+def get_operations_df(file_path: Optional[Union[str, UserContext]] = None) -> pd.DataFrame:
+    """
+    Возвращает DataFrame операций, загружая его из хранилища при первом обращении.
+    Вместо пути можно передать контекст пользователя — тогда таблица берётся из менеджера наборов данных.
+    """
+    from src.datasets import operations_for
+    from src.operations_store import OPERATIONS_PATH
+
+    try:
+        return operations_for(file_path or OPERATIONS_PATH)
+    except Exception as e:
+        logger.error(f"Ошибка загрузки файла Excel: {e}")
+        raise
+
+
+def warm_up(file_path: Optional[str] = None, background: bool = False) -> Optional[threading.Thread]:
+    """Заранее загружает операции, чтобы первый запрос не ждал разбора файла."""
+    if not background:
+        get_operations_df(file_path)
+        return None
+    thread = threading.Thread(target=get_operations_df, args=(file_path,), daemon=True)
+    thread.start()
+    return thread
 
 
 def get_date_range(date: str) -> Tuple[str, str]:
@@ -39,19 +66,27 @@ def get_date_range(date: str) -> Tuple[str, str]:
         raise
 
 
-def filtered_operations(time: str) -> List[Dict]:
+@traced("utils.filtered_operations")
+def filtered_operations(time: str, source: Optional[Union[str, UserContext]] = None) -> List[Dict]:
+    """Операции с начала месяца до даты time: файла по умолчанию, пути source или пользователя source."""
     try:
+        from src.dtypes import to_display
+        from src.operations_store import OPERATIONS_PATH
+        from src.sql_store import operations_backend
+
         start_date_str, end_date_str = get_date_range(time)
-        start_date = pd.to_datetime(start_date_str, dayfirst=True)
-        end_date = pd.to_datetime(end_date_str, dayfirst=True)
-
-        filtered_op = [
-            op
-            for op in operations_df
-            if start_date
-            <= pd.to_datetime(op["Дата операции"], dayfirst=True)
-            <= end_date
-        ]
+        start_date = datetime.strptime(start_date_str, "%d.%m.%Y")
+        end_date = datetime.strptime(end_date_str, "%d.%m.%Y")
+
+        # Суммы в базовой валюте — столбец BASE_AMOUNT, его читают итоги по картам и топ-5
+        operations = operations_backend(source or OPERATIONS_PATH, lambda: get_operations_df(source), converted=True)
+        with stage("utils.filter_by_date") as span:
+            positions = operations.date_positions(start_date, end_date)
+            span.add(rows=operations.rows)
+        selected = operations.take(positions)
+        with stage("utils.to_records") as span:
+            filtered_op = to_display(selected).to_dict(orient="records")
+            span.add(rows=len(filtered_op))
         logger.info(f"Отфильтровано операций: {len(filtered_op)}")
         return filtered_op
     except Exception as e:
@@ -71,11 +106,18 @@ def greetings() -> str:
         return "Доброй ночи"
 
 
+def _amount(op: Dict) -> float:
+    """Сумма операции в базовой валюте, если она посчитана, иначе — как в выгрузке."""
+    from src.schema import AMOUNT, BASE_AMOUNT
+
+    return op[BASE_AMOUNT] if BASE_AMOUNT in op else op.get(AMOUNT, 0)
+
+
 def info_about_operations(operations: List[Dict]) -> Tuple[List, List, List]:
     cards, amounts, cashbacks = [], [], []
     for op in operations:
         cards.append(op.get("Номер карты", "Неизвестно"))
-        amounts.append(op.get("Сумма операции с округлением", 0))
+        amounts.append(_amount(op))
         cashbacks.append(op.get("Кэшбэк", 0))
     return cards, amounts, cashbacks
 
@@ -84,7 +126,7 @@ def top5_tran(operations: List[Dict]) -> List[Dict]:
     try:
         sorted_ops = sorted(
             operations,
-            key=lambda x: x.get("Сумма операции с округлением", 0),
+            key=_amount,
             reverse=True,
         )
         return sorted_ops[:5]
@@ -93,28 +135,33 @@ def top5_tran(operations: List[Dict]) -> List[Dict]:
         return []
 
 
-def currency_rates(user_settings_path: str) -> Tuple[List[Dict], List[Dict]]:
+@traced("utils.currency_rates")
+def currency_rates(user_settings_path: str, settings: Optional[dict] = None) -> Tuple[List[Dict], List[Dict]]:
+    """Курсы валют и цены акций из настроек пользователя (уже загруженных settings или файла)."""
+    from src.market_data import get_client
+
     currency_info, stocks_info = [], []
+    api_key_currency, api_key_stocks = api_keys()
 
     try:
-        with open(user_settings_path, encoding="utf-8") as f:
-            settings = json.load(f)
+        if settings is None:
+            with open(user_settings_path, encoding="utf-8") as f:
+                settings = json.load(f)
 
-        # Курсы валют
         currencies = ",".join(settings.get("user_currencies", []))
-        currency_url = f"http://api.currencylayer.com/live?access_key={API_KEY_CUR_USD}&currencies={currencies}"
-        resp_cur = requests.get(currency_url).json()
+        currency_url = f"http://api.currencylayer.com/live?access_key={api_key_currency}&currencies={currencies}"
+        stocks = ",".join(settings.get("user_stocks", []))
+        stocks_url = f"http://api.marketstack.com/v1/eod/latest?access_key={api_key_stocks}&symbols={stocks}"
+        # Оба API опрашиваются параллельно
+        resp_cur, resp_stocks = get_client().get_many([(currency_url, None), (stocks_url, None)])
 
+        # Курсы валют
         for currency in settings.get("user_currencies", []):
             key = f"{currency}RUB"
             rate = resp_cur.get("quotes", {}).get(key)
             if rate:
                 currency_info.append({"currency": currency, "rate": round(rate, 2)})
 
-        stocks = ",".join(settings.get("user_stocks", []))
-        stocks_url = f"http://api.marketstack.com/v1/eod/latest?access_key={API_KEY_POS}&symbols={stocks}"
-        resp_stocks = requests.get(stocks_url).json()
-
         for stock in resp_stocks.get("data", []):
             stocks_info.append(
                 {"stock": stock["symbol"], "price": float(stock["close"])}
@@ -130,6 +177,11 @@ def currency_rates(user_settings_path: str) -> Tuple[List[Dict], List[Dict]]:
 def sorted_by_month(
     transactions: pd.DataFrame, date: Optional[str] = None
 ) -> pd.DataFrame:
+    import pandas as pd
+
+    from src.date_index import filter_by_date
+    from src.schema import PAYMENT_DATE
+
     try:
         if date is None:
             date = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
@@ -137,15 +189,7 @@ def sorted_by_month(
         end_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S")
         start_date = end_date - timedelta(days=90)
 
-        transactions["Дата платежа"] = pd.to_datetime(
-            transactions["Дата платежа"], errors="coerce", dayfirst=True
-        )
-
-        filtered_df = transactions[
-            (transactions["Дата платежа"] >= start_date)
-            & (transactions["Дата платежа"] <= end_date)
-        ]
-        return filtered_df
+        return filter_by_date(transactions, start_date, end_date, PAYMENT_DATE)
 
     except Exception as e:
         logger.error(f"Ошибка фильтрации по месяцу: {e}")
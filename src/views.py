@@ -1,12 +1,20 @@
+import contextvars
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Optional, Union
 
-import pandas as pd
-import requests
+from src.aggregates import CARD_COLUMNS
+from src.datasets import UserContext, get_manager, operations_path
+from src.dtypes import to_display
+from src.market_data import get_client
+from src.responses import dumps
+from src.schema import AMOUNT, BASE_AMOUNT, OPERATION_DATE
+from src.sql_store import operations_backend
+from src.tracing import entry_point, stage, traced
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def get_greeting():
@@ -32,24 +40,24 @@ def load_user_settings(file_path: str) -> dict:
         logger.error(f"Ошибка при загрузке пользовательских настроек: {err}")
         raise
 
+@traced("views.fetch_currency_rates")
 def fetch_currency_rates(currencies: list) -> list:
     """Получает курсы валют из внешнего API."""
     try:
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD")
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().get("https://api.exchangerate-api.com/v4/latest/USD")
         return [{"currency": currency, "rate": data["rates"].get(currency, "N/A")} for currency in currencies]
     except Exception as err:
         logger.error(f"Ошибка при получении курсов валют: {err}")
         raise
 
+@traced("views.fetch_stock_prices")
 def fetch_stock_prices(stocks: list) -> list:
     """Получает цены на акции из внешнего API."""
     try:
+        # Страницы котировок запрашиваются параллельно
+        get_client().get_many([(f"https://finance.yahoo.com/quote/{stock}", None) for stock in stocks], as_json=False)
         stock_prices = []
         for stock in stocks:
-            response = requests.get(f"https://finance.yahoo.com/quote/{stock}")
-            response.raise_for_status()
             # Здесь нужно добавить парсинг HTML для получения цены акции
             stock_prices.append({"stock": stock, "price": "N/A"})  # Замените на реальное значение
         return stock_prices
@@ -57,36 +65,57 @@ def fetch_stock_prices(stocks: list) -> list:
         logger.error(f"Ошибка при получении цен на акции: {err}")
         raise
 
-def process_operations_data(file_path: str, start_date: str, end_date: str) -> dict:
-    """Обрабатывает данные из файла операций."""
+@traced("views.process_operations_data")
+def process_operations_data(file_path: Union[str, UserContext], start_date: str, end_date: str) -> dict:
+    """Обрабатывает данные из файла операций (или выгрузки пользователя)."""
     try:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"Файл {file_path} не найден.")
-        df = pd.read_excel(file_path)
-        df["Дата операции"] = pd.to_datetime(df["Дата операции"])
-        mask = (df["Дата операции"] >= start_date) & (df["Дата операции"] <= end_date)
-        filtered_df = df.loc[mask]
-
-        # Группировка по картам
-        card_data = (
-            filtered_df.groupby("Номер карты")
-            .agg({"Сумма": "sum", "Кешбэк": "sum"})
-            .reset_index()
+        path = operations_path(file_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл {path} не найден.")
+        # Суммы в валюте операции пересчитываются в базовую валюту (столбец BASE_AMOUNT)
+        operations = operations_backend(file_path, converted=True)
+        columns = operations.columns
+        # Агрегаты по CARD_COLUMNS выкладываются в разделяемую память вместе с таблицей (shared_dataset)
+        amount_column, cashback_column, card_column = CARD_COLUMNS
+        # В старых выгрузках суммы лежат в столбцах «Сумма» и «Кешбэк»
+        if "Сумма" in columns:
+            amount_column = "Сумма"
+        elif amount_column not in columns:
+            amount_column = AMOUNT
+        if "Кешбэк" in columns:
+            cashback_column = "Кешбэк"
+
+        # Суммы по картам и топ-5 транзакций: дневные агрегаты таблицы или запросы к базе SQLite
+        with stage("views.daily_aggregates") as span:
+            card_totals, top_rows = operations.card_window(
+                start_date, end_date, amount_column, cashback_column, card_column
+            )
+            span.add(rows=operations.rows)
+        top = operations.take(top_rows)
+        top_dates = top[OPERATION_DATE].to_numpy()
+        card_data = [
+            {"Номер карты": card["card"], "Сумма": card["amount"], "Кешбэк": card["cashback"]}
+            for card in card_totals
+        ]
+        top_transactions = (
+            to_display(top)
+            .assign(**{OPERATION_DATE: top_dates})
+            .rename(columns={
+                BASE_AMOUNT if BASE_AMOUNT in top.columns else amount_column: "Сумма", cashback_column: "Кешбэк",
+            })
         )
 
-        # Топ-5 транзакций по сумме платежа
-        top_transactions = filtered_df.nlargest(5, "Сумма")
-
         return {
-            "card_data": card_data.to_dict(orient="records"),
+            "card_data": card_data,
             "top_transactions": top_transactions.to_dict(orient="records"),
         }
     except Exception as err:
         logger.error(f"Ошибка при обработке данных операций: {err}")
         raise
 
-def home_page_function(datetime_str: str) -> str:
-    """Основная функция для страницы «Главная»"""
+@entry_point("views.home_page")
+def home_page_function(datetime_str: str, user: Optional[Union[str, UserContext]] = None) -> str:
+    """Основная функция для страницы «Главная»; user — идентификатор или контекст пользователя."""
     try:
         dt = datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S")
         start_date = dt.replace(day=1).strftime("%Y-%m-%d")
@@ -97,12 +126,24 @@ def home_page_function(datetime_str: str) -> str:
         user_settings_path = os.path.join(base_dir, "user_settings.json")
         operations_data_path = os.path.join(base_dir, "data", "operations.xlsx")
 
-        user_settings = load_user_settings(user_settings_path)
-        currency_rates = fetch_currency_rates(user_settings["user_currencies"])
-        stock_prices = fetch_stock_prices(user_settings["user_stocks"])
-        operations_data = process_operations_data(
-            operations_data_path, start_date, end_date
-        )
+        source: Union[str, UserContext] = operations_data_path
+        if user is not None:
+            dataset = get_manager().get(user)
+            source, user_settings = dataset.context, dataset.settings
+        else:
+            user_settings = load_user_settings(user_settings_path)
+        # Внешние API опрашиваются параллельно, пока обрабатываются операции;
+        # задачи выполняются в копии контекста, чтобы их этапы попали в дерево трассировки запроса
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            currency_future = pool.submit(
+                contextvars.copy_context().run, fetch_currency_rates, user_settings["user_currencies"]
+            )
+            stock_future = pool.submit(contextvars.copy_context().run, fetch_stock_prices, user_settings["user_stocks"])
+            operations_data = process_operations_data(
+                source, start_date, end_date
+            )
+            currency_rates = currency_future.result()
+            stock_prices = stock_future.result()
 
         # Преобразование данных о картах
         cards = [
@@ -137,7 +178,7 @@ def home_page_function(datetime_str: str) -> str:
             "timestamp": datetime.now().isoformat(),
         }
 
-        return json.dumps(response, ensure_ascii=False, indent=2)
+        return dumps(response)
 
     except Exception as e:
         error_response = {
@@ -145,9 +186,10 @@ def home_page_function(datetime_str: str) -> str:
             "message": str(e),
             "timestamp": datetime.now().isoformat(),
         }
-        return json.dumps(error_response, ensure_ascii=False, indent=2)
+        return dumps(error_response)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_datetime = "2025-04-09 14:30:00"
     result = home_page_function(test_datetime)
     print(result)
@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.aggregates import DailyAggregates, daily_aggregates
+
+OPERATIONS = pd.DataFrame(
+    {
+        "Дата операции": [
+            "01.10.2023 12:00:00",
+            "01.10.2023 18:00:00",
+            "02.10.2023 10:00:00",
+            "15.10.2023 09:30:00",
+            "15.10.2023 09:40:00",
+            "01.11.2023 08:00:00",
+        ],
+        "Номер карты": ["*7197", "*5091", "*7197", None, "*5091", "*5091"],
+        "Сумма": [100.0, 300.0, 300.0, 50.0, np.nan, 1000.0],
+        "Кешбэк": [1.0, np.nan, 3.0, 0.0, 2.0, 10.0],
+    }
+)
+
+
+def build(df, first_row=0):
+    return DailyAggregates.build(df, "Сумма", "Кешбэк", "Номер карты", first_row)
+
+
+def test_window_matches_groupby():
+    cards, top = build(OPERATIONS).window("2023-10-01", "2023-10-15")
+
+    assert cards == [
+        {"card": "*5091", "amount": 300.0, "cashback": 2.0},
+        {"card": "*7197", "amount": 400.0, "cashback": 4.0},
+    ]
+    # При равных суммах первой идёт более ранняя строка, как в nlargest
+    assert top.tolist() == [1, 2, 0, 3]
+
+
+def test_window_without_operations():
+    cards, top = build(OPERATIONS).window("2023-09-01", "2023-09-30")
+    assert cards == [] and top.tolist() == []
+
+
+def test_extend_equals_full_build():
+    extended = build(OPERATIONS.iloc[:3]).extend(OPERATIONS.iloc[3:], 3)
+    full = build(OPERATIONS)
+
+    for start, end in [("2023-10-01", "2023-10-31"), ("2023-10-01", "2023-11-30"), ("2023-10-02", "2023-10-02")]:
+        assert extended.window(start, end)[0] == full.window(start, end)[0]
+        assert extended.window(start, end)[1].tolist() == full.window(start, end)[1].tolist()
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "aggregates.npz")
+    build(OPERATIONS).save(path)
+    loaded = DailyAggregates.load(path)
+
+    assert loaded.window("2023-10-01", "2023-11-30")[0] == build(OPERATIONS).window("2023-10-01", "2023-11-30")[0]
+
+
+def test_concurrent_saves_leave_one_complete_file(tmp_path):
+    path = str(tmp_path / "aggregates.npz")
+    aggregates = build(OPERATIONS)
+    # Каждый процесс пишет свой временный файл: одновременные сохранения не портят чужой
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: aggregates.save(path), range(32)))
+
+    assert os.listdir(tmp_path) == ["aggregates.npz"]
+    assert DailyAggregates.load(path).window("2023-10-01", "2023-11-30")[0] == aggregates.window("2023-10-01", "2023-11-30")[0]
+
+
+def test_daily_aggregates_built_once_per_frame():
+    first = daily_aggregates(OPERATIONS, "Сумма", "Кешбэк", "Номер карты")
+    assert daily_aggregates(OPERATIONS, "Сумма", "Кешбэк", "Номер карты") is first
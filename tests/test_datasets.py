@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src import datasets, operations_store
+from src.datasets import DatasetManager, UserContext, frame_bytes
+from src.date_index import date_index
+from src.fx_rates import with_base_amounts
+from src.main import home_page_function
+from src.search_index import search_index
+from src.reports import get_expenses_by_day_of_week
+from src.services import simple_search
+
+
+@pytest.fixture
+def users(tmp_path):
+    registry = {}
+    for i, user_id in enumerate(["anna", "boris", "vera"]):
+        user_dir = tmp_path / user_id
+        user_dir.mkdir()
+        path = write_operations(str(user_dir / "operations.csv"), 400 + 100 * i, seed=i, end="2021-12-31")
+        (user_dir / "user_settings.json").write_text(
+            json.dumps({"user_currencies": ["USD"], "user_stocks": [f"S{i}"]}), encoding="utf-8"
+        )
+        registry[user_id] = {"operations": path, "settings": str(user_dir / "user_settings.json")}
+    yield registry
+    operations_store.clear_memory_cache()
+    datasets.set_manager(None)
+
+
+def test_context_from_registry_and_directory(tmp_path, users):
+    (tmp_path / "gleb").mkdir()
+    manager = DatasetManager({"anna": users["anna"]}, users_dir=str(tmp_path))
+    assert manager.context("anna").operations_path == users["anna"]["operations"]
+    assert manager.context("gleb") == UserContext(
+        "gleb", str(tmp_path / "gleb" / "operations.xlsx"), str(tmp_path / "gleb" / "user_settings.json")
+    )
+    for user_id in ["nobody", "../anna", ""]:
+        with pytest.raises(ValueError):
+            manager.context(user_id)
+
+
+def test_lru_eviction_within_budget(users):
+    sizes = {
+        user_id: frame_bytes(operations_store.load_typed_operations(entry["operations"])) for user_id, entry in users.items()
+    }
+    operations_store.clear_memory_cache()
+    manager = DatasetManager(users, memory_budget=sizes["boris"] + sizes["vera"])
+
+    manager.get("anna")
+    manager.get("boris")
+    # anna использована последней — вытесняется boris
+    assert manager.get("anna").settings["user_stocks"] == ["S0"]
+    manager.get("vera")
+    stats = manager.stats()
+    assert stats["users"] == ["anna", "vera"]
+    assert stats["memory_bytes"] <= stats["memory_budget"]
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1
+    # Вытесненная таблица не остаётся и в памяти хранилища операций
+    assert operations_store.source_of(manager.get("vera").operations) is not None
+    assert all(path != users["boris"]["operations"] for path in operations_store._loaded)
+
+
+def test_eviction_keeps_source_shared_with_other_user_and_running_requests(users):
+    users = dict(users, olga=dict(users["anna"]))
+    manager = DatasetManager(users)
+    held = manager.get("anna").operations
+    assert manager.get("olga").operations is held
+
+    # Источник anna нужен olga — таблица остаётся в хранилище
+    manager.evict("anna")
+    assert operations_store.load_typed_operations(users["anna"]["operations"]) is held
+    # Без пользователей таблица больше не выдаётся, но у начатого запроса остаётся таблицей хранилища
+    manager.evict("olga")
+    assert users["anna"]["operations"] not in operations_store._loaded
+    assert operations_store.source_of(held) == users["anna"]["operations"]
+
+
+def test_memory_includes_structures_built_for_table(users):
+    manager = DatasetManager(users)
+    operations = manager.get("anna").operations
+    table = manager.memory_used
+    assert table == frame_bytes(operations)
+
+    date_index(operations).positions("2021-01-01", "2021-06-30")
+    search_index(operations).search("магнит")
+    with_base_amounts(operations)
+    grown = manager.memory_used
+    assert grown > table
+    assert manager.stats()["memory_bytes"] == grown
+    # Пока новых структур нет, объём берётся из кэша, без обхода построенных структур
+    with patch.object(datasets, "memory_bytes", side_effect=AssertionError("объём пересчитан")):
+        assert manager.memory_used == grown
+
+
+def test_concurrent_first_requests_share_one_load(users):
+    manager = DatasetManager(users)
+    calls = []
+
+    def slow_load(path):
+        calls.append(path)
+        time.sleep(0.2)
+        return pd.DataFrame({"a": [1]})
+
+    results = []
+    with patch.object(datasets, "load_typed_operations", side_effect=slow_load):
+        threads = [threading.Thread(target=lambda: results.append(manager.get("anna"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(calls) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+
+
+def test_failed_load_is_not_cached(users):
+    manager = DatasetManager(users)
+    with patch.object(datasets, "load_typed_operations", side_effect=OSError("нет файла")):
+        with pytest.raises(OSError):
+            manager.get("anna")
+    assert len(manager.get("anna").operations) == 400
+
+
+def test_entry_points_accept_user_context(users):
+    manager = DatasetManager(users)
+    datasets.set_manager(manager)
+    anna, vera = manager.context("anna"), manager.context("vera")
+
+    assert json.loads(simple_search("магнит", anna, count_only=True)) == \
+        json.loads(simple_search("магнит", users["anna"]["operations"], count_only=True))
+    assert json.loads(simple_search("", vera, count_only=True))["results_count"] == 600
+    assert get_expenses_by_day_of_week.__wrapped__(vera, "2021-10-01") == \
+        get_expenses_by_day_of_week.__wrapped__(users["vera"]["operations"], "2021-10-01")
+
+    with patch("src.main.currency_rates", return_value=([], [])) as rates:
+        home = json.loads(home_page_function("2021-12-31 12:00:00", count_only=True, user="vera"))
+    assert home["data"]["operations_page"]["total"] == 600
+    assert rates.call_args.args[1]["user_stocks"] == ["S2"]
@@ -0,0 +1,71 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from src.date_index import DateIndex, date_index, filter_by_date, parse_dates
+from src.operations_store import frame_changed
+from src.schema import OPERATION_DATE, PAYMENT_DATE
+
+
+def test_parse_dates_explicit_format_and_fallback():
+    values = pd.Series(["31.12.2021 16:44:00", "2025-04-01", None, "мусор"])
+    parsed = parse_dates(values, "%d.%m.%Y %H:%M:%S")
+
+    assert parsed[0] == np.datetime64("2021-12-31T16:44:00")
+    assert parsed[1] == np.datetime64("2025-04-01")
+    assert np.isnat(parsed[2]) and np.isnat(parsed[3])
+
+
+def test_date_index_positions():
+    dates = np.array(["2023-10-20", "2023-10-01", "NaT", "2023-10-15"], dtype="datetime64[ns]")
+    index = DateIndex(dates)
+
+    assert index.positions("2023-10-01", "2023-10-15").tolist() == [1, 3]
+    assert index.positions("2023-10-01", "2023-10-15", keep_order=False).tolist() == [1, 3]
+    assert index.positions(start="2023-10-16").tolist() == [0]
+    assert index.positions(end="2023-09-30").tolist() == []
+    assert index.positions().tolist() == [0, 1, 3]
+
+
+def test_date_index_built_once_per_frame():
+    df = pd.DataFrame({OPERATION_DATE: ["01.10.2023 10:00:00", "15.10.2023 12:00:00"]})
+    assert date_index(df) is date_index(df)
+
+
+def test_date_index_rebuilt_after_frame_changed_in_place():
+    df = pd.DataFrame({OPERATION_DATE: ["01.10.2023 10:00:00", "15.10.2023 12:00:00"], "Сумма": [1, 2]})
+    assert date_index(df).positions("2023-10-10").tolist() == [1]
+
+    df.loc[0, OPERATION_DATE] = "20.10.2023 10:00:00"
+    frame_changed(df, [OPERATION_DATE])
+    assert date_index(df).positions("2023-10-10").tolist() == [0, 1]
+    # Изменение других столбцов индекс не затрагивает
+    index = date_index(df)
+    df.loc[0, "Сумма"] = 5
+    frame_changed(df, ["Сумма"])
+    assert date_index(df) is index
+    frame_changed(df)
+    assert date_index(df) is not index
+
+
+def test_memo_lookup_does_not_scan_foreign_frame():
+    df = pd.DataFrame({OPERATION_DATE: ["01.10.2023 10:00:00", "15.10.2023 12:00:00"]})
+    index = date_index(df)
+    with patch("pandas.util.hash_pandas_object", side_effect=AssertionError("таблица просмотрена")):
+        assert date_index(df) is index
+
+
+def test_filter_by_date_does_not_modify_source():
+    df = pd.DataFrame(
+        {
+            PAYMENT_DATE: ["01.10.2023", "15.10.2023", "20.10.2023"],
+            "Сумма": [1, 2, 3],
+        }
+    )
+    result = filter_by_date(df, datetime(2023, 10, 1), datetime(2023, 10, 15), PAYMENT_DATE)
+
+    assert result["Сумма"].tolist() == [1, 2]
+    assert result[PAYMENT_DATE].dtype.kind == "M"
+    assert df[PAYMENT_DATE].tolist() == ["01.10.2023", "15.10.2023", "20.10.2023"]
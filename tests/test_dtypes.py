@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from src.dtypes import apply_schema, concat_typed, kopecks, rubles, to_display
+from src.operations_store import read_cache, write_cache, _read_meta
+
+RAW = pd.DataFrame(
+    {
+        "Дата операции": ["31.12.2021 16:44:00", "30.12.2021 10:00:00", None],
+        "Номер карты": ["*7197", None, "*7197"],
+        "Сумма операции с округлением": [0.1, 0.2, 160.89],
+        "Кэшбэк": [None, 1.5, None],
+        "MCC": [5411.0, None, 5814.0],
+        "Описание": ["Колхоз", "Магнит", "Колхоз"],
+    }
+)
+
+
+def test_apply_schema_types():
+    typed = apply_schema(RAW)
+
+    assert typed["Дата операции"].dtype.kind == "M"
+    assert isinstance(typed["Номер карты"].dtype, pd.CategoricalDtype)
+    assert str(typed["Сумма операции с округлением"].dtype) == "Int64"
+    assert typed["Сумма операции с округлением"].tolist() == [10, 20, 16089]
+    assert typed["Кэшбэк"].isna().tolist() == [True, False, True]
+    assert str(typed["MCC"].dtype) == "Int16"
+    # Исходная таблица не меняется, повторное приведение ничего не делает
+    assert RAW["Сумма операции с округлением"].dtype == np.float64
+    pd.testing.assert_frame_equal(apply_schema(typed), typed)
+
+
+def test_kopecks_give_exact_sums():
+    typed = apply_schema(RAW)
+
+    assert kopecks(typed["Сумма операции с округлением"])[:2].sum() / 100 == 0.3
+    assert np.array_equal(kopecks(RAW["Сумма операции с округлением"]), kopecks(typed["Сумма операции с округлением"]))
+    assert rubles(typed["Кэшбэк"])[1] == 1.5
+
+
+def test_to_display_restores_export_representation():
+    shown = to_display(apply_schema(RAW))
+
+    assert shown["Дата операции"].tolist()[:2] == ["31.12.2021 16:44:00", "30.12.2021 10:00:00"]
+    assert shown["Сумма операции с округлением"].tolist() == [0.1, 0.2, 160.89]
+    assert shown["Номер карты"].tolist()[0] == "*7197"
+
+
+def test_concat_typed_and_cache_keep_categories(tmp_path):
+    first, second = apply_schema(RAW.iloc[:2]), apply_schema(RAW.iloc[2:].assign(Описание="Дикси"))
+    combined = concat_typed([first, second])
+
+    assert isinstance(combined["Описание"].dtype, pd.CategoricalDtype)
+    assert combined["Описание"].tolist() == ["Колхоз", "Магнит", "Дикси"]
+
+    write_cache(str(tmp_path), combined, {})
+    restored = read_cache(str(tmp_path), _read_meta(str(tmp_path)))
+    pd.testing.assert_frame_equal(restored, combined, check_categorical=False)
+    assert str(restored["Кэшбэк"].dtype) == "Int64"
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from benchmarks.synthetic import generate_operations
+from src import export
+from src.dtypes import apply_schema, to_display
+from src.export import export_frame, export_report
+from src.schema import CATEGORY, OPERATION_AMOUNT, OPERATION_DATE, PAYMENT_DATE
+
+
+@pytest.fixture
+def operations():
+    df = apply_schema(generate_operations(500, seed=5))
+    # Значение, требующее экранирования в XML
+    return df.assign(**{CATEGORY: df[CATEGORY].cat.add_categories(["<Кафе & бары>"])})
+
+
+def test_xlsx_has_typed_cells_and_formats(tmp_path, operations):
+    path = str(tmp_path / "operations.xlsx")
+    df = operations.copy()
+    df.loc[0, CATEGORY] = "<Кафе & бары>"
+    assert export_frame(df, path, chunk_rows=128) == 500
+
+    sheet = load_workbook(path, read_only=True).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == list(df.columns)
+    assert len(rows) == 501
+
+    first = dict(zip(rows[0], rows[1]))
+    expected = to_display(df.iloc[:1]).iloc[0]
+    assert first[OPERATION_DATE] == datetime.strptime(expected[OPERATION_DATE], "%d.%m.%Y %H:%M:%S")
+    assert first[PAYMENT_DATE] == datetime.strptime(expected[PAYMENT_DATE], "%d.%m.%Y")
+    assert first[OPERATION_AMOUNT] == expected[OPERATION_AMOUNT]
+    assert first[CATEGORY] == "<Кафе & бары>"
+
+    cells = next(load_workbook(path).active.iter_rows(min_row=2, max_row=2))
+    formats = {name: cell.number_format for name, cell in zip(df.columns, cells)}
+    assert formats[OPERATION_DATE] == "dd.mm.yyyy hh:mm:ss"
+    assert formats[PAYMENT_DATE] == "dd.mm.yyyy"
+    assert formats[OPERATION_AMOUNT] == "#,##0.00"
+
+
+def test_xlsx_continues_on_next_sheet_and_respects_positions(tmp_path, operations):
+    path = str(tmp_path / "operations.xlsx")
+    positions = list(range(0, 500, 2))
+    with patch.object(export, "XLSX_SHEET_ROWS", 100):
+        assert export_frame(operations, path, positions, chunk_rows=64) == 250
+
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ["Операции", "Операции 2", "Операции 3"]
+    descriptions = [
+        row[11] for sheet in workbook.worksheets for row in list(sheet.iter_rows(values_only=True))[1:]
+    ]
+    assert descriptions == to_display(operations.take(positions))["Описание"].tolist()
+
+
+def test_csv_matches_display_values(tmp_path, operations):
+    path = str(tmp_path / "operations.csv")
+    export_frame(operations, path, chunk_rows=200)
+    back = pd.read_csv(path, encoding="utf-8-sig")
+    expected = to_display(operations).reset_index(drop=True)
+    assert back[OPERATION_DATE].tolist() == expected[OPERATION_DATE].tolist()
+    assert back[OPERATION_AMOUNT].tolist() == expected[OPERATION_AMOUNT].tolist()
+
+
+def test_parquet_keeps_types(tmp_path, operations):
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / "operations.parquet")
+    export_frame(operations, path, chunk_rows=200)
+    back = pd.read_parquet(path)
+    assert back[OPERATION_DATE].dtype.kind == "M"
+    assert back[OPERATION_AMOUNT].tolist() == to_display(operations)[OPERATION_AMOUNT].tolist()
+
+
+def test_export_report(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    report = '[{"day_of_week": "Friday", "amount": 1234.5}, {"day_of_week": "Monday", "amount": 10.0}]'
+    assert export_report(report, path) == 2
+    sheet = load_workbook(path, read_only=True)["Отчет"]
+    assert list(sheet.iter_rows(values_only=True)) == [("day_of_week", "amount"), ("Friday", 1234.5), ("Monday", 10)]
+
+    with pytest.raises(ValueError):
+        export_report('{"error": "Нет данных для выбранного периода."}', path)
+    with pytest.raises(ValueError):
+        export_frame(pd.DataFrame(), str(tmp_path / "report.txt"))
+
+
+def test_xlsx_money_format_only_for_money_columns(tmp_path):
+    path = str(tmp_path / "report.xlsx")
+    frame = pd.DataFrame({OPERATION_AMOUNT: [-1234.5], "share": [0.25]})
+    export_frame(frame, path)
+
+    cells = next(load_workbook(path).active.iter_rows(min_row=2, max_row=2))
+    assert [cell.number_format for cell in cells] == ["#,##0.00", "General"]
+
+
+@pytest.mark.parametrize("name", ["operations.xlsx", "operations.csv"])
+def test_failed_export_leaves_no_temporary_file(tmp_path, operations, name):
+    path = tmp_path / name
+    path.write_text("прежняя выгрузка", encoding="utf-8")
+
+    with patch.object(export, "_chunks", side_effect=OSError("диск заполнен")):
+        with pytest.raises(OSError):
+            export_frame(operations, str(path))
+    assert os.listdir(tmp_path) == [name]
+    assert path.read_text(encoding="utf-8") == "прежняя выгрузка"
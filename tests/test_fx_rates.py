@@ -0,0 +1,200 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src import fx_rates, market_data, operations_store
+from src.dtypes import apply_schema, kopecks
+from src.fx_rates import RateStore, base_amounts, import_csv, refresh, with_base_amounts
+from src.market_data import StubMarketDataClient
+from src.operations_store import DERIVED_DIR, cache_dir_for, load_typed_operations
+from src.reports import get_expenses_by_day_of_week
+from src.schema import (AMOUNT, BASE_AMOUNT, CARD_NUMBER, OPERATION_AMOUNT, OPERATION_CURRENCY, OPERATION_DATE,
+                        PAYMENT_AMOUNT, PAYMENT_CURRENCY)
+from src.views import process_operations_data
+
+RATES = {
+    "2021-01-01": {"USD": 1.0, "RUB": 74.0, "EUR": 0.82, "TRY": 7.4},
+    "2021-03-01": {"USD": 1.0, "RUB": 75.0, "EUR": 0.84, "TRY": 7.6},
+    "2021-06-01": {"USD": 1.0, "RUB": 72.0, "EUR": 0.83},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    rates = RateStore(str(tmp_path / "fx" / "rates.sqlite"))
+    for day, values in RATES.items():
+        rates.add(day, values)
+    fx_rates.set_store(rates)
+    yield rates
+    fx_rates.set_store(None)
+    operations_store.clear_memory_cache()
+
+
+def _expected(df: pd.DataFrame, base: str) -> np.ndarray:
+    """Пересчёт по строкам через merge_asof — эталон для векторного соединения."""
+    history = pd.DataFrame(
+        [(pd.Timestamp(day), currency, rate) for day, values in RATES.items() for currency, rate in values.items()],
+        columns=["day", "currency", "rate"],
+    ).astype({"day": "datetime64[ns]"})
+    rows = pd.DataFrame({
+        "day": df[OPERATION_DATE].dt.normalize(),
+        "currency": df[PAYMENT_CURRENCY].astype(str),
+        "known": df[PAYMENT_CURRENCY].notna(),
+        "amount": kopecks(df[AMOUNT]),
+        "row": np.arange(len(df)),
+    }).sort_values("day")
+    rows = pd.merge_asof(rows, history.sort_values("day"), on="day", by="currency", direction="backward")
+    # До начала истории — первый известный курс
+    first = history.sort_values("day").groupby("currency")["rate"].first()
+    rows["rate"] = rows["rate"].fillna(rows["currency"].map(first))
+    base_rates = pd.merge_asof(
+        rows[["day"]].assign(currency=base), history.sort_values("day"), on="day", by="currency"
+    )["rate"].fillna(first.get(base, np.nan)).to_numpy()
+    factor = np.where((rows["currency"] == base) | ~rows["known"], 1.0, base_rates / rows["rate"].to_numpy())
+    converted = np.round(rows["amount"].to_numpy() * factor)
+    return pd.Series(converted, index=rows["row"]).sort_index().to_numpy()
+
+
+@pytest.mark.parametrize("base", ["RUB", "USD"])
+def test_base_amounts_match_asof_join(store, base):
+    df = apply_schema(pd.DataFrame({
+        OPERATION_DATE: ["15.12.2020 10:00:00", "01.03.2021 00:00:00", "28.02.2021 23:59:59", "10.07.2021 12:00:00",
+                         "10.07.2021 12:00:00", "05.04.2021 09:00:00", "05.04.2021 09:00:00", "06.04.2021 10:00:00"],
+        PAYMENT_CURRENCY: ["EUR", "EUR", "TRY", "TRY", "RUB", "CNY", "USD", None],
+        AMOUNT: [10.0, 10.0, 100.0, 100.0, 500.0, 30.0, 12.5, 7.0],
+    }))
+
+    result = base_amounts(df, base, store)
+    assert np.array_equal(result, _expected(df, base), equal_nan=True)
+    if base == "RUB":
+        # EUR 15.12.2020 — по первым курсам (74 / 0.82); TRY 10.07 — по последнему известному курсу TRY
+        # и курсу рубля на ту же дату (72 / 7.6)
+        assert result[0] == round(1000 * 74 / 0.82)
+        assert result[3] == round(10000 * 72 / 7.6)
+        # Нет курса CNY — сумма неизвестна, без валюты — как в выгрузке
+        assert np.isnan(result[5]) and result[7] == 700
+
+
+def test_base_amounts_use_payment_currency(store):
+    # Как в выгрузке: покупка в долларах списана в рублях, покупка в юанях — с юаневого счёта
+    df = apply_schema(pd.DataFrame({
+        OPERATION_DATE: ["02.03.2021 10:00:00", "02.03.2021 11:00:00", "02.03.2021 12:00:00"],
+        OPERATION_AMOUNT: [-8.61, -100.0, -500.0],
+        OPERATION_CURRENCY: ["USD", "EUR", "RUB"],
+        PAYMENT_AMOUNT: [-648.76, -100.0, -500.0],
+        PAYMENT_CURRENCY: ["RUB", "EUR", "RUB"],
+        AMOUNT: [648.76, 100.0, 500.0],
+    }))
+    assert base_amounts(df, "RUB", store).tolist() == [64876, round(10000 * 75 / 0.84), 50000]
+
+
+def test_with_base_amounts_is_materialized_per_revision(store):
+    df = apply_schema(pd.DataFrame({
+        OPERATION_DATE: ["02.03.2021 10:00:00", "03.03.2021 11:00:00"],
+        PAYMENT_CURRENCY: ["EUR", "RUB"],
+        AMOUNT: [10.0, 20.0],
+    }))
+
+    converted = with_base_amounts(df)
+    assert str(converted[BASE_AMOUNT].dtype) == "Int64"
+    assert converted[BASE_AMOUNT].tolist() == [round(1000 * 75 / 0.84), 2000]
+    assert with_base_amounts(df) is converted
+    assert with_base_amounts(converted) is converted
+
+    store.add("2021-03-02", {"EUR": 0.5, "RUB": 75.0})
+    assert with_base_amounts(df) is not converted
+    assert with_base_amounts(df)[BASE_AMOUNT].tolist() == [150000, 2000]
+    # Без столбцов сумм и дат таблица возвращается как есть
+    plain = pd.DataFrame({"Сумма": [1]})
+    assert with_base_amounts(plain) is plain
+
+
+def test_unknown_rates_are_left_out_of_totals(tmp_path):
+    fx_rates.set_store(RateStore(str(tmp_path / "empty.sqlite")))
+    try:
+        df = apply_schema(pd.DataFrame({
+            OPERATION_DATE: ["02.03.2021 10:00:00", "02.03.2021 11:00:00", "03.03.2021 12:00:00"],
+            PAYMENT_CURRENCY: ["CNY", "RUB", "RUB"],
+            CARD_NUMBER: ["*7197", "*7197", "*7197"],
+            AMOUNT: [30.0, 500.0, 20.0],
+        }))
+        values = base_amounts(df, "RUB")
+        assert np.isnan(values[0]) and values[1:].tolist() == [50000, 2000]
+
+        converted = with_base_amounts(df)
+        assert converted[BASE_AMOUNT].isna().tolist() == [True, False, False]
+        # Юани без курса не складываются с рублями
+        assert converted[BASE_AMOUNT].sum() == 52000
+    finally:
+        fx_rates.set_store(None)
+        operations_store.clear_memory_cache()
+
+
+def test_refresh_once_per_day_and_offline(tmp_path):
+    store = RateStore(str(tmp_path / "rates.sqlite"))
+    market_data.set_client(StubMarketDataClient({}))
+    try:
+        # Пустой ответ (нет сети, заглушка) — история не пополняется, файл не создаётся
+        assert not refresh(store, today="2024-05-01")
+        assert not os.path.exists(store.path)
+
+        market_data.set_client(StubMarketDataClient(
+            {"api.exchangerate-api.com": {"date": "2024-04-30", "rates": {"RUB": 92.0, "EUR": 0.93}}}
+        ))
+        assert refresh(store, today="2024-05-01")
+        assert not refresh(store, today="2024-05-01")
+        history = store.history()
+        assert history.currencies == ["EUR", "RUB", "USD"]
+        assert history.rates.tolist() == [0.93, 92.0, 1.0]
+    finally:
+        market_data.set_client(None)
+
+    class Offline(StubMarketDataClient):
+        def _request(self, url, params, as_json):
+            raise ConnectionError("нет сети")
+
+    market_data.set_client(Offline())
+    try:
+        assert not refresh(store, today="2024-05-02")
+        assert len(store.history().rates) == 3
+    finally:
+        market_data.set_client(None)
+
+
+def test_import_csv(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("date,currency,rate\n2020-01-01,rub,61.9\n2020-01-01,USD,1\n", encoding="utf-8")
+    store = RateStore(str(tmp_path / "rates.sqlite"))
+    assert import_csv(str(path), store) == 2
+    assert store.history().currencies == ["RUB", "USD"]
+    assert store.version() == 1
+
+
+def test_home_page_and_reports_use_converted_amounts(store, tmp_path, monkeypatch):
+    # Отчёты сохраняются в текущий каталог
+    monkeypatch.chdir(tmp_path)
+    source = write_operations(str(tmp_path / "operations.csv"), 3000, seed=4, start="2021-01-01", end="2021-08-31")
+    df = load_typed_operations(source)
+    converted = base_amounts(df, "RUB", store)
+    assert (converted != kopecks(df[AMOUNT]))[~np.isnan(converted)].any()
+
+    home = process_operations_data(source, "2021-05-01", "2021-05-31")
+    window = df[OPERATION_DATE].between("2021-05-01", "2021-05-31 23:59:59").to_numpy()
+    totals = pd.Series(np.nan_to_num(converted[window]) / 100).groupby(df[CARD_NUMBER].to_numpy()[window]).sum()
+    for card in home["card_data"]:
+        assert card["Сумма"] == pytest.approx(totals[card["Номер карты"]])
+    top = home["top_transactions"][0]
+    assert top["Сумма"] == np.nanmax(converted[window]) / 100
+
+    # Кэш отчёта учитывает ревизию истории курсов
+    before = json.loads(get_expenses_by_day_of_week(source, "2021-03-01"))
+    store.add("2021-04-01", {"EUR": 0.1, "TRY": 1.0, "RUB": 75.0})
+    after = json.loads(get_expenses_by_day_of_week(source, "2021-03-01"))
+    assert before != after
+
+    # Дневные агрегаты по пересчитанным суммам сохранены рядом с кэшем выгрузки
+    assert any(name.startswith("fx_") for name in os.listdir(os.path.join(cache_dir_for(source), DERIVED_DIR)))
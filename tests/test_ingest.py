@@ -0,0 +1,168 @@
+import os
+from datetime import datetime
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src.aggregates import DailyAggregates, daily_aggregates
+from src.date_index import INDEX_FILES, DateIndex, date_index
+from src.ingest import MIN_BATCH_ROWS, ROW_BYTES_ESTIMATE, aggregate_operations, ingest_export, iter_batches
+from src.operations_store import clear_memory_cache, load_typed_operations, read_manifest
+from src.search_index import search_index
+
+OPERATIONS = pd.DataFrame(
+    {
+        "Дата операции": ["01.10.2023 12:00:00", "02.10.2023 10:00:00", "15.10.2023 09:30:00", "01.11.2023 08:00:00"],
+        "Номер карты": ["*7197", "*7197", "*5091", "*5091"],
+        "Сумма операции с округлением": [100.0, 300.0, 200.0, 1000.0],
+        "Кэшбэк": [1.0, None, 2.0, 10.0],
+        "Описание": ["Колхоз", "Магнит", "Озон", "Перевод"],
+    }
+)
+
+
+@pytest.fixture(params=["xlsx", "csv"])
+def operations_file(request, tmp_path):
+    path = tmp_path / f"operations.{request.param}"
+    if request.param == "csv":
+        OPERATIONS.to_csv(path, index=False)
+    else:
+        OPERATIONS.to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("extension", ["xlsx", "csv"])
+def test_iter_batches_respects_memory_budget(tmp_path, extension):
+    path = write_operations(str(tmp_path / f"operations.{extension}"), 3000, seed=5)
+
+    # Бюджет меньше одной строки — порции минимального размера
+    batches = list(iter_batches(path, memory_budget=1))
+    assert [len(batch) for batch in batches] == [MIN_BATCH_ROWS] * 11 + [3000 - 11 * MIN_BATCH_ROWS]
+    assert all(batch["Дата операции"].dtype.kind == "M" for batch in batches)
+    assert pd.concat(batches, ignore_index=True)["Описание"].tolist() == pd.concat(
+        iter_batches(path, memory_budget=1 << 30), ignore_index=True
+    )["Описание"].tolist()
+
+    # После первой порции размер подбирается по измеренному размеру строк: две формы порции укладываются в бюджет
+    budget = 2 * 1024 * 1024
+    sizes = [len(batch) for batch in iter_batches(path, memory_budget=budget)]
+    assert len(sizes) > 2 and sum(sizes) == 3000
+    assert sizes[0] == budget // ROW_BYTES_ESTIMATE < sizes[1]
+    assert all(batch.memory_usage(deep=True).sum() < budget for batch in iter_batches(path, memory_budget=budget))
+
+
+def test_aggregate_operations(operations_file):
+    result = aggregate_operations(
+        operations_file, datetime(2023, 10, 1), datetime(2023, 10, 31, 23, 59, 59), top_n=2
+    )
+
+    assert result["cards"] == [
+        {"Номер карты": "*5091", "total_spent": 200.0, "cashback": 2.0},
+        {"Номер карты": "*7197", "total_spent": 400.0, "cashback": 1.0},
+    ]
+    assert [op["Описание"] for op in result["top_transactions"]] == ["Магнит", "Озон"]
+    # 01.10.2023 и 15.10.2023 — воскресенья, 02.10.2023 — понедельник
+    assert result["day_of_week"]["Sunday"] == 300.0
+    assert result["day_of_week"]["Monday"] == 300.0
+
+
+def test_ingest_export_skips_known_operations(operations_file, tmp_path):
+    store = str(tmp_path / "store")
+
+    first = ingest_export(operations_file, store)
+    again = ingest_export(operations_file, store)
+
+    assert first["added"] == 4 and first["partitions"] == ["2023-10", "2023-11"]
+    assert again == {"added": 0, "skipped": 4, "rows": 4, "partitions": []}
+    assert read_manifest(store)["version"] == 1
+    assert load_typed_operations(store)["Описание"].tolist() == ["Колхоз", "Магнит", "Озон", "Перевод"]
+
+
+def test_ingest_export_updates_derived_structures(tmp_path):
+    store = str(tmp_path / "store")
+    first_export, second_export = tmp_path / "first.csv", tmp_path / "second.csv"
+    OPERATIONS.iloc[:3].to_csv(first_export, index=False)
+    # Вторая выгрузка пересекается с первой одной операцией
+    OPERATIONS.iloc[2:].to_csv(second_export, index=False)
+
+    ingest_export(str(first_export), store)
+    operations = load_typed_operations(store)
+    date_index(operations)
+    search_index(operations)
+    daily_aggregates(operations, "Сумма операции с округлением", "Кэшбэк", "Номер карты")
+    clear_memory_cache()
+
+    result = ingest_export(str(second_export), store)
+    assert result["added"] == 1 and result["skipped"] == 1
+    clear_memory_cache()
+
+    operations = load_typed_operations(store)
+    assert len(operations) == 4
+    assert date_index(operations).positions("2023-11-01", "2023-11-30").tolist() == [3]
+    assert search_index(operations).search("перев").tolist() == [3]
+    updated = daily_aggregates(operations, "Сумма операции с округлением", "Кэшбэк", "Номер карты")
+    fresh = DailyAggregates.build(operations, "Сумма операции с округлением", "Кэшбэк", "Номер карты")
+    assert np.array_equal(updated.days, fresh.days)
+    updated_totals, updated_top = updated.window("2023-10-01", "2023-11-30")
+    fresh_totals, fresh_top = fresh.window("2023-10-01", "2023-11-30")
+    assert updated_totals == fresh_totals
+    assert updated_top.tolist() == fresh_top.tolist() == [3, 1, 2, 0]
+
+
+def test_ingest_export_commits_with_manifest(tmp_path):
+    store = str(tmp_path / "store")
+    first_export, second_export = tmp_path / "first.csv", tmp_path / "second.csv"
+    OPERATIONS.iloc[:2].to_csv(first_export, index=False)
+    OPERATIONS.iloc[2:].to_csv(second_export, index=False)
+    ingest_export(str(first_export), store)
+    operations = load_typed_operations(store)
+    date_index(operations)
+    daily_aggregates(operations, "Сумма операции с округлением", "Кэшбэк", "Номер карты")
+    clear_memory_cache()
+
+    # Падение перед записью манифеста: сегменты, ключи и структуры новой версии уже на диске
+    with patch("src.ingest.write_manifest", side_effect=OSError("диск отключён")):
+        with pytest.raises(OSError):
+            ingest_export(str(second_export), store)
+    assert read_manifest(store)["version"] == 1
+    assert len(load_typed_operations(store)) == 2
+    clear_memory_cache()
+
+    # Повторный запуск видит только то, что зафиксировано манифестом
+    result = ingest_export(str(second_export), store)
+    assert result["added"] == 2 and result["skipped"] == 0
+    operations = load_typed_operations(store)
+    assert operations["Описание"].tolist() == ["Колхоз", "Магнит", "Озон", "Перевод"]
+    assert date_index(operations).positions("2023-10-10", "2023-11-30").tolist() == [2, 3]
+    aggregates = daily_aggregates(operations, "Сумма операции с округлением", "Кэшбэк", "Номер карты")
+    assert aggregates.rows == 4
+    # Файлы прежних версий и прерванной дозагрузки убраны
+    assert sorted(os.listdir(os.path.join(store, "derived"))) == ["2"]
+    assert sorted(os.listdir(os.path.join(store, "2023-10"))) == ["keys-000002.npy", "segment-000001", "segment-000002"]
+
+
+def test_derived_structures_checked_against_manifest_rows(tmp_path):
+    store = str(tmp_path / "store")
+    export = tmp_path / "operations.csv"
+    OPERATIONS.to_csv(export, index=False)
+    ingest_export(str(export), store)
+    operations = load_typed_operations(store)
+    # Индекс дат, сохранённый по другому числу строк, не используется
+    DateIndex(np.array(["2023-10-01"], dtype="datetime64[ns]")).save(
+        os.path.join(store, "derived", "1", INDEX_FILES["Дата операции"])
+    )
+    assert len(date_index(operations).dates) == 4
+
+    clear_memory_cache()
+    more = tmp_path / "more.csv"
+    OPERATIONS.assign(**{"Описание": ["Аптека"] * 4}).to_csv(more, index=False)
+    DateIndex(np.array(["2023-10-01"], dtype="datetime64[ns]")).save(
+        os.path.join(store, "derived", "1", INDEX_FILES["Дата операции"])
+    )
+    ingest_export(str(more), store)
+    # Устаревший индекс не продолжен новыми строками, а будет построен заново
+    assert not os.path.exists(os.path.join(store, "derived", "2", INDEX_FILES["Дата операции"]))
+    assert len(date_index(load_typed_operations(store)).dates) == 8
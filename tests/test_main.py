@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+
+from src.main import home_page_function
+from src.responses import DEFAULT_PAGE_SIZE
+from src.utils import BASE_DIR
+
+
+def test_import_main_is_lightweight():
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import src.main\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, 'pandas' in sys.modules, 'requests' in sys.modules)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+
+    assert float(output[0]) < 0.1
+    assert output[1:] == ["False", "False"]
+
+
+OPERATIONS = pd.DataFrame(
+    {
+        "Дата операции": ["01.04.2025 10:00:00", "05.04.2025 12:00:00", "01.03.2025 12:00:00"],
+        "Номер карты": ["*7197", "*7197", "*5091"],
+        "Сумма операции с округлением": [100.0, 250.0, 50.0],
+        "Кэшбэк": [1.0, None, None],
+    }
+)
+
+
+@patch("src.main.currency_rates", return_value=([{"currency": "USD", "rate": 75.5}], []))
+@patch("src.main.get_operations_df", return_value=OPERATIONS)
+@patch("src.utils.get_operations_df", return_value=OPERATIONS)
+def test_home_page_function(mock_utils_operations, mock_main_operations, mock_currency_rates):
+    data = json.loads(home_page_function("2025-04-09 14:30:00"))
+
+    assert data["status"] == "success"
+    assert data["data"]["processed_data"]["cards"] == [
+        {"last_digits": "7197", "total_spent": 350.0, "cashback": 1.0}
+    ]
+    assert data["data"]["processed_data"]["top_transactions"][0]["Сумма операции с округлением"] == 250.0
+    assert len(data["data"]["operations_data"]) == 3
+
+
+def test_home_page_function_invalid_date():
+    data = json.loads(home_page_function("invalid_date"))
+    assert data["status"] == "error"
+
+
+@patch("src.main.currency_rates", return_value=([], []))
+@patch("src.main.get_operations_df", return_value=OPERATIONS)
+@patch("src.utils.get_operations_df", return_value=OPERATIONS)
+def test_home_page_function_pagination(mock_utils_operations, mock_main_operations, mock_currency_rates):
+    data = json.loads(home_page_function("2025-04-09 14:30:00", limit=2, fields=["Номер карты"]))["data"]
+
+    assert data["operations_data"] == [{"Номер карты": "*7197"}, {"Номер карты": "*7197"}]
+    assert data["operations_page"]["total"] == 3
+
+    cursor = data["operations_page"]["next_cursor"]
+    data = json.loads(home_page_function("2025-04-09 14:30:00", fields=["Номер карты"], cursor=cursor))["data"]
+    assert data["operations_data"] == [{"Номер карты": "*5091"}]
+    assert data["operations_page"]["next_cursor"] is None
+
+    data = json.loads(home_page_function("2025-04-09 14:30:00", count_only=True))["data"]
+    assert "operations_data" not in data and data["operations_page"]["total"] == 3
+
+
+@patch("src.main.currency_rates", return_value=([], []))
+def test_home_page_function_default_page_size(mock_currency_rates):
+    operations = pd.concat([OPERATIONS] * 50, ignore_index=True)
+    with patch("src.main.get_operations_df", return_value=operations), \
+            patch("src.utils.get_operations_df", return_value=operations):
+        data = json.loads(home_page_function("2025-04-09 14:30:00", fields=["Номер карты"]))["data"]
+        # Без limit и cursor — страница DEFAULT_PAGE_SIZE строк и курсор следующей
+        assert len(data["operations_data"]) == DEFAULT_PAGE_SIZE
+        assert data["operations_page"]["total"] == 150
+        cursor = data["operations_page"]["next_cursor"]
+        data = json.loads(home_page_function("2025-04-09 14:30:00", fields=["Номер карты"], cursor=cursor))["data"]
+        assert len(data["operations_data"]) == 150 - DEFAULT_PAGE_SIZE
+        assert data["operations_page"]["next_cursor"] is None
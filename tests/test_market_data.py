@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.market_data import MarketDataClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Заглушка внешнего API: /rates отдаёт JSON, /slow отвечает с задержкой."""
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        if self.path.startswith("/slow"):
+            time.sleep(0.3)
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps({"path": self.path, "hit": len(self.server.hits)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.hits = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_uses_ttl_cache(stub_server):
+    server, url = stub_server
+    client = MarketDataClient(ttl=60)
+
+    first = client.get(f"{url}/rates")
+    second = client.get(f"{url}/rates")
+
+    assert first == second == {"path": "/rates", "hit": 1}
+    assert len(server.hits) == 1
+
+
+def test_get_stale_while_revalidate(stub_server):
+    server, url = stub_server
+    client = MarketDataClient(ttl=0.05, stale_ttl=60)
+    client.get(f"{url}/rates")
+    time.sleep(0.1)
+
+    # Устаревший ответ отдаётся сразу, а в фоне запрашивается новый
+    assert client.get(f"{url}/rates")["hit"] == 1
+    deadline = time.monotonic() + 2
+    while client.get(f"{url}/rates")["hit"] == 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.get(f"{url}/rates")["hit"] == 2
+
+
+def test_get_many_runs_in_parallel(stub_server):
+    server, url = stub_server
+    client = MarketDataClient()
+
+    start = time.perf_counter()
+    results = client.get_many([(f"{url}/slow", {"ticker": ticker}) for ticker in ["AAPL", "AMZN", "GOOGL", "MSFT"]])
+    elapsed = time.perf_counter() - start
+
+    assert [result["path"] for result in results] == [f"/slow?ticker={t}" for t in ["AAPL", "AMZN", "GOOGL", "MSFT"]]
+    assert elapsed < 0.9
+
+
+def test_concurrent_requests_are_coalesced(stub_server):
+    server, url = stub_server
+    client = MarketDataClient()
+
+    futures = [client.get_async(f"{url}/slow") for _ in range(5)]
+    assert len({id(future) for future in futures}) == 1
+    futures[0].result()
+    assert len(server.hits) == 1
+
+
+def test_timeout_and_http_errors(stub_server):
+    server, url = stub_server
+    client = MarketDataClient(timeout=0.05)
+
+    with pytest.raises(requests.Timeout):
+        client.get(f"{url}/slow")
+    with pytest.raises(requests.HTTPError):
+        client.get(f"{url}/missing")
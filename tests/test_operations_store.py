@@ -0,0 +1,101 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src.operations_store import (DERIVED_DIR, cache_dir_for, clear_memory_cache,
+                                  dataset_version, load_operations,
+                                  load_typed_operations)
+
+
+@pytest.fixture
+def operations_file(tmp_path):
+    df = pd.DataFrame(
+        {
+            "Дата операции": ["01.10.2023 12:00:00", "15.10.2023 09:30:00"],
+            "Номер карты": ["*7197", None],
+            "Сумма операции с округлением": [100.5, 200.0],
+            "MCC": [5411, 5812],
+        }
+    )
+    path = tmp_path / "operations.xlsx"
+    df.to_excel(path, index=False)
+    clear_memory_cache()
+    yield path
+    clear_memory_cache()
+
+
+def test_load_operations_writes_cache(operations_file):
+    df = load_operations(str(operations_file))
+
+    assert len(df) == 2
+    assert os.path.exists(os.path.join(cache_dir_for(str(operations_file)), "meta.json"))
+    assert dataset_version(str(operations_file)) is not None
+
+
+def test_load_operations_warm_does_not_parse_excel(operations_file):
+    expected = load_operations(str(operations_file))
+    clear_memory_cache()
+
+    with patch("pandas.read_excel") as mock_read_excel:
+        df = load_operations(str(operations_file))
+        mock_read_excel.assert_not_called()
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert pd.isna(df.loc[1, "Номер карты"])
+
+
+def test_load_operations_memoized_in_process(operations_file):
+    assert load_operations(str(operations_file)) is load_operations(str(operations_file))
+
+
+def test_load_operations_returns_rubles_typed_loader_kopecks(operations_file):
+    df = load_operations(str(operations_file))
+    typed = load_typed_operations(str(operations_file))
+
+    assert df["Сумма операции с округлением"].tolist() == [100.5, 200.0]
+    assert typed["Сумма операции с округлением"].tolist() == [10050, 20000]
+    assert str(typed["Сумма операции с округлением"].dtype) == "Int64"
+    assert df["Дата операции"].dtype.kind == "M" and df["MCC"].equals(typed["MCC"])
+
+
+def test_load_operations_reparses_changed_file(operations_file):
+    load_operations(str(operations_file))
+    pd.DataFrame({"Дата операции": ["20.10.2023 10:00:00"]}).to_excel(operations_file, index=False)
+
+    df = load_operations(str(operations_file))
+    assert len(df) == 1
+
+
+def test_write_cache_removes_only_own_files(operations_file):
+    cache_dir = cache_dir_for(str(operations_file))
+    load_operations(str(operations_file))
+    os.makedirs(os.path.join(cache_dir, DERIVED_DIR))
+    with open(os.path.join(cache_dir, DERIVED_DIR, "index.npz"), "w") as f:
+        f.write("старый индекс")
+    with open(os.path.join(cache_dir, "operations.sqlite"), "w") as f:
+        f.write("база")
+
+    pd.DataFrame({"Дата операции": ["20.10.2023 10:00:00"]}).to_excel(operations_file, index=False)
+    load_operations(str(operations_file))
+    assert not os.path.exists(os.path.join(cache_dir, DERIVED_DIR, "index.npz"))
+    assert os.path.exists(os.path.join(cache_dir, "operations.sqlite"))
+    assert sorted(os.listdir(cache_dir)) == ["col_0.npy", "meta.json", "operations.sqlite"]
+
+
+def test_load_operations_touched_file_uses_cache(operations_file):
+    load_operations(str(operations_file))
+    clear_memory_cache()
+    os.utime(operations_file, ns=(1, 1))
+
+    with patch("pandas.read_excel") as mock_read_excel:
+        df = load_operations(str(operations_file))
+        mock_read_excel.assert_not_called()
+    assert len(df) == 2
+
+
+@patch("pandas.read_excel", side_effect=FileNotFoundError("File not found"))
+def test_load_operations_missing_file(mock_read_excel):
+    with pytest.raises(FileNotFoundError):
+        load_operations("non_existent_file.xlsx")
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_operations
+from src.dtypes import apply_schema, rubles
+from src.report_engine import spending_report
+from src.schema import AMOUNT, CASHBACK, CATEGORY, MCC, OPERATION_DATE
+
+
+@pytest.fixture(scope="module")
+def operations():
+    df = apply_schema(generate_operations(3000, seed=11))
+    # Пропуски сумм считаются нулём, но строка остаётся в ячейке
+    return df.assign(**{AMOUNT: df[AMOUNT].mask(np.arange(len(df)) % 97 == 0)})
+
+
+def test_matches_groupby_over_several_dimensions(operations):
+    start, end = "2021-06-01", "2021-09-30 23:59:59"
+    report = spending_report(
+        operations, start, end, ["day_of_week", "hour", "category"], ["sum", "count", "mean", "cashback"]
+    )
+
+    window = operations[operations[OPERATION_DATE].between(start, end)]
+    dates = window[OPERATION_DATE]
+    expected = (
+        pd.DataFrame({
+            "day_of_week": dates.dt.day_name(),
+            "hour": dates.dt.hour,
+            "category": window[CATEGORY].astype(object),
+            "amount": rubles(window[AMOUNT]),
+            "cashback": np.nan_to_num(rubles(window[CASHBACK])),
+        })
+        .groupby(["day_of_week", "hour", "category"])
+        .agg(sum=("amount", "sum"), count=("amount", "size"), mean=("amount", "mean"), cashback=("cashback", "sum"))
+        .reset_index()
+    )
+
+    assert report[["day_of_week", "hour", "category", "count"]].values.tolist() == \
+        expected[["day_of_week", "hour", "category", "count"]].values.tolist()
+    for measure in ("sum", "mean", "cashback"):
+        np.testing.assert_allclose(report[measure], expected[measure], rtol=1e-12)
+
+
+def test_column_dimension_and_named_measures(operations):
+    report = spending_report(operations, dimensions=["mcc"], measures={"spent": "sum", "operations": "count"})
+    assert list(report.columns) == ["mcc", "spent", "operations"]
+    assert report["operations"].sum() == len(operations)
+    # Операции без MCC — отдельная строка в конце
+    assert report["mcc"].iloc[-1] is None
+    assert report["operations"].iloc[-1] == operations[MCC].isna().sum()
+
+
+def test_empty_window_and_unknown_names(operations):
+    assert spending_report(operations, "2030-01-01", "2030-02-01", ["month"]).empty
+    with pytest.raises(ValueError):
+        spending_report(operations, dimensions=["weather"])
+    with pytest.raises(ValueError):
+        spending_report(operations, measures=["median"])
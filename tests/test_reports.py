@@ -1,11 +1,16 @@
 import json
+import os
+import time
 from datetime import datetime
 from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from src.reports import get_expenses_by_day_of_week
+from src.report_cache import ReportCache, write_if_changed
+from src.reports import (expenses_by_day_of_week_batch, get_expenses_by_day_of_week,
+                         rolling_start_dates, save_report)
 
 
 def test_get_expenses_by_day_of_week_empty_data():
@@ -36,3 +41,84 @@ def test_get_expenses_by_day_of_week_file_not_found():
         result_dict = json.loads(result)
 
         assert "error" in result_dict
+
+
+def test_save_report_memoize_returns_cached_and_keeps_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_file = tmp_path / "operations.csv"
+    data_file.write_text("a\n1\n", encoding="utf-8")
+    calls = []
+
+    @save_report(memoize=True, cache=ReportCache(str(tmp_path / "cache")))
+    def report(file_path: str, start_date: str, days: int = 7) -> str:
+        calls.append((file_path, start_date, days))
+        return json.dumps([{"days": days}])
+
+    first = report(str(data_file), "2025-01-01")
+    [saved] = list(tmp_path.glob("report_report_*.json"))
+    mtime = saved.stat().st_mtime_ns
+
+    # Аргументы по имени и явное значение по умолчанию дают тот же ключ
+    assert report(file_path=str(data_file), start_date="2025-01-01", days=7) == first
+    assert len(calls) == 1
+    assert saved.stat().st_mtime_ns == mtime
+
+    # Новый экземпляр декоратора берёт отчёт с диска
+    cold = save_report(memoize=True, cache=ReportCache(str(tmp_path / "cache")))(report.__wrapped__)
+    assert cold(str(data_file), "2025-01-01") == first
+    assert len(calls) == 1
+
+    # Версия — отпечаток содержимого: перезапись тем же текстом не сбрасывает кэш
+    data_file.write_text("a\n1\n", encoding="utf-8")
+    os.utime(data_file, ns=(mtime + 10**9, mtime + 10**9))
+    assert report(str(data_file), "2025-01-01") == first
+    assert len(calls) == 1
+
+    # Изменение данных меняет версию и ключ
+    data_file.write_text("a\n1\n2\n", encoding="utf-8")
+    report(str(data_file), "2025-01-01")
+    assert len(calls) == 2
+
+
+def test_report_cache_lru_ttl_and_size(tmp_path):
+    cache = ReportCache(str(tmp_path), max_entries=2, max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    cache.put("c", "12345")
+    assert len(cache._memory) == 2
+    # На диске осталось не больше max_bytes
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json")) <= 10
+
+    expiring = ReportCache(None, ttl=0.01)
+    expiring.put("k", "v")
+    assert expiring.get("k") == "v"
+    time.sleep(0.02)
+    assert expiring.get("k") is None
+
+
+def test_write_if_changed_skips_identical(tmp_path):
+    path = str(tmp_path / "report.json")
+    assert write_if_changed(path, "[1]")
+    assert not write_if_changed(path, "[1]")
+    assert write_if_changed(path, "[2]")
+    assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
+
+
+def test_expenses_by_day_of_week_batch_matches_single_windows():
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 200 * 24, 2000), unit="h")
+    amounts = rng.integers(-500000, 500000, 2000) / 100
+    amounts[::50] = np.nan
+    df = pd.DataFrame({"date": dates.strftime("%Y-%m-%d %H:%M:%S"), "amount": amounts})
+    starts = rolling_start_dates("2023-12-01", "2024-08-01", 17)
+
+    with patch("src.datasets.load_typed_operations", return_value=df):
+        batch = expenses_by_day_of_week_batch("fake_path.xlsx", starts)
+        single = [json.loads(get_expenses_by_day_of_week.__wrapped__("fake_path.xlsx", s)) for s in starts]
+
+    assert [r["start_date"] for r in batch] == starts
+    for record, expected in zip(batch, single):
+        if "error" in expected:
+            assert record["error"] == expected["error"]
+        else:
+            assert record["expenses"] == expected
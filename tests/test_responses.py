@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.responses import (DEFAULT_PAGE_SIZE, decode_cursor, dumps, encode_cursor, frame_json,
+                           frame_records, iter_ndjson, loads, paginate,
+                           read_ndjson, write_ndjson)
+
+FRAME = pd.DataFrame(
+    {
+        "Дата операции": np.array(["2023-10-01T12:00:00", "NaT"], dtype="datetime64[ns]"),
+        "Сумма": [100.5, np.nan],
+        "Количество": np.array([1, 2], dtype=np.int64),
+        "Описание": ["Магнит", None],
+    }
+)
+
+
+def test_frame_records_from_columns():
+    assert frame_records(FRAME) == [
+        {"Дата операции": "2023-10-01T12:00:00", "Сумма": 100.5, "Количество": 1, "Описание": "Магнит"},
+        {"Дата операции": None, "Сумма": None, "Количество": 2, "Описание": None},
+    ]
+    assert frame_records(FRAME, ["Количество"]) == [{"Количество": 1}, {"Количество": 2}]
+
+
+def test_frame_json_matches_records():
+    frame = FRAME.assign(
+        Копейки=pd.array([150, None], dtype="Int64"),
+        Категория=pd.Categorical(["Супермаркеты", None]),
+        Кэшбэк=[True, False],
+        Цитата=['"кавычки"\\', "Магнит"],
+    )
+    assert loads(frame_json(frame)) == frame_records(frame)
+    assert loads(frame_json(frame, ["Сумма"])) == [{"Сумма": 100.5}, {"Сумма": None}]
+    assert frame_json(frame.iloc[:0]) == b"[]"
+    assert loads(dumps({"items": [frame]}))["items"] == [frame_records(frame)]
+
+
+def test_dumps_compact_by_default_and_pretty_on_request():
+    data = {"status": "success", "results": FRAME, "total": np.int64(2), "when": pd.Timestamp("2024-01-02")}
+
+    compact = dumps(data)
+    assert "\n" not in compact and "Магнит" in compact
+    assert loads(compact)["results"] == frame_records(FRAME)
+    assert loads(compact)["when"] == "2024-01-02T00:00:00"
+    assert dumps(data, pretty=True).startswith('{\n  "status"')
+
+
+def test_ndjson_streaming_in_chunks():
+    chunks = list(iter_ndjson(FRAME, chunk_rows=1))
+    assert len(chunks) == 2 and all(chunk.endswith(b"\n") for chunk in chunks)
+    assert list(read_ndjson(b"".join(chunks).splitlines())) == frame_records(FRAME)
+
+    stream = io.BytesIO()
+    written = write_ndjson(stream, ({"row": i} for i in range(5)), chunk_rows=2)
+    assert written == len(stream.getvalue())
+    assert list(read_ndjson(stream.getvalue().splitlines())) == [{"row": i} for i in range(5)]
+
+
+def test_paginate_materializes_only_the_slice():
+    df = pd.DataFrame({"a": range(10), "b": range(10, 20)})
+
+    items, page = paginate(df, np.array([1, 3, 5, 7]), limit=2, offset=1, fields=["b"])
+    assert items["b"].tolist() == [13, 15] and list(items.columns) == ["b"]
+    assert page["total"] == 4 and decode_cursor(page["next_cursor"]) == 3
+
+    items, page = paginate(df, cursor=encode_cursor(8))
+    assert items["a"].tolist() == [8, 9] and page["next_cursor"] is None
+    assert paginate(df, count_only=True) == (None, {"total": 10, "offset": 0, "limit": DEFAULT_PAGE_SIZE, "next_cursor": None})
+
+
+def test_paginate_defaults_to_page_size_with_next_cursor():
+    df = pd.DataFrame({"a": range(250)})
+
+    # Без limit — страница DEFAULT_PAGE_SIZE строк и курсор следующей
+    items, page = paginate(df, offset=10)
+    assert len(items) == DEFAULT_PAGE_SIZE and page["limit"] == DEFAULT_PAGE_SIZE
+    assert decode_cursor(page["next_cursor"]) == 10 + DEFAULT_PAGE_SIZE
+    items, page = paginate(df, cursor=page["next_cursor"])
+    assert items["a"].iloc[0] == 10 + DEFAULT_PAGE_SIZE and len(items) == DEFAULT_PAGE_SIZE
+    items, page = paginate(df, cursor=page["next_cursor"])
+    assert len(items) == 250 - 10 - 2 * DEFAULT_PAGE_SIZE and page["next_cursor"] is None
+    with pytest.raises(ValueError):
+        decode_cursor("мусор")
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+from src.search_index import SearchIndex, search_index
+
+OPERATIONS = pd.DataFrame(
+    {
+        "Описание": ["Колхоз", "Магнит", "Перевод Константин Л.", None],
+        "Категория": ["Супермаркеты", "Супермаркеты", "Переводы", "Фастфуд"],
+        "MCC": [5411.0, 5411.0, np.nan, 5814.0],
+        "Сумма операции": [-160.89, -64.0, -3000.0, -21.0],
+        "Сумма платежа": [-160.89, -64.0, -3000.0, -21.0],
+    }
+)
+
+
+def scan(df, query):
+    # Эталон — прежний построчный поиск
+    mask = df.apply(lambda row: row.astype(str).str.contains(query, case=False, na=False, regex=False).any(), axis=1)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def test_search_matches_full_scan():
+    index = SearchIndex.build(OPERATIONS)
+    for query in ["колхоз", "СУПЕР", "5411", "-160.89", "160.89", "пере", "а", "ма", "nan", "нет такого", ""]:
+        assert index.search(query).tolist() == scan(OPERATIONS, query).tolist(), query
+
+
+def test_search_prefix():
+    index = SearchIndex.build(OPERATIONS)
+    assert index.search("пер", prefix=True).tolist() == [2]
+    assert index.search("агнит", prefix=True).tolist() == []
+
+
+def test_search_index_append():
+    index = SearchIndex.build(OPERATIONS.iloc[:2])
+    index.append(OPERATIONS.iloc[2:])
+
+    assert index.n_rows == 4
+    assert index.search("перевод").tolist() == [2]
+    assert index.search("супер").tolist() == [0, 1]
+    assert index.search("5814").tolist() == [3]
+
+
+def test_search_index_save_load(tmp_path):
+    index = SearchIndex.build(OPERATIONS)
+    path = str(tmp_path / "search_index.pkl")
+    index.save(path)
+
+    loaded = SearchIndex.load(path)
+    loaded.append(pd.DataFrame({"Описание": ["Колхоз"]}))
+    assert loaded.search("колхоз").tolist() == [0, 4]
+
+
+def test_search_index_built_once_per_frame():
+    assert search_index(OPERATIONS) is search_index(OPERATIONS)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src import datasets, market_data, operations_store, reports
+from src.datasets import DatasetManager
+from src.market_data import StubMarketDataClient
+from src.services import simple_search
+from src.operations_store import load_typed_operations
+from src.server import Service, create_app
+from src.shared_dataset import SharedPublisher
+
+
+def call(app, path, query="", method="GET"):
+    """Выполняет HTTP-запрос к ASGI-приложению; возвращает статус, заголовки и тело."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode()}
+    asyncio.run(app(scope, receive, send))
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return messages[0]["status"], dict(messages[0]["headers"]), body
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    path = str(tmp_path / "operations.csv")
+    write_operations(path, 300, seed=3, end="2021-12-31")
+    monkeypatch.chdir(tmp_path)
+    market_data.set_client(StubMarketDataClient({"api.currencylayer.com": {"quotes": {"USDRUB": 90.5}}}))
+    app = Service(path, workers=2, reload_seconds=0)
+    app.load()
+    yield app
+    app.executor.shutdown()
+    market_data.set_client(None)
+    operations_store.clear_memory_cache()
+
+
+def test_health_and_routes(service):
+    status, _, body = call(service, "/health")
+    health = json.loads(body)
+    assert status == 200
+    assert health["status"] == "ok"
+    assert health["dataset"]["rows"] == 300
+
+    status, _, body = call(service, "/home", "datetime=2021-12-31+12:00:00&limit=2&fields=Категория")
+    home = json.loads(body)
+    assert home["status"] == "success"
+    assert home["data"]["api_data"]["currency_rates"] == [{"currency": "USD", "rate": 90.5}]
+    assert len(home["data"]["operations_data"]) == 2
+
+    status, _, body = call(service, "/search", "q=магнит&count_only=1")
+    assert status == 200
+    assert "results" not in json.loads(body)
+
+    assert call(service, "/missing")[0] == 404
+    assert call(service, "/home")[0] == 400
+    assert call(service, "/search", "q=x&limit=abc")[0] == 400
+
+
+def test_request_counters_from_pool_threads(service):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: service.handle("GET", "/search" if i % 2 else "/missing", b""), range(400)))
+
+    # Несуществующий путь не считается запросом, поиск без q — ошибка 400
+    assert service.requests == service.errors == 200
+
+
+def test_batch_report_streams_ndjson(service):
+    status, headers, body = call(
+        service, "/reports/expenses-by-day-of-week/batch", "start_date=2021-09-01&until=2021-10-01&step=10"
+    )
+    assert status == 200
+    assert headers[b"content-type"] == b"application/x-ndjson"
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert [line["start_date"] for line in lines] == ["2021-09-01", "2021-09-11", "2021-09-21", "2021-10-01"]
+
+    # HEAD — только заголовки, поток не вычисляется
+    status, headers, body = call(service, "/reports/expenses-by-day-of-week/batch", "start_date=2021-09-01", "HEAD")
+    assert status == 200 and headers[b"content-type"] == b"application/x-ndjson" and body == b""
+
+
+def test_stream_error_ends_response_with_error_line(service, monkeypatch):
+    def results(*args, **kwargs):
+        yield {"start_date": "2021-09-01"}
+        raise RuntimeError("отчёт не построен")
+
+    monkeypatch.setattr(reports, "expenses_by_day_of_week_batch", results)
+    status, _, body = call(service, "/reports/expenses-by-day-of-week/batch", "start_date=2021-09-01")
+    assert status == 200
+    # Заголовки уже отправлены: ошибка приходит последней строкой, ответ завершается
+    assert json.loads(body.splitlines()[-1]) == {"error": "отчёт не построен"}
+    assert service.errors == 1
+
+
+def test_data_path_is_passed_to_handlers(service):
+    # Путь сервиса не подменяет глобальный OPERATIONS_PATH — его передают обработчикам
+    assert operations_store.OPERATIONS_PATH != service.data_path
+    home = json.loads(call(service, "/home", "datetime=2021-12-31+12:00:00&count_only=1")[2])
+    assert home["data"]["operations_page"]["total"] == 300
+
+
+def test_reload_on_data_change(service):
+    assert not service.check_reload()
+    write_operations(service.data_path, 120, seed=4, end="2021-12-31")
+    os.utime(service.data_path, ns=(0, 10**18))
+    assert service.check_reload()
+    assert json.loads(call(service, "/health")[2])["dataset"]["rows"] == 120
+
+
+def test_shared_worker_follows_republished_data(tmp_path, monkeypatch):
+    path = write_operations(str(tmp_path / "operations.csv"), 200, seed=5, end="2021-12-31")
+    monkeypatch.setattr(operations_store, "OPERATIONS_PATH", path)
+    with SharedPublisher(path, str(tmp_path / "shared")) as publisher:
+        publisher.refresh()
+        operations_store.clear_memory_cache()
+        monkeypatch.setenv("SHARED_DATASET", publisher.root)
+        app = create_app(workers=1, reload_seconds=0)
+        try:
+            app.load()
+            assert operations_store.source_of(load_typed_operations(path)) == path
+            assert not app.check_reload()
+
+            # Файл перечитывает родитель: до новой выкладки процесс работает на прежней
+            write_operations(path, 120, seed=6, end="2021-12-31")
+            os.utime(path, ns=(0, 10**18))
+            assert not app.check_reload()
+            assert publisher.refresh()
+            assert app.check_reload()
+            assert app.shared_directory == os.path.join(publisher.root, "v2")
+            assert json.loads(call(app, "/health")[2])["dataset"]["rows"] == 120
+        finally:
+            app.executor.shutdown()
+            operations_store.clear_memory_cache()
+
+
+def test_user_parameter_selects_dataset(service, tmp_path):
+    path = write_operations(str(tmp_path / "anna.csv"), 120, seed=8, end="2021-12-31")
+    datasets.set_manager(DatasetManager({"anna": {"operations": path}}, users_dir=str(tmp_path)))
+    try:
+        status, _, body = call(service, "/search", "q=1&count_only=1&user=anna")
+        assert status == 200
+        assert json.loads(body)["page"]["total"] == json.loads(simple_search("1", path, count_only=True))["page"]["total"]
+        status, _, body = call(service, "/search", "q=1&count_only=1&user=../etc")
+        assert status == 400
+    finally:
+        datasets.set_manager(None)
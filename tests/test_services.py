@@ -1,9 +1,21 @@
 import json
+import math
+import re
 from unittest.mock import patch
 
+import numpy as np
 import pandas as pd
+import pytest
 
-from src.services import load_operations_data, simple_search
+from benchmarks.synthetic import generate_operations
+from src.dtypes import apply_schema, rubles
+from src.query import Condition, parse_query, query_positions
+from src.schema import (AMOUNT, CARD_NUMBER, CASHBACK, CATEGORY, DESCRIPTION, MCC, OPERATION_AMOUNT,
+                        OPERATION_DATE, STATUS)
+from src.services import (NON_PURCHASE_CATEGORIES, PERSON_PATTERN, PHONE_PATTERN, cashback_by_category, cashback_categories,
+                          investment_bank, investment_savings, load_operations_data, load_typed_operations_data,
+                          pattern_mask, person_transfer_positions, phone_positions, search_person_transfers,
+                          search_phone_numbers, simple_search)
 
 
 @patch("pandas.read_excel")
@@ -16,7 +28,15 @@ def test_load_operations_data_success(mock_read_excel):
     assert len(df) == 1
 
 
-@patch("src.services.load_operations_data")
+def test_load_operations_data_returns_rubles(tmp_path):
+    path = tmp_path / "operations.xlsx"
+    pd.DataFrame({"Дата операции": ["01.10.2023 12:00:00"], "Сумма операции": [-123.45]}).to_excel(path, index=False)
+
+    assert load_operations_data(str(path))["Сумма операции"].tolist() == [-123.45]
+    assert load_typed_operations_data(str(path))["Сумма операции"].tolist() == [-12345]
+
+
+@patch("src.services.load_typed_operations_data")
 def test_simple_search_found(mock_load_data):
     test_data = pd.DataFrame(
         {
@@ -34,7 +54,7 @@ def test_simple_search_found(mock_load_data):
     assert result["results"][0]["Описание"] == "Покупка кофе"
 
 
-@patch("src.services.load_operations_data")
+@patch("src.services.load_typed_operations_data")
 def test_simple_search_error(mock_load_data):
     mock_load_data.side_effect = Exception(
         "[Errno 2] No such file or directory: 'fake_path.xlsx'"
@@ -45,3 +65,200 @@ def test_simple_search_error(mock_load_data):
 
     assert "error" in result
     assert "[Errno 2] No such file or directory" in result["error"]
+
+
+@patch("src.services.load_typed_operations_data")
+def test_simple_search_paginated(mock_load_data):
+    mock_load_data.return_value = pd.DataFrame(
+        {"Описание": ["Кофе 1", "Чай", "Кофе 2", "Кофе 3"], "Сумма": [1, 2, 3, 4]}
+    )
+
+    result = json.loads(simple_search("кофе", "fake_path.xlsx", limit=1, offset=1, fields=["Сумма"]))
+    assert result["results_count"] == 3
+    assert result["results"] == [{"Сумма": 3}]
+
+    result = json.loads(simple_search("кофе", "fake_path.xlsx", count_only=True))
+    assert result["results_count"] == 3 and "results" not in result
+
+    result = json.loads(simple_search("кофе", "fake_path.xlsx", fields=["Нет такого"]))
+    assert "Неизвестные поля" in result["error"]
+
+
+def test_parse_query_splits_conditions_and_text():
+    parsed = parse_query('category:Супермаркеты amount>5000 date:2024-03..2024-05 card:*7197 "кофе с собой" 10:30')
+    assert parsed.conditions == [
+        Condition("category", ":", "Супермаркеты"),
+        Condition("amount", ">", "5000"),
+        Condition("date", ":", "2024-03..2024-05"),
+        Condition("card", ":", "*7197"),
+    ]
+    # Неизвестные поля остаются текстом
+    assert parsed.text == "кофе с собой 10:30"
+    assert parse_query("  Покупка  Кофе ").text == "покупка  кофе"
+
+
+def test_query_positions_match_pandas_filters():
+    df = apply_schema(generate_operations(3000, seed=21))
+    positions = query_positions(
+        df, "category:Супермаркеты,Фастфуд amount>=500 date:2021-03..2021-05 card:*7197 описание:а"
+    )
+
+    dates = df[OPERATION_DATE]
+    expected = (
+        df[CATEGORY].isin(["Супермаркеты", "Фастфуд"])
+        & (rubles(df[AMOUNT]) >= 500)
+        & (dates >= "2021-03-01") & (dates < "2021-06-01")
+        & (df[CARD_NUMBER] == "*7197")
+        & df[DESCRIPTION].astype(str).str.lower().str.contains("а")
+    )
+    assert len(positions) > 0
+    assert positions.tolist() == np.flatnonzero(expected).tolist()
+
+    strict = query_positions(df, "date>2021-05 date<2021-06-02 mcc:5411")
+    expected = (dates >= "2021-06-01") & (dates < "2021-06-02") & (df[MCC] == 5411)
+    assert strict.tolist() == np.flatnonzero(expected.fillna(False)).tolist()
+
+
+@patch("src.services.load_typed_operations_data")
+def test_simple_search_structured_query(mock_load_data):
+    mock_load_data.return_value = pd.DataFrame(
+        {
+            "Дата операции": ["01.01.2024 10:00:00", "02.03.2024 11:00:00", "03.03.2024 12:00:00"],
+            "Категория": ["Кафе", "Кафе", "Супермаркеты"],
+            "Описание": ["Покупка кофе", "Покупка кофе", "Покупка книг"],
+        }
+    )
+
+    result = json.loads(simple_search("категория:кафе date:2024-03 кофе", "fake_path.xlsx"))
+    assert result["results_count"] == 1
+    assert result["results"][0]["Дата операции"] == "02.03.2024 11:00:00"
+
+    assert "error" in json.loads(simple_search("amount>много", "fake_path.xlsx"))
+
+
+def test_pattern_positions_match_per_row_regex():
+    df = apply_schema(generate_operations(3000, seed=5))
+    descriptions = df[DESCRIPTION].astype(object)
+
+    phones = descriptions.map(lambda text: bool(re.search(r"\+7[\d\s-]{10,}", str(text))))
+    assert len(phone_positions(df)) > 0
+    assert phone_positions(df).tolist() == np.flatnonzero(phones).tolist()
+
+    people = (df[CATEGORY] == "Переводы") & descriptions.map(lambda text: bool(re.fullmatch(r"\w+ \w\.", str(text))))
+    assert len(person_transfer_positions(df)) > 0
+    assert person_transfer_positions(df).tolist() == np.flatnonzero(people).tolist()
+    # Результат считается один раз на таблицу
+    assert phone_positions(df) is phone_positions(df)
+
+
+def test_pattern_mask_on_plain_strings():
+    values = pd.Series(["Оплата 8 (921) 111-22-33", None, "Заказ 1234567890123", "тел. 89811112233", "Иван С."])
+    assert pattern_mask(values, PHONE_PATTERN).tolist() == [True, False, False, True, False]
+    assert pattern_mask(values, PERSON_PATTERN).tolist() == [False, False, False, False, True]
+
+
+def test_phone_pattern_accepts_two_digit_groups():
+    values = pd.Series(["Я МТС +7 921 11-22-33", "МТС +7 981 976-14-20", "Заказ 8921112233", "Счёт 8 921 11 22 334"])
+    assert pattern_mask(values, PHONE_PATTERN).tolist() == [True, True, False, False]
+
+
+@patch("src.services.load_typed_operations_data")
+def test_search_phone_numbers_and_person_transfers(mock_load_data):
+    mock_load_data.return_value = pd.DataFrame(
+        {
+            "Категория": ["Переводы", "Переводы", "Связь", "Переводы"],
+            "Описание": ["Иван С.", "Перевод на карту", "МТС +7 921 111-22-33", "Анна П."],
+        }
+    )
+
+    result = json.loads(search_person_transfers("fake_path.xlsx", fields=["Описание"]))
+    assert result["results_count"] == 2
+    assert result["results"] == [{"Описание": "Иван С."}, {"Описание": "Анна П."}]
+
+    result = json.loads(search_phone_numbers("fake_path.xlsx", count_only=True))
+    assert result["results_count"] == 1 and "results" not in result
+
+    mock_load_data.return_value = pd.DataFrame({"Сумма": [1]})
+    assert "error" in json.loads(search_phone_numbers("fake_path.xlsx"))
+
+
+def _month_expenses(df, month):
+    """Траты месяца — так их отбирал бы отдельный проход по таблице."""
+    return df[
+        (df[OPERATION_DATE].dt.strftime("%Y-%m") == month)
+        & (df[OPERATION_AMOUNT] < 0).fillna(False)
+        & (df[STATUS] == "OK")
+        & df[AMOUNT].notna()
+    ]
+
+
+def test_investment_savings_match_per_scenario_loop():
+    df = apply_schema(generate_operations(4000, seed=11))
+    months, limits = ["2021-05", "2019-02", "2030-01"], [10, 50, 100]
+
+    result = investment_savings(df, months, limits)
+    assert [(row["month"], row["limit"]) for row in result] == [
+        (month, limit) for month in sorted(months) for limit in limits
+    ]
+    for row in result:
+        amounts = _month_expenses(df, row["month"])[AMOUNT].astype(float) / 100
+        expected = sum(math.ceil(round(amount / row["limit"], 9)) * row["limit"] - amount for amount in amounts)
+        assert row["savings"] == pytest.approx(expected, abs=1e-6)
+    assert result[-1]["savings"] == 0
+
+
+def test_cashback_by_category_matches_groupby():
+    df = apply_schema(generate_operations(4000, seed=12))
+    result = cashback_by_category(df, ["2021-06", "2020-01"], rate=5, top=3)
+
+    assert list(result) == ["2020-01", "2021-06"]
+    for month, categories in result.items():
+        expenses = _month_expenses(df, month)
+        spent = (expenses[AMOUNT].astype(float) / 100).groupby(expenses[CATEGORY], observed=True).sum()
+        spent = spent.drop(NON_PURCHASE_CATEGORIES, errors="ignore")
+        best = spent.sort_values(ascending=False, kind="stable").head(3)
+        assert [row["category"] for row in categories] == best.index.tolist()
+        for row in categories:
+            assert row["spent"] == pytest.approx(spent[row["category"]])
+            assert row["potential_cashback"] == pytest.approx(spent[row["category"]] * 0.05, abs=0.01)
+            cashback = expenses.loc[expenses[CATEGORY] == row["category"], CASHBACK].astype(float).sum() / 100
+            assert row["cashback"] == pytest.approx(cashback)
+
+
+def test_cashback_by_category_validates_months_and_top():
+    df = apply_schema(generate_operations(500, seed=13))
+    months = cashback_by_category(df, ["2021-06"])["2021-06"]
+    assert months
+    assert not {row["category"] for row in months} & NON_PURCHASE_CATEGORIES
+    for bad in (["2021-06-15"], ["2021-13"], ["21-06"], ["2021-6"]):
+        with pytest.raises(ValueError):
+            cashback_by_category(df, bad)
+    for top in (0, -1):
+        with pytest.raises(ValueError):
+            cashback_by_category(df, ["2021-06"], top=top)
+
+
+@patch("src.services.load_typed_operations_data")
+def test_investment_bank_and_cashback_categories_responses(mock_load_data):
+    mock_load_data.return_value = apply_schema(pd.DataFrame(
+        {
+            OPERATION_DATE: ["01.03.2024 10:00:00", "05.03.2024 11:00:00", "07.03.2024 12:00:00"],
+            STATUS: ["OK", "OK", "OK"],
+            OPERATION_AMOUNT: [-1712.0, -43.5, 500.0],
+            AMOUNT: [1712.0, 43.5, 500.0],
+            CASHBACK: [17.0, None, None],
+            CATEGORY: ["Супермаркеты", "Фастфуд", "Пополнения"],
+        }
+    ))
+
+    result = json.loads(investment_bank(["2024-03"], [50, 100], "fake_path.xlsx"))
+    assert result["scenarios"] == [
+        {"month": "2024-03", "limit": 50, "savings": 44.5},
+        {"month": "2024-03", "limit": 100, "savings": 144.5},
+    ]
+    result = json.loads(cashback_categories(["2024-03"], "fake_path.xlsx"))
+    assert [row["category"] for row in result["months"]["2024-03"]] == ["Супермаркеты", "Фастфуд"]
+    assert result["months"]["2024-03"][0]["cashback"] == 17.0
+
+    assert "error" in json.loads(investment_bank(["март"], [50], "fake_path.xlsx"))
+    assert "error" in json.loads(investment_bank(["2024-03"], [0], "fake_path.xlsx"))
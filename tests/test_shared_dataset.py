@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src import operations_store
+from src.aggregates import DailyAggregates
+from src.fx_rates import with_base_amounts
+from src.operations_store import frame_memo, load_typed_operations
+from src.reports import get_expenses_by_day_of_week
+from src.schema import AMOUNT, CATEGORY, OPERATION_DATE
+from src.search_index import search_index
+from src.services import simple_search
+from src.shared_dataset import CONVERTED_STRUCTURES, STRUCTURES, SharedPublisher, attach, current_directory, publish
+from src.views import process_operations_data
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _is_mapped(values) -> bool:
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return True
+        values = values.base
+    return False
+
+
+@pytest.fixture
+def shared(tmp_path):
+    source = write_operations(str(tmp_path / "operations.csv"), 2000, seed=7, end="2021-12-31")
+    expected = load_typed_operations(source).copy()
+    with publish(source, directory=str(tmp_path / "shared")) as dataset:
+        operations_store.clear_memory_cache()
+        yield source, dataset, expected
+    operations_store.clear_memory_cache()
+
+
+def test_attach_restores_frame_and_structures(shared):
+    source, dataset, expected = shared
+    df = attach(dataset.directory)
+    assert load_typed_operations(source) is df
+    assert df.equals(expected)
+    assert list(df.dtypes) == list(expected.dtypes)
+    # Производные структуры подставлены, а не построены заново
+    for name in STRUCTURES:
+        assert frame_memo(df, name, lambda: pytest.fail(f"{name} построена заново")) is not None
+    assert search_index(df) is frame_memo(df, "search_index", lambda: None)
+
+
+def test_attach_restores_base_amounts_and_home_page_aggregates(shared, monkeypatch):
+    source, dataset, _ = shared
+    private = process_operations_data(source, "2021-05-01", "2021-05-31")
+    operations_store.clear_memory_cache()
+    df = attach(dataset.directory)
+    converted = with_base_amounts(df)
+    for name in CONVERTED_STRUCTURES:
+        assert frame_memo(converted, name, lambda: pytest.fail(f"{name} построена заново")) is not None
+    # Главная берёт выложенные агрегаты по суммам в базовой валюте, а не строит их в процессе
+    for method in ("build", "load"):
+        monkeypatch.setattr(DailyAggregates, method, lambda *args, **kwargs: pytest.fail("агрегаты построены заново"))
+    assert repr(process_operations_data(source, "2021-05-01", "2021-05-31")) == repr(private)
+
+
+def test_columns_are_read_only_views_of_shared_files(shared):
+    _, dataset, _ = shared
+    df = attach(dataset.directory)
+    for name in [OPERATION_DATE, CATEGORY, AMOUNT]:
+        array = df[name].array
+        values = getattr(array, "codes", None)
+        values = values if values is not None else getattr(array, "_data", None)
+        values = values if values is not None else df[name].to_numpy()
+        assert _is_mapped(values)
+        assert not values.flags.writeable
+    order = frame_memo(df, f"date_index:{OPERATION_DATE}", lambda: None).order
+    assert _is_mapped(order)
+
+
+def test_entry_points_match_private_load(shared):
+    source, dataset, _ = shared
+    private = (
+        simple_search("магнит", source, limit=5),
+        get_expenses_by_day_of_week.__wrapped__(source, "2021-10-01"),
+        process_operations_data(source, "2021-05-01", "2021-05-31"),
+    )
+    operations_store.clear_memory_cache()
+    attach(dataset.directory)
+    assert simple_search("магнит", source, limit=5) == private[0]
+    assert get_expenses_by_day_of_week.__wrapped__(source, "2021-10-01") == private[1]
+    # repr: пропуски (NaN) в разных загрузках — разные объекты и не равны между собой
+    assert repr(process_operations_data(source, "2021-05-01", "2021-05-31")) == repr(private[2])
+
+
+def test_attach_in_child_process(shared):
+    source, dataset, _ = shared
+    expected = json.loads(simple_search("магнит", source, count_only=True))
+    script = (
+        "import json, sys\n"
+        "from src.shared_dataset import attach_from_env\n"
+        "from src.services import simple_search\n"
+        "attach_from_env()\n"
+        "print(simple_search('магнит', sys.argv[1], count_only=True))\n"
+    )
+    env = dict(os.environ, SHARED_DATASET=dataset.directory, PYTHONPATH=BASE_DIR)
+    result = subprocess.run(
+        [sys.executable, "-c", script, source], env=env, capture_output=True, text=True, check=True, cwd=BASE_DIR
+    )
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == expected
+
+
+def test_close_removes_directory(tmp_path):
+    source = write_operations(str(tmp_path / "operations.csv"), 100, seed=1)
+    dataset = publish(source)
+    assert os.path.exists(os.path.join(dataset.directory, "shared.json"))
+    dataset.close()
+    assert not os.path.exists(dataset.directory)
+    operations_store.clear_memory_cache()
+
+
+def test_publisher_republishes_changed_source(tmp_path):
+    source = write_operations(str(tmp_path / "operations.csv"), 100, seed=1)
+    with SharedPublisher(source, str(tmp_path / "shared")) as publisher:
+        assert publisher.refresh()
+        assert not publisher.refresh()
+        first = current_directory(publisher.root)
+        for rows in (150, 200):
+            write_operations(source, rows, seed=rows)
+            os.utime(source, ns=(0, rows * 10**15))
+            assert publisher.refresh()
+        assert current_directory(publisher.root) == os.path.join(publisher.root, "v3")
+        assert len(attach(current_directory(publisher.root))) == 200
+        # Остаются текущая и предыдущая выкладки
+        assert not os.path.exists(first)
+        assert os.path.exists(os.path.join(publisher.root, "v2"))
+    assert not os.path.exists(publisher.root)
+    operations_store.clear_memory_cache()
@@ -0,0 +1,197 @@
+import gc
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import write_operations
+from src import fx_rates, operations_store, sql_store
+from src.dtypes import to_display
+from src.fx_rates import RateStore, with_base_amounts
+from src.operations_store import load_typed_operations
+from src.query import query_positions
+from src.report_engine import spending_report
+from src.reports import get_expenses_by_day_of_week
+from src.responses import dumps
+from src.schema import AMOUNT, BASE_AMOUNT
+from src.services import simple_search
+from src.utils import filtered_operations
+from src.views import process_operations_data
+
+QUERIES = [
+    "магнит",
+    "",
+    "мт",
+    "category:Супермаркеты amount>500 date:2021-03..2021-05 card:*7197",
+    "date:2021-12 магнит",
+    "category:Фастфуд,Кафе amount<300",
+    "card:*4556 описание:перевод",
+    "mcc>5000 date<2021-06",
+    "date>2021-06-01 сумма:100..200",
+    "31.12",
+]
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    path = write_operations(str(tmp_path_factory.mktemp("sql") / "operations.csv"), 3000, 11)
+    yield path
+    sql_store.clear_stores()
+
+
+@pytest.fixture
+def sqlite_backend(source):
+    with patch.object(sql_store, "BACKEND", "sqlite"), patch.object(operations_store, "OPERATIONS_PATH", source):
+        yield sql_store.sql_backend(source)
+
+
+def test_store_is_imported_once_per_version(source):
+    store = sql_store.open_store(source)
+    assert store.rows == len(load_typed_operations(source))
+    assert sql_store.open_store(source) is store
+    assert os.path.exists(sql_store.database_path(source))
+
+    # Новый процесс открывает готовую базу без повторного импорта
+    sql_store.clear_stores()
+    with patch.object(sql_store, "import_operations") as importer:
+        assert sql_store.open_store(source).rows == store.rows
+    importer.assert_not_called()
+
+
+def test_take_rebuilds_typed_rows(source):
+    df = load_typed_operations(source)
+    store = sql_store.open_store(source)
+    positions = np.array([17, 3, 2999, 0])
+    assert dumps(to_display(store.take(positions))) == dumps(to_display(df.take(positions)))
+    assert store.take(positions).dtypes.astype(str).tolist()[:2] == ["datetime64[ns]", "datetime64[ns]"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_query_positions_parity(source, query):
+    expected = query_positions(load_typed_operations(source), query)
+    assert sql_store.open_store(source).query_positions(query).tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize("dimensions", [["day_of_week"], ["hour"], ["month", "category"], ["card", "mcc"], []])
+def test_spending_report_parity(source, dimensions):
+    measures = ["sum", "count", "mean", "cashback"]
+    expected = spending_report(load_typed_operations(source), "2021-02-01", "2021-08-31", dimensions, measures)
+    result = sql_store.open_store(source).spending_report("2021-02-01", "2021-08-31", dimensions, measures)
+    assert result.equals(expected)
+
+
+def test_entry_points_match_pandas_backend(source, sqlite_backend):
+    search = simple_search("category:Супермаркеты магнит", source, limit=20, offset=5)
+    report = get_expenses_by_day_of_week.__wrapped__(source, "2021-03-01")
+    operations = filtered_operations("2021-05-20 12:00:00")
+    home = process_operations_data(source, "2021-05-01", "2021-05-20")
+
+    with patch.object(sql_store, "BACKEND", "pandas"), patch.object(operations_store, "OPERATIONS_PATH", source):
+        assert search == simple_search("category:Супермаркеты магнит", source, limit=20, offset=5)
+        assert report == get_expenses_by_day_of_week.__wrapped__(source, "2021-03-01")
+        assert dumps(operations) == dumps(filtered_operations("2021-05-20 12:00:00"))
+        assert dumps(home) == dumps(process_operations_data(source, "2021-05-01", "2021-05-20"))
+    assert json.loads(search)["page"]["total"] > 20
+    assert len(home["top_transactions"]) == 5
+
+
+def test_base_amounts_follow_rate_history(source, sqlite_backend, tmp_path):
+    rates = RateStore(str(tmp_path / "rates.sqlite"))
+    rates.add("2018-01-01", {"USD": 1.0, "RUB": 60.0, "EUR": 0.85, "TRY": 3.8, "CNY": 6.5})
+    fx_rates.set_store(rates)
+
+    def both_backends():
+        results = []
+        for backend in ("sqlite", "pandas"):
+            with patch.object(sql_store, "BACKEND", backend):
+                results.append((
+                    get_expenses_by_day_of_week.__wrapped__(source, "2021-03-01"),
+                    dumps(process_operations_data(source, "2021-01-01", "2021-12-31")),
+                ))
+        return results
+
+    try:
+        sql, frame = both_backends()
+        assert sql == frame
+        store = sql_store.open_store(source)
+        assert BASE_AMOUNT not in store.columns
+        expected = with_base_amounts(load_typed_operations(source))[BASE_AMOUNT]
+        assert (expected != load_typed_operations(source)[AMOUNT]).any()
+        result = store.converted().take(np.arange(store.rows), [BASE_AMOUNT])[BASE_AMOUNT]
+        assert result.reset_index(drop=True).equals(expected.reset_index(drop=True))
+
+        # Пополнение истории курсов пересчитывает только столбец сумм, без повторного импорта
+        rates.add("2021-01-01", {"RUB": 74.0, "EUR": 0.82, "TRY": 7.4, "CNY": 6.4})
+        with patch.object(sql_store, "import_operations") as importer:
+            updated_sql, updated_frame = both_backends()
+        importer.assert_not_called()
+        assert updated_sql == updated_frame
+        assert updated_sql != sql
+    finally:
+        fx_rates.set_store(None)
+
+
+def test_stale_database_is_reimported(tmp_path):
+    path = write_operations(str(tmp_path / "operations.csv"), 200, 1)
+    assert sql_store.open_store(path).rows == 200
+    write_operations(path, 300, 2)
+    os.utime(path, ns=(1, 1))
+    assert sql_store.open_store(path).rows == 300
+
+
+def test_replaced_store_closes_when_released(tmp_path):
+    path = write_operations(str(tmp_path / "operations.csv"), 200, 1)
+    store = sql_store.open_store(path)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        connections = list(pool.map(lambda _: store.connection, range(2)))
+    connections.append(store.connection)
+
+    # Заменённая база больше не выдаётся, но начатые запросы дочитывают её
+    write_operations(path, 300, 2)
+    os.utime(path, ns=(1, 1))
+    assert sql_store.open_store(path) is not store
+    assert store.converted().connection.execute("SELECT count(*) FROM operations").fetchone() == (200,)
+    # Соединения всех потоков закрываются, когда базу отпускает последний запрос
+    store = None
+    gc.collect()
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute("SELECT 1")
+
+    fresh = sql_store.open_store(path)
+    other = ThreadPoolExecutor(max_workers=1).submit(lambda: fresh.connection).result()
+    sql_store.clear_stores()
+    with pytest.raises(sqlite3.ProgrammingError):
+        other.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        fresh.connection
+
+
+def test_reload_while_another_thread_queries(tmp_path):
+    path = write_operations(str(tmp_path / "operations.csv"), 200, 1)
+    store = sql_store.open_store(path)
+    started, stop = threading.Event(), threading.Event()
+
+    def query() -> int:
+        done = 0
+        while not stop.is_set():
+            assert store.connection.execute("SELECT count(*) FROM operations").fetchone() == (200,)
+            done += 1
+            started.set()
+        return done
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        reader = pool.submit(query)
+        started.wait(5)
+        for i in range(3):
+            write_operations(path, 300 + i, 2 + i)
+            os.utime(path, ns=(i + 1, i + 1))
+            assert sql_store.open_store(path).rows == 300 + i
+        stop.set()
+        assert reader.result() > 0
+    sql_store.clear_stores()
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import COLUMNS, generate_chunks, generate_operations, write_operations
+from src.date_index import DATE_FORMATS, parse_dates
+from src.dtypes import to_display
+from src.operations_store import load_typed_operations
+from src.schema import AMOUNT, OPERATION_DATE, PAYMENT_DATE
+
+
+def test_generator_is_seeded_and_uses_real_schema():
+    df = generate_operations(1000, seed=7)
+
+    assert list(df.columns) == COLUMNS
+    pd.testing.assert_frame_equal(df, generate_operations(1000, seed=7))
+    assert not df.equals(generate_operations(1000, seed=8))
+    assert (df[AMOUNT] > 0).all()
+
+    for column in (OPERATION_DATE, PAYMENT_DATE):
+        assert not np.isnat(parse_dates(df[column], DATE_FORMATS[column])).any()
+    dates = parse_dates(df[OPERATION_DATE], DATE_FORMATS[OPERATION_DATE])
+    assert (np.diff(dates.astype(np.int64)) <= 0).all()
+
+
+def test_generator_chunks_cover_period_newest_first():
+    chunks = list(generate_chunks(250, seed=1, chunk_rows=100))
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    first = parse_dates(chunks[0][OPERATION_DATE], DATE_FORMATS[OPERATION_DATE])
+    last = parse_dates(chunks[-1][OPERATION_DATE], DATE_FORMATS[OPERATION_DATE])
+    assert first.min() >= last.max()
+
+
+def test_write_operations_xlsx_and_csv(tmp_path):
+    expected = generate_operations(50, seed=3)
+    for name in ("operations.xlsx", "operations.csv"):
+        df = to_display(load_typed_operations(write_operations(str(tmp_path / name), 50, seed=3)))
+        assert df[OPERATION_DATE].tolist() == expected[OPERATION_DATE].tolist()
+        assert np.allclose(df[AMOUNT], expected[AMOUNT])
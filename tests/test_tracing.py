@@ -0,0 +1,86 @@
+import json
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from src import tracing
+from src.services import simple_search
+
+
+@pytest.fixture
+def enabled():
+    tracing.reset()
+    tracing.enable()
+    yield
+    tracing.enable(False)
+    tracing.reset()
+
+
+def test_disabled_tracing_records_nothing():
+    tracing.reset()
+    with tracing.stage("a") as span:
+        span.add(rows=10)
+    assert tracing.stage("a") is tracing.stage("b")
+    assert tracing.json_summary()["stages"] == {}
+
+
+def test_stage_and_traced_record_durations_rows_and_bytes(enabled):
+    @tracing.traced("work")
+    def work():
+        with tracing.stage("inner") as span:
+            span.add(rows=3, size=100)
+
+    work()
+    work()
+
+    stages = tracing.json_summary()["stages"]
+    assert stages["work"]["count"] == 2
+    assert stages["inner"]["rows"] == 6 and stages["inner"]["bytes"] == 200
+
+    text = tracing.prometheus_text()
+    assert 'stage_duration_seconds_count{stage="work"} 2' in text
+    assert 'stage_duration_seconds_bucket{stage="inner",le="+Inf"} 2' in text
+    assert 'stage_rows_total{stage="inner"} 6' in text
+
+
+def test_slow_request_is_logged_with_stage_tree_and_profile(enabled, tmp_path):
+    with patch.object(tracing, "SLOW_REQUEST_SECONDS", 0), patch.object(
+        tracing, "PROFILE_SAMPLE_RATE", 1.0
+    ), patch.object(tracing, "PROFILE_DIR", str(tmp_path)):
+        with tracing.request("endpoint"):
+            with tracing.stage("step"):
+                pass
+
+    slow = tracing.json_summary()["slow_requests"]
+    assert slow[0]["stage"] == "endpoint"
+    assert [child["stage"] for child in slow[0]["children"]] == ["step"]
+    assert slow[0]["profile"].startswith(str(tmp_path))
+
+
+@patch("src.services.load_typed_operations_data")
+def test_entry_point_covers_search_and_encoding(mock_load_data, enabled):
+    mock_load_data.return_value = pd.DataFrame({"Описание": ["Покупка кофе", "Покупка книг"]})
+
+    result = simple_search("кофе", "fake_path.xlsx")
+
+    stages = tracing.json_summary()["stages"]
+    assert stages["services.simple_search"]["count"] == 1
+    assert stages["services.search_index"]["rows"] == 1
+    assert stages["json.encode"]["bytes"] == len(result.encode("utf-8"))
+    assert json.loads(result)["results_count"] == 1
+
+
+@patch("src.views.process_operations_data", return_value={"card_data": [], "top_transactions": []})
+@patch("src.views.load_user_settings", return_value={"user_currencies": ["USD"], "user_stocks": ["AAPL"]})
+@patch("src.views.get_client")
+def test_home_page_api_stages_join_request_tree(mock_client, mock_settings, mock_process, enabled):
+    from src.views import home_page_function
+
+    mock_client.return_value.get.return_value = {"rates": {"USD": 1.0}}
+    with patch.object(tracing, "SLOW_REQUEST_SECONDS", 0):
+        home_page_function("2021-12-31 12:00:00")
+
+    request = tracing.json_summary()["slow_requests"][0]
+    assert request["stage"] == "views.home_page"
+    assert {"views.fetch_currency_rates", "views.fetch_stock_prices"} <= {child["stage"] for child in request["children"]}
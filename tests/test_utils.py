@@ -27,7 +27,7 @@ def test_filtered_operations():
         {"Дата операции": "15.10.2023"},
         {"Дата операции": "20.10.2023"},
     ]
-    with patch("src.utils.operations_df", operations):
+    with patch("src.utils.get_operations_df", return_value=pd.DataFrame(operations)):
         filtered_ops = filtered_operations("2023-10-15 12:00:00")
         assert len(filtered_ops) == 2
 
@@ -77,9 +77,9 @@ def test_top5_tran():
     new_callable=mock_open,
     read_data=json.dumps({"user_currencies": ["USD"], "user_stocks": ["AAPL"]}),
 )
-@patch("requests.get")
-def test_currency_rates(mock_get, mock_file):
-    mock_get.return_value.json.return_value = {"quotes": {"USDRUB": 75.5}}
+@patch("src.market_data.get_client")
+def test_currency_rates(mock_get_client, mock_file):
+    mock_get_client.return_value.get_many.return_value = [{"quotes": {"USDRUB": 75.5}}, {}]
 
     currency_info, stocks_info = currency_rates("fake_path.json")
     assert len(currency_info) == 1
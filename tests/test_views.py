@@ -1,8 +1,7 @@
 import json
-import os
 import pytest
 from datetime import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 import pandas as pd  # Добавлен импорт pandas
 from src.views import (
     get_greeting,
@@ -46,24 +45,20 @@ def test_load_user_settings(tmp_path):
         load_user_settings("nonexistent_file.json")
 
 # Тест для функции fetch_currency_rates
-@patch('requests.get')
-def test_fetch_currency_rates(mock_get):
+@patch('src.views.get_client')
+def test_fetch_currency_rates(mock_get_client):
     # Создаем фиктивный ответ от API
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"rates": {"USD": 1.0, "EUR": 0.85}}
-    mock_get.return_value = mock_response
+    mock_get_client.return_value.get.return_value = {"rates": {"USD": 1.0, "EUR": 0.85}}
 
     # Проверяем получение курсов валют
     result = fetch_currency_rates(["USD", "EUR"])
     assert result == [{"currency": "USD", "rate": 1.0}, {"currency": "EUR", "rate": 0.85}]
 
 # Тест для функции fetch_stock_prices
-@patch('requests.get')
-def test_fetch_stock_prices(mock_get):
+@patch('src.views.get_client')
+def test_fetch_stock_prices(mock_get_client):
     # Создаем фиктивный ответ от API
-    mock_response = MagicMock()
-    mock_response.raise_for_status.return_value = None
-    mock_get.return_value = mock_response
+    mock_get_client.return_value.get_many.return_value = ["<html></html>", "<html></html>"]
 
     # Проверяем получение цен на акции
     result = fetch_stock_prices(["AAPL", "AMZN"])